@@ -0,0 +1,93 @@
+"""In-process LRU + TTL cache for chatbot answers."""
+
+import hashlib
+import re
+import time
+from collections import OrderedDict
+
+from models import ChatMessage, ChatResponse
+
+_WHITESPACE_RE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s?!.]+$")
+
+
+def normalize_question(text: str) -> str:
+    """Normalize a question so trivial variations share a cache entry."""
+    text = _WHITESPACE_RE.sub(" ", text.lower()).strip()
+    return _TRAILING_PUNCTUATION_RE.sub("", text)
+
+
+def make_cache_key(
+    message: str, conversation_history: list[ChatMessage], kb_hash: str
+) -> str:
+    """Build a cache key from the question, prior turns and FAQ content hash.
+
+    Including the knowledge-base hash means a reloaded FAQ document never
+    serves answers generated from the old content.
+    """
+    digest = hashlib.sha256(kb_hash.encode())
+    for msg in conversation_history:
+        digest.update(f"\x00{msg.role}\x00{normalize_question(msg.content)}".encode())
+    digest.update(f"\x01{normalize_question(message)}".encode())
+    return digest.hexdigest()
+
+
+class AnswerCache:
+    """Bounded mapping of cache key to ChatResponse with LRU and TTL eviction."""
+
+    def __init__(self, max_entries: int = 512, ttl_seconds: float = 900.0):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[str, tuple[float, ChatResponse]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> ChatResponse | None:
+        """Return the cached response, or None on a miss or expired entry."""
+        item = self._entries.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+
+        expires_at, response = item
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return None
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return response
+
+    def set(self, key: str, response: ChatResponse) -> None:
+        """Store a response, evicting the least recently used if full."""
+        if self.max_entries <= 0:
+            return
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, response)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every cached response (counters are kept)."""
+        self._entries.clear()
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
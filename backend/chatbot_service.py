@@ -1,97 +1,363 @@
-"""Chatbot service integrating OpenAI or Azure OpenAI."""
+"""Chatbot service: FAQ fast path, caching and prompting around an LLM provider."""
 
-import json
-import os
+import asyncio
+import contextlib
+import logging
+import time
+from typing import AsyncIterator
 import httpx
-from openai import OpenAI, AzureOpenAI
+import metrics
+from answer_cache import AnswerCache, make_cache_key
+from concurrency import ConcurrencyLimiter, Overloaded, SingleFlight
+from confidence import ConfidenceScorer
 from config import settings
-from knowledge_base import get_system_prompt
+from faq_index import FAQHit
+from knowledge_base import (
+    BASE_HR_PROMPT,
+    KnowledgeBase,
+    current_knowledge_base,
+    fast_path_score,
+    get_knowledge_base,
+    match_faq,
+    search_faq,
+    search_faq_many,
+)
 from models import ChatMessage, ChatResponse
+from prompting import (
+    PromptCacheStats,
+    PromptPlan,
+    build_prompt,
+    history_token_budget,
+    layout_messages,
+    pack_history,
+    prefix_id,
+)
+from providers import Completion, LLMProvider, create_provider
+from resilience import CircuitBreaker, RetryPolicy, is_retryable
+from tracing import stage
+
+logger = logging.getLogger(__name__)
+
+UNAVAILABLE_MESSAGE = (
+    "Our AI assistant can't answer right now. Please try again in a few minutes, or submit "
+    "your question to the LAX2 HR team using the link below."
+)
 
 
 class ChatbotService:
     """Service for handling chatbot interactions."""
 
-    def __init__(self):
-        """Initialize OpenAI client (Azure or regular OpenAI)."""
-        # Check if we're using Azure or regular OpenAI
-        use_azure = os.getenv("USE_AZURE_OPENAI", "true").lower() == "true"
-        
-        # Configure proxy if needed (for Walmart network)
-        http_proxy = os.getenv("HTTP_PROXY")
-        https_proxy = os.getenv("HTTPS_PROXY")
-        http_client = None
-        
-        if http_proxy or https_proxy:
-            # Create HTTP client with proxy support
-            http_client = httpx.Client(
-                proxies={
-                    "http://": http_proxy,
-                    "https://": https_proxy,
-                } if http_proxy and https_proxy else None,
-                verify=False,  # Disable SSL verification for corporate proxy
-            )
+    def __init__(self, provider: LLMProvider | None = None):
+        """Set up the service around an LLM provider.
         
-        if use_azure:
-            # Azure OpenAI (Walmart Element GenAI or direct Azure)
-            self.client = AzureOpenAI(
-                api_key=settings.azure_openai_api_key,
-                api_version=settings.azure_openai_api_version,
-                azure_endpoint=settings.azure_openai_endpoint,
-                http_client=http_client,
-            )
-            self.deployment_name = settings.azure_openai_deployment_name
-            self.use_azure = True
-        else:
-            # Regular OpenAI (easier setup!)
-            self.client = OpenAI(
-                api_key=os.getenv("OPENAI_API_KEY"),
-                http_client=http_client,
+        Args:
+            provider: Defaults to the one selected by LLM_PROVIDER. Its HTTP
+                client is created by startup(), which the FastAPI lifespan
+                calls once per process.
+        """
+        self.provider = provider or create_provider()
+        self.answer_cache = AnswerCache(
+            max_entries=settings.answer_cache_size,
+            ttl_seconds=settings.answer_cache_ttl,
+        )
+        self.single_flight = SingleFlight()
+        # Bounds simultaneous calls to the provider; excess load is shed to the FAQ
+        self.limiter = ConcurrencyLimiter(
+            limit=settings.llm_max_concurrency,
+            max_queue=settings.llm_max_queue,
+            queue_timeout=settings.llm_queue_timeout,
+            adaptive=settings.llm_adaptive_concurrency,
+            min_limit=settings.llm_min_concurrency,
+            latency_tolerance=settings.llm_latency_tolerance,
+        )
+        self.retry = RetryPolicy(
+            max_retries=settings.llm_max_retries,
+            base_delay=settings.llm_retry_base_delay,
+            max_delay=settings.llm_retry_max_delay,
+            budget_ratio=settings.llm_retry_budget_ratio,
+        )
+        # While open, questions are answered from the FAQ only. A router
+        # keeps one breaker per provider and is only open when all of them are
+        self.breaker = self.provider.circuit_breaker()
+        if self.breaker is None:
+            self.breaker = CircuitBreaker(
+                lambda: self.provider.probe(),
+                failure_threshold=settings.breaker_failure_threshold,
+                slow_call_seconds=self.provider.slow_call_seconds(),
+                probe_interval=settings.breaker_probe_interval,
+                name=self.provider.name,
             )
-            self.deployment_name = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
-            self.use_azure = False
+        self.scorer = ConfidenceScorer(
+            retrieval_weight=settings.confidence_retrieval_weight,
+            logprob_weight=settings.confidence_logprob_weight,
+        )
+        # Share of prompt tokens the provider served from its prompt cache
+        self.prompt_cache = PromptCacheStats()
+        self.requests_total = 0
+        self.fast_path_served = 0
+        self.fast_path_seconds = 0.0
 
-    def _calculate_confidence(self, response_text: str, message: str) -> float:
-        """
-        Calculate confidence score for the response.
+    @property
+    def http_client(self) -> httpx.AsyncClient | None:
+        """The provider's pooled HTTP client (None before startup)."""
+        return self.provider.http_client
+
+    async def startup(self, http_client: httpx.AsyncClient | None = None) -> None:
+        """Create the provider's long-lived HTTP client.
         
-        This is a simplified heuristic. In production, you might:
-        - Use OpenAI's logprobs
-        - Implement a separate classification model
-        - Use semantic similarity scores
+        Args:
+            http_client: Optional pre-built client (e.g. with a test transport)
         """
-        # Check if response contains uncertainty phrases
-        uncertainty_phrases = [
-            "i'm not sure",
-            "i don't know",
-            "unclear",
-            "cannot confirm",
-            "recommend contacting",
-            "please contact",
-            "check with hr",
-            "submit your request",
-            "sharepoint list",
-        ]
+        await self.provider.startup(http_client)
+
+    async def warm_up(self) -> dict[str, dict]:
+        """Load everything the first chat would otherwise wait for.
         
-        response_lower = response_text.lower()
+        Loads the knowledge base (in a worker thread), precomputes the
+        prompt prefixes and runs one retrieval, then warms the provider.
+        An unreachable provider is reported, not raised: the FAQ can still
+        answer.
         
-        # If response contains uncertainty, lower confidence
-        if any(phrase in response_lower for phrase in uncertainty_phrases):
-            return 0.5
+        Returns:
+            Per-component timings and details, for /ready
+        """
+        components: dict[str, dict] = {}
+
+        started = time.perf_counter()
+        kb = await asyncio.to_thread(get_knowledge_base)
+        components["knowledge_base"] = {
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "entries": len(kb.entries),
+            "loaded_from": kb.loaded_from,
+            "version": kb.version,
+        }
+
+        started = time.perf_counter()
+        for system_prompt in (BASE_HR_PROMPT, kb.system_prompt):
+            prefix_id(system_prompt)
+        question = kb.entries[0].question if kb.entries else "What is PPTO?"
+        plan = build_prompt(question, kb)
+        components["prompt"] = {
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "prefix_id": plan.prefix_id,
+        }
+
+        started = time.perf_counter()
+        reachable = await self.provider.warm_up()
+        components["upstream"] = {
+            "ms": round((time.perf_counter() - started) * 1000, 1),
+            "provider": self.provider.name,
+            "reachable": reachable,
+        }
+        return components
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        await self.breaker.aclose()
+        await self.provider.aclose()
+
+    def _faq_fast_path(
+        self, message: str, kb: KnowledgeBase, hits: list[FAQHit] | None = None
+    ) -> ChatResponse | None:
+        """Answer straight from the FAQ if the question nearly matches an entry."""
+        self.requests_total += 1
+        if not settings.faq_fast_path_enabled:
+            return None
+        started = time.perf_counter()
+        hit = match_faq(message, kb=kb, hits=hits)
+        if hit is None:
+            return None
+        response = self._faq_response(hit, fast_path_score(message, hit))
+        self.fast_path_served += 1
+        self.fast_path_seconds += time.perf_counter() - started
+        return response
+
+    def _faq_response(self, hit: FAQHit, score: float | None = None) -> ChatResponse:
+        """Response served straight from the FAQ.
         
-        # If response is very short, might be unsure
-        if len(response_text.split()) < 10:
-            return 0.6
+        Confidence comes from score, the one that qualified the hit for the
+        fast path, or else from the keyword match.
+        """
+        confidence = round(min(hit.match if score is None else score, 0.99), 2)
+        show_fallback = confidence < settings.confidence_threshold
+        return ChatResponse(
+            response=hit.entry.answer,
+            confidence=confidence,
+            show_fallback=show_fallback,
+            microsoft_list_url=settings.microsoft_list_url if show_fallback else None,
+            sources=["FAQ Database"],
+        )
+
+    def _cache_key(
+        self, message: str, conversation_history: list[ChatMessage], kb: KnowledgeBase
+    ) -> str | None:
+        """Answer-cache key, or None if the conversation is too long to cache."""
+        if len(conversation_history) > settings.answer_cache_max_history:
+            return None
+        return make_cache_key(message, conversation_history, kb.content_hash)
+
+    def _build_messages(
+        self,
+        message: str,
+        conversation_history: list[ChatMessage],
+        kb: KnowledgeBase,
+        hits: list[FAQHit] | None = None,
+    ) -> tuple[list[dict], PromptPlan]:
+        """Assemble the chat message list for a question."""
+        prompt = build_prompt(message, kb, hits=hits)
+        logger.info(
+            f"Prompt built: prefix={prompt.prefix_id}, mode={prompt.mode}, "
+            f"faq_entries={len(prompt.faq_entry_ids)}, tokens={prompt.prompt_tokens}, "
+            f"tokens_saved={prompt.tokens_saved}"
+        )
+        # Fill what the context window leaves with recent turns, newest first
+        history = pack_history(
+            conversation_history,
+            history_token_budget(prompt.prompt_tokens, message),
+        )
+        if history.summarized:
+            logger.info(
+                f"History packed: kept={len(history.messages)}, "
+                f"summarized={history.summarized}, tokens={history.tokens}"
+            )
+        # Stable prefix first, per-question parts last (see layout_messages)
+        return layout_messages(prompt, history, message), prompt
+
+    def _build_response(
+        self, completion: Completion, retrieval_score: float | None
+    ) -> ChatResponse:
+        """Score a completed answer and wrap it in a ChatResponse."""
+        provider = completion.served_by or self.provider
+        self.prompt_cache.record(completion.usage)
+        metrics.observe_usage(provider.name, completion.usage)
+        # Calculate confidence
+        with stage("confidence"):
+            confidence = self.scorer.score(
+                completion.text, retrieval_score, completion.token_logprobs
+            )
         
-        # If response is specific and detailed, high confidence
-        if len(response_text.split()) > 30:
-            return 0.85
+        # Determine if we should show fallback
+        show_fallback = confidence < settings.confidence_threshold
         
-        # Default moderate-high confidence
-        return 0.8
+        return ChatResponse(
+            response=completion.text,
+            confidence=confidence,
+            show_fallback=show_fallback,
+            microsoft_list_url=settings.microsoft_list_url if show_fallback else None,
+            sources=[provider.source],
+        )
+
+    def _faq_only_response(self, message: str, kb: KnowledgeBase) -> ChatResponse:
+        """Answer from the closest FAQ entry when the provider can't be used.
+
+        A weak match would answer a different question, so below
+        FAQ_FALLBACK_THRESHOLD the associate gets the HR fallback instead.
+        """
+        hits = search_faq(message, 1, kb)
+        if hits:
+            score = max(hits[0].match, hits[0].similarity)
+            if score >= settings.faq_fallback_threshold:
+                return self._faq_response(hits[0], score)
+        return ChatResponse(
+            response=UNAVAILABLE_MESSAGE,
+            confidence=0.0,
+            show_fallback=True,
+            microsoft_list_url=settings.microsoft_list_url,
+            sources=[],
+        )
+
+    def _error_response(self, error: Exception) -> ChatResponse:
+        """Fallback response when the LLM call fails."""
+        return ChatResponse(
+            response=self.provider.error_message(error),
+            confidence=0.0,
+            show_fallback=True,
+            microsoft_list_url=settings.microsoft_list_url,
+            sources=[],
+        )
+
+    async def _complete(
+        self, messages: list[dict], retrieval_score: float | None
+    ) -> ChatResponse:
+        """Call the model once, within the concurrency limit, and score its answer."""
+        await self._acquire_upstream()
+        started = time.perf_counter()
+        try:
+            completion = await self._complete_with_retries(messages)
+        finally:
+            self.limiter.release(time.perf_counter() - started)
+        return self._build_response(completion, retrieval_score)
+
+    async def _complete_with_retries(self, messages: list[dict]) -> Completion:
+        """Call the provider, retrying transient failures within the retry budget."""
+        self.retry.start()
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                with stage("llm"), self._track_llm_call():
+                    completion = await self.provider.complete(messages)
+            except Exception as e:
+                if not await self._retry_after(e, attempt):
+                    raise
+                attempt += 1
+                continue
+            self.breaker.record_success(time.perf_counter() - started)
+            return completion
+
+    def _record_failure(self, error: Exception) -> None:
+        """Count an upstream failure against the breaker; bad requests don't."""
+        if is_retryable(error):
+            self.breaker.record_failure()
+
+    def _track_llm_call(self):
+        """Time the upstream call, unless the provider times each of its own."""
+        if self.provider.delegates_calls:
+            return contextlib.nullcontext()
+        return metrics.track_llm_call(self.provider.name)
+
+    async def _retry_after(self, error: Exception, attempt: int) -> bool:
+        """Record a failed attempt; back off and return True if it should be retried."""
+        self._record_failure(error)
+        # A router has already tried every route; another round only adds load
+        if self.provider.delegates_calls or not self.breaker.allow():
+            return False
+        delay = self.retry.next_delay(attempt, error)
+        if delay is None:
+            return False
+        metrics.LLM_RETRIES.labels(self.provider.name).inc()
+        logger.warning(
+            f"LLM call failed ({self.provider.name}), retry {attempt + 1} in {delay:.2f}s: {error}"
+        )
+        with stage("retry_wait"):
+            await asyncio.sleep(delay)
+        return True
+
+    async def _acquire_upstream(self) -> None:
+        """Wait in line for a provider call slot (raises Overloaded when shedding)."""
+        with stage("queue"):
+            waited = await self.limiter.acquire()
+        metrics.LLM_QUEUE_WAIT.observe(waited)
+
+    @staticmethod
+    def _observe(path: str, response: ChatResponse) -> ChatResponse:
+        metrics.observe_response(path, response.confidence, response.show_fallback)
+        return response
+
+    @staticmethod
+    async def _knowledge_base() -> KnowledgeBase:
+        """The current snapshot, loaded in a worker thread if there is none yet."""
+        kb = current_knowledge_base()
+        if kb is None:
+            kb = await asyncio.to_thread(get_knowledge_base)
+        return kb
 
     async def get_response(
-        self, message: str, conversation_history: list[ChatMessage]
+        self,
+        message: str,
+        conversation_history: list[ChatMessage],
+        kb: KnowledgeBase | None = None,
+        hits: list[FAQHit] | None = None,
     ) -> ChatResponse:
         """
         Get chatbot response for user message.
@@ -99,64 +365,220 @@ class ChatbotService:
         Args:
             message: User's question
             conversation_history: Previous conversation messages
+            kb: Knowledge base snapshot to answer from (defaults to the current one)
+            hits: FAQ search results for the message, if already computed
             
         Returns:
             ChatResponse with answer and metadata
         """
-        # Build messages for OpenAI (FAQ content is now in the system prompt)
-        messages = [
-            {"role": "system", "content": get_system_prompt()},
-        ]
+        if kb is None:
+            with stage("kb"):
+                kb = await self._knowledge_base()
+        # Near-verbatim FAQ questions are answered without a network call
+        with stage("fast_path"):
+            faq_response = self._faq_fast_path(message, kb, hits)
+        if faq_response is not None:
+            return self._observe("faq", faq_response)
 
-        # Add conversation history
-        for msg in conversation_history[-10:]:  # Keep last 10 messages for context
-            messages.append({"role": msg.role, "content": msg.content})
+        cache_key = self._cache_key(message, conversation_history, kb)
+        if cache_key is not None:
+            with stage("cache"):
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                return self._observe("cache", cached)
 
-        # Add current message
-        messages.append({"role": "user", "content": message})
+        if not self.breaker.allow():
+            # The provider keeps failing: answer from the FAQ in milliseconds
+            return self._observe("degraded", self._faq_only_response(message, kb))
+
+        with stage("prompt"):
+            messages, prompt = self._build_messages(message, conversation_history, kb, hits)
+        # Identical questions asked at the same moment share one upstream call
+        flight_key = cache_key or make_cache_key(message, conversation_history, kb.content_hash)
 
         try:
-            # Call OpenAI (Azure or regular)
-            if self.use_azure:
-                response = self.client.chat.completions.create(
-                    model=self.deployment_name,  # Azure uses deployment name
-                    messages=messages,
-                    max_tokens=settings.max_tokens,
-                    temperature=settings.temperature,
-                )
-            else:
-                response = self.client.chat.completions.create(
-                    model=self.deployment_name,  # Regular OpenAI uses model name
-                    messages=messages,
-                    max_tokens=settings.max_tokens,
-                    temperature=settings.temperature,
-                )
-
-            assistant_message = response.choices[0].message.content or ""
-            
-            # Calculate confidence
-            confidence = self._calculate_confidence(assistant_message, message)
-            
-            # Determine if we should show fallback
-            show_fallback = confidence < settings.confidence_threshold
-            
-            return ChatResponse(
-                response=assistant_message,
-                confidence=confidence,
-                show_fallback=show_fallback,
-                microsoft_list_url=settings.microsoft_list_url if show_fallback else None,
-                sources=["OpenAI GPT-4" if not self.use_azure else "Azure OpenAI GPT-4"],
+            result = await self.single_flight.do(
+                flight_key, lambda: self._complete(messages, prompt.retrieval_score)
             )
+            if cache_key is not None:
+                self.answer_cache.set(cache_key, result)
+            return self._observe("llm", result)
+
+        except Overloaded as e:
+            # Fail fast instead of piling more load on a saturated provider
+            logger.warning(f"Upstream saturated ({self.provider.name}), answering from FAQ: {e}")
+            return self._observe("overload", self._faq_only_response(message, kb))
 
         except Exception as e:
             # Fallback response on error
-            return ChatResponse(
-                response=f"I'm having trouble processing your request right now. Please submit your question to the LAX2 HR team using the link below, and they will respond to you as soon as possible.",
-                confidence=0.0,
-                show_fallback=True,
-                microsoft_list_url=settings.microsoft_list_url,
-                sources=[],
-            )
+            logger.error(f"LLM request failed ({self.provider.name}): {e}")
+            return self._observe("error", self._error_response(e))
+
+    async def stream_response(
+        self, message: str, conversation_history: list[ChatMessage]
+    ) -> AsyncIterator[str | ChatResponse]:
+        """
+        Stream the chatbot response token by token.
+        
+        Args:
+            message: User's question
+            conversation_history: Previous conversation messages
+            
+        Yields:
+            Response text chunks as they arrive, then a final ChatResponse
+            with the full answer and metadata
+        """
+        with stage("kb"):
+            kb = await self._knowledge_base()
+        with stage("fast_path"):
+            faq_response = self._faq_fast_path(message, kb)
+        if faq_response is not None:
+            yield faq_response.response
+            yield self._observe("faq", faq_response)
+            return
+
+        cache_key = self._cache_key(message, conversation_history, kb)
+        if cache_key is not None:
+            with stage("cache"):
+                cached = self.answer_cache.get(cache_key)
+            if cached is not None:
+                yield cached.response
+                yield self._observe("cache", cached)
+                return
+
+        if not self.breaker.allow():
+            response = self._faq_only_response(message, kb)
+            yield response.response
+            yield self._observe("degraded", response)
+            return
+
+        with stage("prompt"):
+            messages, prompt = self._build_messages(message, conversation_history, kb)
+        parts: list[str] = []
+        completion = None
+
+        try:
+            await self._acquire_upstream()
+        except Overloaded as e:
+            logger.warning(f"Upstream saturated ({self.provider.name}), answering from FAQ: {e}")
+            response = self._faq_only_response(message, kb)
+            yield response.response
+            yield self._observe("overload", response)
+            return
+
+        self.retry.start()
+        started = time.perf_counter()
+        try:
+            try:
+                attempt = 0
+                while True:
+                    attempt_started = time.perf_counter()
+                    first_token = None
+                    try:
+                        with stage("llm"), self._track_llm_call():
+                            async for item in self.provider.stream(messages):
+                                if isinstance(item, Completion):
+                                    completion = item
+                                    continue
+                                if first_token is None:
+                                    first_token = time.perf_counter() - attempt_started
+                                parts.append(item)
+                                yield item
+                    except Exception as e:
+                        # Only retry while nothing has reached the user yet
+                        if parts:
+                            self._record_failure(e)
+                            raise
+                        if not await self._retry_after(e, attempt):
+                            raise
+                        attempt += 1
+                        continue
+                    # A long answer isn't a slow upstream: judge streams by the first token
+                    self.breaker.record_success(
+                        first_token if first_token is not None else time.perf_counter() - attempt_started
+                    )
+                    break
+            finally:
+                self.limiter.release(time.perf_counter() - started)
+
+        except Exception as e:
+            logger.error(f"LLM stream failed ({self.provider.name}): {e}")
+            if not parts:
+                yield self._observe("error", self._error_response(e))
+                return
+
+        # A stream cut short is still answered with what arrived, uncached
+        completion_or_partial = completion or Completion("".join(parts))
+        result = self._build_response(completion_or_partial, prompt.retrieval_score)
+        if completion is not None and cache_key is not None:
+            self.answer_cache.set(cache_key, result)
+        yield self._observe("llm", result)
+
+    async def batch_responses(
+        self, questions: list[str]
+    ) -> AsyncIterator[tuple[int, ChatResponse]]:
+        """
+        Answer independent questions concurrently, each as a new chat.
+        
+        The batch shares one knowledge base snapshot and one batched FAQ
+        search. At most BATCH_CONCURRENCY questions are in progress at once,
+        so a batch takes only part of the upstream concurrency limit and
+        doesn't crowd out live chats.
+        
+        Args:
+            questions: The questions, answered in any order
+            
+        Yields:
+            (index into questions, ChatResponse) as each answer finishes
+        """
+        kb = await self._knowledge_base()
+        with stage("retrieval"):
+            all_hits = search_faq_many(questions, max(settings.retrieval_top_k, 1), kb)
+        semaphore = asyncio.Semaphore(max(1, settings.batch_concurrency))
+        finished: asyncio.Queue[tuple[int, ChatResponse]] = asyncio.Queue()
+
+        async def answer(index: int) -> None:
+            async with semaphore:
+                try:
+                    response = await self.get_response(
+                        questions[index], [], kb=kb, hits=all_hits[index]
+                    )
+                except Exception as e:
+                    logger.error(f"Batch question {index} failed: {e}")
+                    response = self._error_response(e)
+            finished.put_nowait((index, response))
+
+        tasks = [asyncio.ensure_future(answer(index)) for index in range(len(questions))]
+        try:
+            for _ in tasks:
+                yield await finished.get()
+        finally:
+            # The client went away: stop answering the rest
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> dict:
+        """Runtime counters for the /api/stats endpoint."""
+        served = self.fast_path_served
+        stats = {
+            "provider": self.provider.name,
+            "answer_cache": self.answer_cache.stats(),
+            "coalescing": self.single_flight.stats(),
+            "upstream_limiter": self.limiter.stats(),
+            "circuit_breaker": self.breaker.stats(),
+            "retries": self.retry.stats(),
+            "prompt_cache": self.prompt_cache.stats(),
+            "fast_path": {
+                "requests": self.requests_total,
+                "served": served,
+                "share": round(served / self.requests_total, 4) if self.requests_total else 0.0,
+                "avg_latency_us": round(self.fast_path_seconds / served * 1e6, 1) if served else 0.0,
+            },
+        }
+        routing = self.provider.stats()
+        if routing:
+            stats["routing"] = routing
+        return stats
 
 
 # Singleton instance
@@ -0,0 +1,47 @@
+"""Compile the FAQ document ahead of time.
+
+Parses the .docx and writes the entries, content hash and vector index to
+INDEX_CACHE_DIR, where the server loads them at startup instead of reading
+and parsing the document (python-docx isn't even imported then). Run it
+as a build step, e.g. before building the Docker image:
+
+    python compile_faq.py
+    python compile_faq.py --document "People Connect FAQ.docx"
+
+Compiling content that is already compiled reuses the existing result.
+Prints a JSON summary and exits with status 1 if no FAQ entries were
+found.
+"""
+
+import argparse
+import json
+import logging
+import sys
+import time
+from pathlib import Path
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document", type=Path, default=None, help="FAQ .docx (default: the configured one)")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    started = time.perf_counter()
+    from knowledge_base import _compiled_dir, build_knowledge_base
+
+    kb = build_knowledge_base(args.document)
+    summary = {
+        "document": str(kb.source_path),
+        "content_hash": kb.content_hash,
+        "entries": len(kb.entries),
+        "compiled_to": str(_compiled_dir(kb.content_hash)),
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+    print(json.dumps(summary, indent=2))
+    if not kb.entries:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
@@ -0,0 +1,203 @@
+"""Concurrency helpers for upstream LLM calls."""
+
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight:
+    """Collapse concurrent calls with the same key into one upstream call.
+
+    The first caller for a key starts the work as a task; callers arriving
+    while it is still running await the same task instead of starting their
+    own. The task is shielded, so one caller disconnecting doesn't cancel
+    the call for everyone else.
+    """
+
+    def __init__(self):
+        self._in_flight: dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.collapsed = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn() for key, or join the call already in flight."""
+        task = self._in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda t: self._forget(key, t))
+            self.leaders += 1
+        else:
+            self.collapsed += 1
+        return await asyncio.shield(task)
+
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark the exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            "in_flight": len(self._in_flight),
+            "upstream_calls": self.leaders,
+            "collapsed": self.collapsed,
+        }
+
+
+class Overloaded(Exception):
+    """No upstream slot: the wait queue was full or the wait timed out."""
+
+
+class ConcurrencyLimiter:
+    """Cap concurrent upstream calls, with a bounded FIFO wait queue.
+
+    Callers beyond the limit wait in line for at most queue_timeout
+    seconds; when max_queue callers are already waiting, acquire() fails
+    at once instead, so a burst is shed rather than slowing every request
+    down together.
+
+    In adaptive mode the limit moves between min_limit and limit by AIMD
+    on observed call latency: it grows by about one per limit's worth of
+    calls made at the limit, and shrinks by 10% whenever recent latency
+    exceeds latency_tolerance times the baseline (the lowest recent
+    latency, which drifts up slowly so longer answers don't pin it).
+    """
+
+    def __init__(
+        self,
+        limit: int,
+        max_queue: int,
+        queue_timeout: float,
+        adaptive: bool = False,
+        min_limit: int = 1,
+        latency_tolerance: float = 2.0,
+    ):
+        self.max_limit = max(1, limit)
+        self.min_limit = max(1, min(min_limit, self.max_limit))
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.adaptive = adaptive
+        self.latency_tolerance = latency_tolerance
+        self._limit = float(self.max_limit)
+        self._baseline: float | None = None
+        self._recent: float | None = None
+        self._waiters: deque[asyncio.Future] = deque()
+        self.active = 0
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waited = 0  # admitted after queueing
+        self.wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    @property
+    def limit(self) -> int:
+        """Current number of calls allowed at once."""
+        return int(self._limit)
+
+    @property
+    def queued(self) -> int:
+        """Callers waiting for a slot."""
+        return len(self._waiters)
+
+    async def acquire(self) -> float:
+        """Wait for a slot.
+
+        Returns:
+            Seconds spent waiting in the queue
+
+        Raises:
+            Overloaded: If the queue is full or the wait hit queue_timeout
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+        if len(self._waiters) >= self.max_queue:
+            self.rejected += 1
+            raise Overloaded(f"{len(self._waiters)} calls already waiting")
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self.queued_total += 1
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as we gave up: pass it on
+                self.release()
+            else:
+                self._remove(waiter)
+            if isinstance(e, asyncio.TimeoutError):
+                self.timed_out += 1
+                raise Overloaded(f"no slot within {self.queue_timeout:g}s") from None
+            raise
+        waited = time.perf_counter() - started
+        self.admitted += 1
+        self.waited += 1
+        self.wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return waited
+
+    def release(self, latency: float | None = None) -> None:
+        """Give a slot back.
+
+        Args:
+            latency: Seconds the call took, for the adaptive limit
+        """
+        at_limit = self.active >= self.limit
+        self.active -= 1
+        if self.adaptive and latency is not None:
+            self._adapt(latency, at_limit)
+        self._wake()
+
+    def _remove(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def _wake(self) -> None:
+        # Slots are handed over in FIFO order; the woken caller owns it
+        while self._waiters and self.active < self.limit:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                self.active += 1
+                waiter.set_result(None)
+
+    def _adapt(self, latency: float, at_limit: bool) -> None:
+        if self._baseline is None:
+            self._baseline = self._recent = latency
+            return
+        # The baseline follows drops at once and rises at 1% per sample
+        self._baseline = min(latency, self._baseline + (latency - self._baseline) * 0.01)
+        self._recent += (latency - self._recent) * 0.2
+        if self._recent > self._baseline * self.latency_tolerance:
+            self._limit = max(float(self.min_limit), self._limit * 0.9)
+        elif at_limit:
+            self._limit = min(float(self.max_limit), self._limit + 1 / self._limit)
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            "limit": self.limit,
+            "max_limit": self.max_limit,
+            "adaptive": self.adaptive,
+            "active": self.active,
+            "queued": self.queued,
+            "max_queue": self.max_queue,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "timed_out": self.timed_out,
+            "queued_total": self.queued_total,
+            "avg_wait_ms": round(self.wait_seconds / self.waited * 1000, 2) if self.waited else 0.0,
+            "max_wait_ms": round(self.max_wait_seconds * 1000, 2),
+        }
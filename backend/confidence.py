@@ -0,0 +1,232 @@
+"""Confidence scoring for chatbot answers.
+
+All uncertainty phrases are compiled into one regex factored like a trie
+(phrases sharing a prefix share a branch), so an answer is lowercased and
+scanned once however many phrases there are, and its words are counted
+once. The text heuristic is then blended with whichever other
+signals the caller has: how well the question matched the FAQ, and the
+provider's token log-probabilities.
+
+Kept free of backend settings so the single-file simple_chatbot.py can use
+it too.
+"""
+
+import math
+import re
+from dataclasses import dataclass
+
+
+@dataclass(frozen=True, slots=True)
+class Rule:
+    """Caps the confidence of any answer containing one of its phrases."""
+
+    name: str
+    phrases: tuple[str, ...]
+    max_confidence: float
+
+
+DEFAULT_RULES = (
+    Rule(
+        "uncertain",
+        ("i'm not sure", "i don't know", "unclear", "cannot confirm"),
+        0.5,
+    ),
+    # The model sends the associate to HR when it can't answer
+    Rule(
+        "referral",
+        (
+            "recommend contacting",
+            "please contact",
+            "check with hr",
+            "submit your request",
+            "sharepoint list",
+        ),
+        0.5,
+    ),
+)
+
+
+def _normalize_phrase(text: str) -> str:
+    return " ".join(text.lower().replace("’", "'").split())
+
+
+def _char_pattern(char: str) -> str:
+    # Models often write curly apostrophes and wrap lines mid-phrase
+    if char == "'":
+        return "['’]"
+    if char == " ":
+        return r"\s+"
+    return re.escape(char)
+
+
+def compile_phrases(phrases: list[str]) -> re.Pattern | None:
+    """Compile lowercase phrases into one trie-shaped alternation."""
+    trie: dict = {}
+    for phrase in phrases:
+        node = trie
+        for char in _normalize_phrase(phrase):
+            node = node.setdefault(char, {})
+        node[""] = {}  # end of a phrase
+
+    def build(node: dict) -> str:
+        branches = [_char_pattern(char) + build(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ""
+        optional = "" in node  # a phrase ends here but longer ones continue
+        if len(branches) == 1 and not optional:
+            return branches[0]
+        return "(?:" + "|".join(branches) + ")" + ("?" if optional else "")
+
+    return re.compile(build(trie)) if trie else None
+
+
+def logprob_confidence(token_logprobs: list[float]) -> float | None:
+    """Geometric-mean token probability of an answer, or None without logprobs."""
+    if not token_logprobs:
+        return None
+    return math.exp(sum(token_logprobs) / len(token_logprobs))
+
+
+class ConfidenceScorer:
+    """Scores an answer from its text plus optional retrieval and logprob signals."""
+
+    def __init__(
+        self,
+        rules: tuple[Rule, ...] = DEFAULT_RULES,
+        retrieval_weight: float = 0.2,
+        logprob_weight: float = 0.3,
+        short_answer_words: int = 10,
+        detailed_answer_words: int = 30,
+    ):
+        self.rules = tuple(rules)
+        self.retrieval_weight = retrieval_weight
+        self.logprob_weight = logprob_weight
+        self.short_answer_words = short_answer_words
+        self.detailed_answer_words = detailed_answer_words
+        # Each phrase maps back to the strictest rule containing it
+        self._phrase_caps: dict[str, float] = {}
+        for rule in self.rules:
+            for phrase in rule.phrases:
+                key = _normalize_phrase(phrase)
+                self._phrase_caps[key] = min(
+                    rule.max_confidence, self._phrase_caps.get(key, rule.max_confidence)
+                )
+        self._pattern = compile_phrases(list(self._phrase_caps))
+
+    def with_rules(self, *rules: Rule) -> "ConfidenceScorer":
+        """A scorer with extra rules added to this one's."""
+        return ConfidenceScorer(
+            self.rules + rules,
+            retrieval_weight=self.retrieval_weight,
+            logprob_weight=self.logprob_weight,
+            short_answer_words=self.short_answer_words,
+            detailed_answer_words=self.detailed_answer_words,
+        )
+
+    def _analyze(self, text: str) -> tuple[float | None, int]:
+        """One pass over the text: (strictest matched rule cap, word count)."""
+        lower = text.lower()
+        cap = None
+        if self._pattern is not None:
+            for match in self._pattern.findall(lower):
+                phrase_cap = self._phrase_caps[_normalize_phrase(match)]
+                cap = phrase_cap if cap is None else min(cap, phrase_cap)
+        return cap, len(lower.split())
+
+    def _length_score(self, words: int) -> float:
+        # Very short answers are often unsure; detailed ones usually aren't
+        if words < self.short_answer_words:
+            return 0.6
+        if words > self.detailed_answer_words:
+            return 0.85
+        return 0.8
+
+    def text_score(self, text: str) -> float:
+        """Heuristic confidence from the answer text alone."""
+        cap, words = self._analyze(text)
+        return cap if cap is not None else self._length_score(words)
+
+    def score(
+        self,
+        text: str,
+        retrieval_score: float | None = None,
+        token_logprobs: list[float] | None = None,
+    ) -> float:
+        """Overall confidence in [0, 1].
+
+        Args:
+            text: The answer
+            retrieval_score: 0-1 match of the question against the best FAQ entry
+            token_logprobs: Provider log-probabilities of the answer tokens
+
+        An answer that hedges or refers the associate to HR is capped by its
+        rule regardless of the other signals. Otherwise each available
+        signal moves the text heuristic by its own weight; a missing signal's
+        weight stays with the text heuristic rather than being shared out,
+        so with no other signals the score is the text score alone and a
+        weak FAQ match alone can't outweigh a detailed answer.
+        """
+        cap, words = self._analyze(text)
+        if cap is not None:
+            return cap
+
+        text_weight = 1.0
+        total = 0.0
+        if retrieval_score is not None:
+            total += max(0.0, min(retrieval_score, 1.0)) * self.retrieval_weight
+            text_weight -= self.retrieval_weight
+        token_probability = logprob_confidence(token_logprobs or [])
+        if token_probability is not None:
+            total += token_probability * self.logprob_weight
+            text_weight -= self.logprob_weight
+        return round(total + self._length_score(words) * text_weight, 4)
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python confidence.py
+    import random
+    import time
+
+    random.seed(0)
+    words = "you can use your ppto balance for the shift and call off in the app".split()
+    default_phrases = [phrase for rule in DEFAULT_RULES for phrase in rule.phrases]
+    extra_rule = Rule(
+        "extra",
+        tuple(f"{word} policy {i}" for i, word in enumerate(["may", "might", "varies", "depends"] * 12)),
+        0.6,
+    )
+
+    def legacy(phrases: list[str]):
+        # What each service used to do: one scan per phrase, two splits
+        def score(text: str) -> float:
+            lower = text.lower()
+            if any(phrase in lower for phrase in phrases):
+                return 0.5
+            if len(text.split()) < 10:
+                return 0.6
+            if len(text.split()) > 30:
+                return 0.85
+            return 0.8
+
+        return score
+
+    for scorer in [ConfidenceScorer(), ConfidenceScorer().with_rules(extra_rule)]:
+        phrases = [phrase for rule in scorer.rules for phrase in rule.phrases]
+        answers = []
+        for i in range(2000):
+            text = " ".join(random.choices(words, k=random.randint(5, 120)))
+            if i % 4 == 0:
+                text += f" {random.choice(default_phrases)}."
+            answers.append(text)
+
+        for name, fn in [
+            ("legacy", legacy(phrases)),
+            ("text_score", scorer.text_score),
+            ("score", lambda t: scorer.score(t, retrieval_score=0.7, token_logprobs=[-0.1, -0.2])),
+        ]:
+            start = time.perf_counter()
+            for _ in range(5):
+                for text in answers:
+                    fn(text)
+            per_call_us = (time.perf_counter() - start) / (5 * len(answers)) * 1e6
+            print(f"{len(phrases)} phrases, {name}: {per_call_us:.1f} us/call")
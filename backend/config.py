@@ -6,16 +6,106 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     """Application settings loaded from environment variables."""
 
+    # LLM provider: "azure", "openai" or "ollama" (see SWITCH_AI_PROVIDER.md).
+    # When unset, USE_AZURE_OPENAI chooses between Azure and OpenAI.
+    llm_provider: str | None = None
+    # Several providers, e.g. "azure,ollama": each request goes to the
+    # fastest healthy one (the first is preferred until others are measured)
+    llm_providers: str | None = None
+    router_max_error_rate: float = 0.5  # recent failure share that marks a provider unhealthy
+    router_explore_ratio: float = 0.05  # share of requests sent to another provider first
+    # Hedging: when the chosen provider takes longer than its p95 (and at
+    # least the min delay), also ask the next best one and take the first answer
+    router_hedge_enabled: bool = False
+    router_hedge_min_delay: float = 1.0  # seconds
+
     # Regular OpenAI (for simple setup)
     use_azure_openai: bool = True
     openai_api_key: str | None = None
     openai_model: str = "gpt-4o-mini"
+    openai_base_url: str | None = None  # any OpenAI-compatible server, e.g. the local stub
+    openai_timeout: float = 30.0  # seconds per call, replacing the SDK's 600 s default
 
     # Walmart Element GenAI LLM Gateway (or Azure OpenAI)
     azure_openai_endpoint: str = "https://dummy.com"
     azure_openai_api_key: str = "dummy"
     azure_openai_deployment_name: str = "gpt-4.1-mini@2025-04-14"
     azure_openai_api_version: str = "2024-10-21"
+    azure_openai_timeout: float = 30.0
+
+    # Local Ollama (see SWITCH_AI_PROVIDER.md)
+    ollama_base_url: str = "http://localhost:11434"
+    ollama_model: str = "llama3.2:3b"  # Fast, small model (or use 'llama3.2' for larger)
+    ollama_keep_alive: str = "24h"  # how long Ollama keeps the model loaded when idle
+    ollama_timeout: float = 120.0  # Local LLM might take a bit longer
+
+    # Answer straight from the FAQ (no LLM call) when a question nearly
+    # matches an FAQ question
+    faq_fast_path_enabled: bool = True
+    faq_fast_path_threshold: float = 0.8  # minimum 0-1 question match
+    # Character n-grams see "6th"/"8th" and "PTO"/"PPTO" as near-identical,
+    # so similarity alone only qualifies a hit when almost verbatim
+    faq_fast_path_similarity_threshold: float = 0.97
+    # When the LLM can't be used (breaker open, overloaded), the closest FAQ
+    # entry is only served if it matches at least this well (0-1, keyword
+    # match or similarity); otherwise the HR fallback is shown
+    faq_fallback_threshold: float = 0.5
+
+    # Answer cache for repeated questions (keyed on question + FAQ content)
+    answer_cache_size: int = 512
+    answer_cache_ttl: float = 900.0  # seconds
+    answer_cache_max_history: int = 2  # only cache chats with at most this many prior messages
+
+    # Shared HTTP connection pool for LLM requests
+    http_max_connections: int = 100
+    http_max_keepalive_connections: int = 20
+    http_keepalive_expiry: float = 30.0  # seconds an idle connection stays open
+    http_timeout: float = 60.0
+    http_connect_timeout: float = 10.0
+    http2: bool = True
+
+    # Upstream LLM concurrency: calls beyond the limit wait in a bounded
+    # queue; a full queue or a wait past the timeout is answered from the FAQ
+    llm_max_concurrency: int = 16
+    llm_max_queue: int = 64
+    llm_queue_timeout: float = 10.0  # seconds
+    # Adaptive mode tunes the limit between the min and max from latency
+    llm_adaptive_concurrency: bool = False
+    llm_min_concurrency: int = 2
+    llm_latency_tolerance: float = 2.0  # shrink when latency exceeds this x baseline
+
+    # Retries of failed provider calls: jittered exponential backoff, with
+    # retries kept below LLM_RETRY_BUDGET_RATIO of requests overall
+    llm_max_retries: int = 2
+    llm_retry_base_delay: float = 0.2  # seconds
+    llm_retry_max_delay: float = 2.0
+    llm_retry_budget_ratio: float = 0.1
+
+    # Circuit breaker: after this many consecutive failed (or slower than
+    # BREAKER_SLOW_CALL_SECONDS) calls, answer from the FAQ only and probe
+    # the provider in the background until it recovers
+    breaker_failure_threshold: int = 5
+    breaker_slow_call_seconds: float = 20.0  # streams: time to first token
+    ollama_slow_call_seconds: float | None = None  # CPU generation is slow; timeouts still count
+    breaker_probe_interval: float = 10.0  # seconds between probes
+
+    # /api/chat/batch: questions per request, and how many are answered at
+    # once (keep this below LLM_MAX_CONCURRENCY to leave room for live chats)
+    batch_max_questions: int = 200
+    batch_concurrency: int = 4
+
+    # Server-side conversation sessions
+    session_backend: str = "memory"  # "memory" or "sqlite"
+    session_sqlite_path: str = "sessions.db"
+    session_idle_ttl: float = 1800.0  # seconds without a message before a session expires
+    session_max_messages: int = 20  # messages kept per session (oldest dropped first)
+    session_max_sessions: int = 10000
+    session_max_bytes: int = 50_000_000  # memory backend only
+
+    # Request tracing: per-stage timings in a Server-Timing header, and as
+    # JSON records on the "trace" logger for this share of requests
+    server_timing_enabled: bool = True
+    trace_sample_rate: float = 0.0
 
     # Microsoft List
     microsoft_list_url: str
@@ -25,9 +115,37 @@ class Settings(BaseSettings):
 
     # Chatbot behavior
     confidence_threshold: float = 0.7
+    # Confidence blends the answer-text heuristic with the FAQ match score
+    # and, when requested from the provider, token logprobs
+    confidence_retrieval_weight: float = 0.2
+    confidence_logprob_weight: float = 0.3
+    confidence_logprobs: bool = False
     max_tokens: int = 500
     temperature: float = 0.7
 
+    # Knowledge base
+    faq_document_path: str | None = None
+    kb_watch_interval: float = 5.0  # seconds between FAQ document change checks
+    # A failed startup warm-up is retried after this delay, doubling up to the max
+    warm_up_retry_delay: float = 1.0
+    warm_up_retry_max_delay: float = 30.0
+
+    # Prompt assembly: "retrieval" sends only the best-matching FAQ entries,
+    # "full" sends the whole FAQ document with every request
+    prompt_mode: str = "retrieval"
+    retrieval_method: str = "hybrid"  # "bm25", "vector" or "hybrid"
+    vector_index_dim: int = 2048
+    vector_min_score: float = 0.1
+    index_cache_dir: str = ".cache"  # relative to the backend directory
+    retrieval_top_k: int = 5
+    retrieval_token_budget: int = 1500
+
+    # Conversation history: recent turns fill the budget newest first, older
+    # ones are condensed into a summary of at most history_summary_tokens
+    context_window_tokens: int = 8192  # model context window
+    history_token_budget: int = 2000
+    history_summary_tokens: int = 200
+
     model_config = SettingsConfigDict(
         env_file=".env",
         env_file_encoding="utf-8",
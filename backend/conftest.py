@@ -0,0 +1,70 @@
+"""Shared pytest fixtures for the HR Chatbot backend."""
+
+import os
+
+os.environ.setdefault("MICROSOFT_LIST_URL", "https://example.com/lists/hr")
+
+import pytest
+from docx import Document
+
+import knowledge_base
+from config import settings
+
+
+SAMPLE_FAQ = [
+    (
+        "If I leave before my 5th hour, is it a full point?",
+        "It will be a full point. Leaving prior to hitting your 5th hour is "
+        "considered an incomplete shift.",
+    ),
+    (
+        "Do I have to take a lunch if I leave at my 6th hour?",
+        "If you leave at your 6th hour or prior to your 6th hour you do not "
+        "have to take a lunch.",
+    ),
+    (
+        "Can I use PTO for an emergency?",
+        "No, PTO requires associates to submit the request for approval in "
+        "advance. To cover emergencies, you must use PPTO.",
+    ),
+    (
+        "How do I check my PTO balance?",
+        "You can check your PTO and PPTO balance in the Me@Walmart app "
+        "under My Schedule.",
+    ),
+    (
+        "What benefits does Walmart offer?",
+        "Walmart offers health insurance, dental, vision, a 401k with company "
+        "match and the associate discount.",
+    ),
+    (
+        "Do I still have to call off when I put PPTO?",
+        "Yes, you still need to call off through the attendance hotline even "
+        "when you use PPTO.",
+    ),
+]
+
+
+def write_faq_docx(path, entries=SAMPLE_FAQ):
+    """Write a People Connect style FAQ document."""
+    doc = Document()
+    for question, answer in entries:
+        doc.add_paragraph(f"Question: {question}")
+        doc.add_paragraph(f"Answer: {answer}")
+        doc.add_paragraph("")
+    doc.save(path)
+    return path
+
+
+@pytest.fixture
+def faq_docx(tmp_path, monkeypatch):
+    """Point the knowledge base at a temporary FAQ document."""
+    path = write_faq_docx(tmp_path / "faq.docx")
+    monkeypatch.setattr(settings, "faq_document_path", str(path))
+    monkeypatch.setattr(settings, "index_cache_dir", str(tmp_path / "cache"))
+    knowledge_base.reload_knowledge_base()
+    yield path
+    monkeypatch.undo()
+    # Start over rather than keep serving the temporary document
+    knowledge_base._current_kb = None
+    knowledge_base.reload_knowledge_base()
@@ -0,0 +1,278 @@
+"""Offline retrieval quality and latency regression suite.
+
+Builds the knowledge base from the FAQ document exactly as the server
+does, turns every Question/Answer pair into a set of queries (the
+question verbatim, paraphrased, truncated, and cut down to its keywords)
+and runs them through search_faq with no network. Prints a JSON report
+with recall@1, recall@5 and MRR per kind of query, plus per-query
+latency percentiles, and compares it with a stored baseline: any
+regression beyond the tolerances makes the run exit with status 1.
+
+    python eval_retrieval.py                         # compare with retrieval_baseline.json
+    python eval_retrieval.py --update-baseline       # accept the current numbers
+    python eval_retrieval.py --method bm25 --baseline bm25_baseline.json
+
+Latency depends on the machine; --no-latency-check compares quality only.
+"""
+
+import argparse
+import json
+import logging
+import math
+import random
+import re
+import sys
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+from faq_index import STOPWORDS, FAQEntry
+
+DEFAULT_BASELINE = Path(__file__).parent / "retrieval_baseline.json"
+QUERY_KINDS = ("exact", "paraphrase", "truncated", "keywords")
+METRICS = ("recall@1", "recall@5", "mrr")
+K = 5
+
+# Rewrites an associate might use for the same question; every rule that
+# matches is applied
+PARAPHRASE_RULES = [
+    (r"^can i ", "am i allowed to "),
+    (r"^do i (have|need) to ", "am i required to "),
+    (r"^do i still have to ", "am i still required to "),
+    (r"^how do i ", "what's the way to "),
+    (r"^is it ", "would it be "),
+    (r"^if i ", "say i "),
+    (r"^what ", "which "),
+    (r"\bppto\b", "protected paid time off"),
+    (r"\bpto\b", "paid time off"),
+    (r"\bcheck\b", "see"),
+    (r"\bleave\b", "go home"),
+    (r"\boffer\b", "provide"),
+]
+PARAPHRASE_PREFIXES = ["", "quick question, ", "hey, ", "i was wondering "]
+_WORD_RE = re.compile(r"[a-z0-9@']+")
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list (as in load_test.py)."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+@dataclass(frozen=True, slots=True)
+class QueryCase:
+    query: str
+    kind: str
+    expected: str  # question of the entry that should come first
+
+
+def paraphrase(question: str, rng: random.Random) -> str:
+    text = question.lower().rstrip("?").strip()
+    for pattern, replacement in PARAPHRASE_RULES:
+        text = re.sub(pattern, replacement, text)
+    return f"{rng.choice(PARAPHRASE_PREFIXES)}{text}"
+
+
+def truncate(question: str, share: float = 0.6) -> str:
+    """The first part of the question, as if the associate stopped typing."""
+    words = _WORD_RE.findall(question.lower())
+    return " ".join(words[: max(3, math.ceil(len(words) * share))])
+
+
+def keywords(question: str) -> str:
+    """The question without stopwords, as typed into a search box."""
+    return " ".join(word for word in _WORD_RE.findall(question.lower()) if word not in STOPWORDS)
+
+
+def make_queries(entries: list[FAQEntry], seed: int = 0) -> list[QueryCase]:
+    """Every kind of query for every entry, skipping empty or repeated ones."""
+    rng = random.Random(seed)
+    cases = []
+    for entry in entries:
+        variants = {
+            "exact": entry.question,
+            "paraphrase": paraphrase(entry.question, rng),
+            "truncated": truncate(entry.question),
+            "keywords": keywords(entry.question),
+        }
+        seen = set()
+        for kind in QUERY_KINDS:
+            query = variants[kind]
+            if query and query.lower() not in seen:
+                seen.add(query.lower())
+                cases.append(QueryCase(query, kind, entry.question))
+    return cases
+
+
+def _quality(ranks: list[int | None]) -> dict:
+    count = len(ranks)
+    return {
+        "queries": count,
+        "recall@1": round(sum(rank == 1 for rank in ranks) / count, 4),
+        "recall@5": round(sum(rank is not None and rank <= 5 for rank in ranks) / count, 4),
+        "mrr": round(sum(1 / rank for rank in ranks if rank is not None) / count, 4),
+    }
+
+
+def evaluate(kb, cases: list[QueryCase], repeat: int = 5) -> dict:
+    """Run the queries through search_faq and score the rankings.
+
+    Args:
+        kb: Knowledge base snapshot to search
+        cases: Queries with the question each should retrieve
+        repeat: Timed passes over the queries (after one warm-up pass)
+    """
+    from knowledge_base import search_faq
+
+    for case in cases:
+        search_faq(case.query, K, kb)
+
+    ranks: list[int | None] = []
+    latencies: list[float] = []
+    for case in cases:
+        hits = search_faq(case.query, K, kb)
+        questions = [hit.entry.question for hit in hits]
+        ranks.append(questions.index(case.expected) + 1 if case.expected in questions else None)
+    for _ in range(repeat):
+        for case in cases:
+            started = time.perf_counter()
+            search_faq(case.query, K, kb)
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    quality = {"overall": _quality(ranks)}
+    for kind in QUERY_KINDS:
+        kind_ranks = [rank for case, rank in zip(cases, ranks) if case.kind == kind]
+        if kind_ranks:
+            quality[kind] = _quality(kind_ranks)
+    latencies.sort()
+    return {
+        "quality": quality,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 4),
+            "p95": round(percentile(latencies, 95), 4),
+            "p99": round(percentile(latencies, 99), 4),
+            "max": round(latencies[-1], 4) if latencies else 0.0,
+        },
+        # Queries whose entry didn't come first, to see what broke
+        "misses": [
+            {"query": case.query, "kind": case.kind, "expected": case.expected, "rank": rank}
+            for case, rank in zip(cases, ranks)
+            if rank != 1
+        ],
+    }
+
+
+def compare(
+    report: dict,
+    baseline: dict,
+    quality_tolerance: float = 0.01,
+    latency_tolerance: float = 0.5,
+    latency_floor_ms: float = 0.5,
+) -> list[str]:
+    """Regressions of the report against the baseline, as readable lines.
+
+    A quality metric regresses when it drops by more than quality_tolerance
+    (absolute). p95/p99 latency regresses when it is more than
+    latency_tolerance (relative) and latency_floor_ms slower, so
+    sub-millisecond jitter doesn't fail the run; pass latency_tolerance=None
+    to skip the latency check.
+    """
+    regressions = []
+    for kind, expected in baseline.get("quality", {}).items():
+        current = report["quality"].get(kind)
+        if current is None:
+            continue
+        for metric in METRICS:
+            if current[metric] < expected[metric] - quality_tolerance:
+                regressions.append(f"{kind} {metric} fell from {expected[metric]} to {current[metric]}")
+    if latency_tolerance is not None:
+        for name in ("p95", "p99"):
+            expected = baseline.get("latency_ms", {}).get(name)
+            current = report["latency_ms"][name]
+            if (
+                expected is not None
+                and current > expected * (1 + latency_tolerance)
+                and current - expected > latency_floor_ms
+            ):
+                regressions.append(f"latency {name} rose from {expected} ms to {current} ms")
+    return regressions
+
+
+def run_eval(document: Path | None = None, seed: int = 0, repeat: int = 5) -> dict:
+    """Build the knowledge base from the document and evaluate it."""
+    from config import settings
+    from knowledge_base import build_knowledge_base
+
+    kb = build_knowledge_base(document)
+    cases = make_queries(list(kb.entries), seed)
+    report = {
+        "document": str(kb.source_path),
+        "content_hash": kb.content_hash,
+        "method": settings.retrieval_method,
+        "entries": len(kb.entries),
+    }
+    if cases:
+        report.update(evaluate(kb, cases, repeat))
+    return report
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--document", type=Path, default=None, help="FAQ .docx (default: the configured one)")
+    parser.add_argument("--method", choices=["bm25", "vector", "hybrid"], default=None, help="override RETRIEVAL_METHOD")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--update-baseline", action="store_true", help="write this run as the new baseline")
+    parser.add_argument("--repeat", type=int, default=5, help="timed passes over the queries")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--quality-tolerance", type=float, default=0.01)
+    parser.add_argument("--latency-tolerance", type=float, default=0.5)
+    parser.add_argument("--no-latency-check", action="store_true")
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    if args.method:
+        from config import settings
+
+        settings.retrieval_method = args.method
+
+    report = run_eval(args.document, args.seed, args.repeat)
+    if "quality" not in report:
+        print(f"No FAQ entries found in {report['document']}", file=sys.stderr)
+        sys.exit(2)
+
+    status = 0
+    if args.update_baseline:
+        baseline = {key: report[key] for key in ("content_hash", "method", "entries", "quality", "latency_ms")}
+        args.baseline.write_text(json.dumps(baseline, indent=2) + "\n", encoding="utf-8")
+    elif args.baseline.exists():
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        if baseline.get("content_hash") != report["content_hash"]:
+            print("Baseline was recorded for a different FAQ document", file=sys.stderr)
+        if baseline.get("method") != report["method"]:
+            print(f"Baseline was recorded with RETRIEVAL_METHOD={baseline.get('method')}", file=sys.stderr)
+        report["regressions"] = compare(
+            report,
+            baseline,
+            quality_tolerance=args.quality_tolerance,
+            latency_tolerance=None if args.no_latency_check else args.latency_tolerance,
+        )
+        status = 1 if report["regressions"] else 0
+    else:
+        print(f"No baseline at {args.baseline}; run with --update-baseline to record one", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    for regression in report.get("regressions", []):
+        print(f"REGRESSION: {regression}", file=sys.stderr)
+    sys.exit(status)
+
+
+if __name__ == "__main__":
+    cli()
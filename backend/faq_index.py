@@ -0,0 +1,200 @@
+"""Structured FAQ records and a BM25 inverted index for fast retrieval."""
+
+import heapq
+import math
+import re
+from array import array
+from collections import Counter
+from operator import itemgetter
+from typing import Iterable, NamedTuple
+
+# Common words that carry no retrieval signal in HR questions
+STOPWORDS = frozenset(
+    """
+    a an and are as at be but by can could do does did for from get got
+    have has had how i if in into is it its me my of on or our so than that
+    the their them then there these they this to was we were what when
+    where which who why will with would you your
+    """.split()
+)
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def _stem(token: str) -> str:
+    """Strip common English suffixes so 'leaving', 'leaves' and 'leave' match."""
+    if len(token) > 5 and token.endswith("ing"):
+        token = token[:-3]
+    elif len(token) > 4 and token.endswith("ed"):
+        token = token[:-2]
+    elif len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+        token = token[:-1]
+    if len(token) > 3 and token.endswith("e"):
+        token = token[:-1]
+    return token
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercase, split into words, drop stopwords and stem."""
+    return [
+        _stem(token)
+        for token in _TOKEN_RE.findall(text.lower().replace("'", ""))
+        if token not in STOPWORDS
+    ]
+
+
+class FAQEntry:
+    """A single Question/Answer pair from the FAQ document."""
+
+    __slots__ = ("id", "question", "answer", "question_terms")
+
+    def __init__(self, id: int, question: str, answer: str):
+        self.id = id
+        self.question = question
+        self.answer = answer
+        self.question_terms = frozenset(tokenize(question))
+
+    def __repr__(self) -> str:
+        return f"FAQEntry(id={self.id}, question={self.question!r})"
+
+    def format(self) -> str:
+        """Render the entry the way it appears in the system prompt."""
+        return f"Q: {self.question}\nA: {self.answer}"
+
+
+class FAQHit(NamedTuple):
+    """A scored search result."""
+
+    entry: FAQEntry
+    score: float  # raw BM25 score, only comparable within one query
+    match: float  # 0-1 IDF-weighted overlap between query and question terms
+    similarity: float = 0.0  # 0-1 vector similarity to the question, if computed
+
+
+class FAQIndex:
+    """BM25 inverted index over FAQ questions and answers.
+
+    Per-posting BM25 weights are precomputed at build time, so a query is
+    just a dictionary walk over the postings of its (few) terms.
+    """
+
+    def __init__(
+        self,
+        entries: Iterable[FAQEntry],
+        k1: float = 1.2,
+        b: float = 0.75,
+        question_weight: int = 2,
+    ):
+        self.entries: tuple[FAQEntry, ...] = tuple(entries)
+        n = len(self.entries)
+
+        term_freqs: list[Counter] = []
+        doc_lengths = array("d")
+        for entry in self.entries:
+            tf = Counter(tokenize(entry.answer))
+            for term in tokenize(entry.question):
+                tf[term] += question_weight
+            term_freqs.append(tf)
+            doc_lengths.append(sum(tf.values()))
+
+        avg_length = (sum(doc_lengths) / n) if n else 0.0
+        doc_freq: Counter = Counter()
+        for tf in term_freqs:
+            doc_freq.update(tf.keys())
+
+        self.idf: dict[str, float] = {
+            term: math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for term, df in doc_freq.items()
+        }
+        # IDF assigned to query terms that never occur in the FAQ
+        self.unknown_idf = math.log(1 + (n + 0.5) / 0.5)
+
+        doc_ids: dict[str, array] = {}
+        weights: dict[str, array] = {}
+        for doc_id, (tf, length) in enumerate(zip(term_freqs, doc_lengths)):
+            norm = k1 * (1 - b + b * length / avg_length) if avg_length else k1
+            for term, freq in tf.items():
+                if term not in doc_ids:
+                    doc_ids[term] = array("I")
+                    weights[term] = array("d")
+                doc_ids[term].append(doc_id)
+                weights[term].append(self.idf[term] * freq * (k1 + 1) / (freq + norm))
+
+        self._postings: dict[str, tuple[array, array]] = {
+            term: (doc_ids[term], weights[term]) for term in doc_ids
+        }
+        self._question_idf_sums = array(
+            "d",
+            (sum(self.idf.get(t, 0.0) for t in e.question_terms) for e in self.entries),
+        )
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def _match(self, query_terms: set[str], query_idf: float, doc_id: int) -> float:
+        """IDF-weighted F1 between the query terms and an entry's question terms."""
+        question_terms = self.entries[doc_id].question_terms
+        overlap = sum(self.idf[t] for t in query_terms if t in question_terms)
+        if not overlap:
+            return 0.0
+        precision = overlap / query_idf
+        recall = overlap / self._question_idf_sums[doc_id]
+        return 2 * precision * recall / (precision + recall)
+
+    def match(self, query: str, doc_ids: Iterable[int]) -> list[float]:
+        """Question match scores (see FAQHit.match) for the given entries."""
+        query_terms = set(tokenize(query))
+        query_idf = sum(self.idf.get(t, self.unknown_idf) for t in query_terms)
+        return [self._match(query_terms, query_idf, doc_id) for doc_id in doc_ids]
+
+    def search(self, query: str, k: int = 5) -> list[FAQHit]:
+        """Return up to k entries ranked by BM25 score (best first)."""
+        query_terms = set(tokenize(query))
+        if not query_terms or k <= 0:
+            return []
+
+        scores: dict[int, float] = {}
+        for term in query_terms:
+            posting = self._postings.get(term)
+            if posting is None:
+                continue
+            for doc_id, weight in zip(*posting):
+                scores[doc_id] = scores.get(doc_id, 0.0) + weight
+        if not scores:
+            return []
+
+        query_idf = sum(self.idf.get(t, self.unknown_idf) for t in query_terms)
+        top = heapq.nlargest(k, scores.items(), key=itemgetter(1))
+        return [
+            FAQHit(self.entries[doc_id], score, self._match(query_terms, query_idf, doc_id))
+            for doc_id, score in top
+        ]
+
+
+if __name__ == "__main__":
+    # Micro-benchmark: python faq_index.py
+    import random
+    import time
+
+    random.seed(0)
+    vocabulary = [f"word{i}" for i in range(5000)] + [
+        "pto", "ppto", "point", "lunch", "shift", "leave", "hour", "schedule",
+    ]
+    entries = [
+        FAQEntry(
+            i,
+            " ".join(random.choices(vocabulary, k=12)) + "?",
+            " ".join(random.choices(vocabulary, k=60)),
+        )
+        for i in range(5000)
+    ]
+    start = time.perf_counter()
+    index = FAQIndex(entries)
+    build_ms = (time.perf_counter() - start) * 1000
+
+    queries = [" ".join(random.choices(vocabulary, k=8)) for _ in range(1000)]
+    start = time.perf_counter()
+    for query in queries:
+        index.search(query, k=5)
+    per_query_us = (time.perf_counter() - start) / len(queries) * 1e6
+    print(f"{len(entries)} entries: build {build_ms:.0f} ms, search {per_query_us:.0f} us/query")
@@ -1,9 +1,23 @@
 """HR Knowledge base for common questions and answers."""
 
+import asyncio
+import hashlib
+import heapq
+import io
+import json
 import os
+import shutil
+import threading
+import time
+from dataclasses import dataclass, replace
 from pathlib import Path
-from docx import Document
+from typing import IO
 import logging
+import numpy as np
+
+from config import settings
+from faq_index import FAQEntry, FAQHit, FAQIndex, tokenize
+from vector_index import VectorIndex
 
 logger = logging.getLogger(__name__)
 
@@ -28,19 +42,31 @@ When you cannot provide a definitive answer:
 - Be encouraging and helpful, not dismissive
 """
 
+# Bump whenever BASE_HR_PROMPT or the prompt layout changes; it is part of
+# the prefix id logged for each request, so prompt-cache stats can be
+# compared across prompt versions
+PROMPT_VERSION = "2"
 
-def load_faq_from_docx(file_path: str | Path) -> str:
-    """Load FAQ content from a Word document.
+
+def parse_faq_entries(file_path: str | Path | IO[bytes]) -> list[FAQEntry]:
+    """Parse Question/Answer pairs from a Word document.
     
     Args:
-        file_path: Path to the .docx file containing FAQ content
+        file_path: Path to (or open binary stream of) the .docx file
+            containing FAQ content
         
     Returns:
-        Formatted string containing all Q&A pairs
+        FAQ entries in document order (empty if the file can't be read)
     """
+    # python-docx is only needed to (re)compile, not to load a compiled FAQ
+    from docx import Document
+
     try:
         doc = Document(file_path)
-        faq_content = []
+        entries: list[FAQEntry] = []
+
+        def add_entry(question: str, answer_parts: list[str]) -> None:
+            entries.append(FAQEntry(len(entries), question, " ".join(answer_parts)))
         
         # Extract all text from paragraphs
         current_question = None
@@ -51,9 +77,7 @@ def load_faq_from_docx(file_path: str | Path) -> str:
             if not text:
                 # Empty paragraph might signal end of answer
                 if current_question and current_answer_parts:
-                    faq_content.append(f"Q: {current_question}")
-                    faq_content.append(f"A: {' '.join(current_answer_parts)}")
-                    faq_content.append("")  # blank line
+                    add_entry(current_question, current_answer_parts)
                     current_question = None
                     current_answer_parts = []
                 continue
@@ -62,9 +86,7 @@ def load_faq_from_docx(file_path: str | Path) -> str:
             if text.startswith("Question:"):
                 # Save previous Q&A pair if exists
                 if current_question and current_answer_parts:
-                    faq_content.append(f"Q: {current_question}")
-                    faq_content.append(f"A: {' '.join(current_answer_parts)}")
-                    faq_content.append("")  # blank line
+                    add_entry(current_question, current_answer_parts)
                 
                 current_question = text.replace("Question:", "").strip()
                 current_answer_parts = []
@@ -80,30 +102,49 @@ def load_faq_from_docx(file_path: str | Path) -> str:
         
         # Don't forget the last Q&A pair
         if current_question and current_answer_parts:
-            faq_content.append(f"Q: {current_question}")
-            faq_content.append(f"A: {' '.join(current_answer_parts)}")
+            add_entry(current_question, current_answer_parts)
         
-        if faq_content:
-            return "\n".join(faq_content)
-        else:
+        if not entries:
             logger.warning(f"No FAQ content found in {file_path}")
-            return ""
+        return entries
             
     except FileNotFoundError:
         logger.error(f"FAQ file not found: {file_path}")
-        return ""
+        return []
     except Exception as e:
         logger.error(f"Error loading FAQ from {file_path}: {e}")
-        return ""
+        return []
+
+
+def format_faq_entries(entries: list[FAQEntry]) -> str:
+    """Format FAQ entries as the Q:/A: block used in the system prompt."""
+    return "\n\n".join(entry.format() for entry in entries)
+
+
+def load_faq_from_docx(file_path: str | Path | IO[bytes]) -> str:
+    """Load FAQ content from a Word document.
+    
+    Args:
+        file_path: Path to (or open binary stream of) the .docx file
+            containing FAQ content
+        
+    Returns:
+        Formatted string containing all Q&A pairs
+    """
+    return format_faq_entries(parse_faq_entries(file_path))
 
 
 def get_faq_document_path() -> Path:
     r"""Get the path to the FAQ document.
     
     Looks in common locations:
-    1. C:\Users\btran\Downloads\People Connect FAQ.docx
-    2. Relative to this file: ../../People Connect FAQ.docx
+    1. FAQ_DOCUMENT_PATH setting, if configured
+    2. C:\Users\btran\Downloads\People Connect FAQ.docx
+    3. Relative to this file: ../../People Connect FAQ.docx
     """
+    if settings.faq_document_path:
+        return Path(settings.faq_document_path)
+
     # Check Downloads folder
     downloads_path = Path(r"C:\Users\btran\Downloads\People Connect FAQ.docx")
     if downloads_path.exists():
@@ -119,6 +160,13 @@ def get_faq_document_path() -> Path:
     return downloads_path
 
 
+def build_system_prompt(faq_content: str) -> str:
+    """Combine the base prompt with the formatted FAQ content."""
+    if faq_content:
+        return f"{BASE_HR_PROMPT}\n\n=== FREQUENTLY ASKED QUESTIONS ===\n\n{faq_content}"
+    return BASE_HR_PROMPT
+
+
 def load_hr_knowledge_base() -> str:
     """Load the complete HR knowledge base including FAQ content.
     
@@ -129,24 +177,487 @@ def load_hr_knowledge_base() -> str:
     faq_content = load_faq_from_docx(faq_path)
     
     if faq_content:
-        knowledge_base = f"{BASE_HR_PROMPT}\n\n=== FREQUENTLY ASKED QUESTIONS ===\n\n{faq_content}"
         logger.info(f"Loaded FAQ content from {faq_path}")
     else:
-        knowledge_base = BASE_HR_PROMPT
         logger.warning("FAQ content not loaded, using base prompt only")
     
-    return knowledge_base
+    return build_system_prompt(faq_content)
+
+
+@dataclass(frozen=True, slots=True)
+class KnowledgeBase:
+    """Compiled, immutable snapshot of the FAQ document.
+
+    A new instance is built whenever the source document changes and is
+    swapped in with a single reference assignment, so readers always see
+    either the old or the new snapshot in full.
+    """
+
+    version: int
+    source_path: Path
+    mtime: float | None
+    size: int | None
+    content_hash: str
+    entries: tuple[FAQEntry, ...]
+    index: FAQIndex
+    vectors: VectorIndex
+    faq_content: str
+    system_prompt: str
+    loaded_from: str = "document"  # or "compiled": read from the cache dir
+    load_seconds: float = 0.0
+
+    def matches_stat(self, mtime: float | None, size: int | None) -> bool:
+        """Whether the source file metadata is unchanged since compilation."""
+        return self.mtime == mtime and self.size == size
+
+
+# Reciprocal-rank fusion constant and candidate depth for hybrid retrieval
+RRF_K = 60
+RRF_CANDIDATES = 20
+
+_current_kb: KnowledgeBase | None = None
+_kb_lock = threading.Lock()
+
+
+def _stat_source(path: Path) -> tuple[float | None, int | None]:
+    """Return (mtime, size) for the FAQ document, or (None, None) if missing."""
+    try:
+        stat = path.stat()
+    except OSError:
+        return None, None
+    return stat.st_mtime, stat.st_size
+
+
+# Bump whenever parsing or the index layout changes, so FAQs compiled by
+# an older version are recompiled instead of loaded
+COMPILED_FORMAT = 1
+
+
+def _cache_dir() -> Path:
+    cache_dir = Path(settings.index_cache_dir)
+    if not cache_dir.is_absolute():
+        cache_dir = Path(__file__).parent / cache_dir
+    return cache_dir
+
+
+def _compiled_dir(content_hash: str) -> Path:
+    """Where the compiled form of a given FAQ document version is kept.
+
+    The directory holds faq.json (the parsed entries, content hash and
+    source file metadata) and the vector index, whose matrix is loaded with
+    mmap. BM25 postings are rebuilt from the entries, which takes
+    milliseconds.
+    """
+    return _cache_dir() / f"faq_compiled_{content_hash[:16]}_{settings.vector_index_dim}"
+
+
+def _save_compiled(directory: Path, kb: KnowledgeBase) -> None:
+    """Write a compiled FAQ, replacing those of older versions of the same document."""
+    tmp_dir = directory.with_name(f"{directory.name}.tmp{os.getpid()}")
+    try:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        kb.vectors.save(tmp_dir)
+        compiled = {
+            "format": COMPILED_FORMAT,
+            "content_hash": kb.content_hash,
+            "source_path": str(kb.source_path),
+            "mtime": kb.mtime,
+            "size": kb.size,
+            "entries": [[entry.question, entry.answer] for entry in kb.entries],
+        }
+        (tmp_dir / "faq.json").write_text(json.dumps(compiled), encoding="utf-8")
+        if not directory.exists():  # another worker may have just written it
+            tmp_dir.rename(directory)
+    except OSError as e:
+        logger.warning(f"Could not save compiled FAQ to {directory}: {e}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    # Other documents' compiled FAQs (e.g. the server's, while a tool
+    # compiles another file) are left alone
+    for stale in directory.parent.glob("faq_compiled_*"):
+        if stale == directory or ".tmp" in stale.name:
+            continue
+        try:
+            source_path = json.loads((stale / "faq.json").read_text(encoding="utf-8"))["source_path"]
+        except (OSError, ValueError, KeyError):
+            continue
+        if source_path == str(kb.source_path):
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+def _read_compiled(directory: Path) -> tuple[dict, VectorIndex] | None:
+    """Load a compiled FAQ written by _save_compiled(), if it is usable."""
+    try:
+        compiled = json.loads((directory / "faq.json").read_text(encoding="utf-8"))
+        if compiled.get("format") != COMPILED_FORMAT:
+            return None
+        vectors = VectorIndex.load(directory)
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Ignoring unreadable compiled FAQ {directory}: {e}")
+        return None
+    if len(vectors) != len(compiled["entries"]) or vectors.dim != settings.vector_index_dim:
+        return None
+    return compiled, vectors
+
+
+def _find_compiled(path: Path, mtime: float | None, size: int | None) -> tuple[dict, VectorIndex] | None:
+    """A compiled FAQ that can stand in for the document without reading it.
+
+    That is one compiled from this very file (same path, mtime and size)
+    or, if the document is missing, e.g. in a container that ships only
+    the compiled FAQ, one compiled from the same path, else any there is.
+    """
+    fallback = None
+    for directory in _cache_dir().glob(f"faq_compiled_*_{settings.vector_index_dim}"):
+        found = _read_compiled(directory)
+        if found is None:
+            continue
+        compiled = found[0]
+        same_path = compiled["source_path"] == str(path)
+        if same_path and compiled["mtime"] == mtime and compiled["size"] == size:
+            return found
+        if mtime is None and (fallback is None or same_path):
+            fallback = found
+    return fallback
+
+
+def _assemble_knowledge_base(
+    path: Path,
+    entries: list[FAQEntry],
+    vectors: VectorIndex,
+    content_hash: str,
+    mtime: float | None,
+    size: int | None,
+    version: int,
+    loaded_from: str,
+    started: float,
+) -> KnowledgeBase:
+    faq_content = format_faq_entries(entries)
+    kb = KnowledgeBase(
+        version=version,
+        source_path=path,
+        mtime=mtime,
+        size=size,
+        content_hash=content_hash,
+        entries=tuple(entries),
+        index=FAQIndex(entries),
+        vectors=vectors,
+        faq_content=faq_content,
+        system_prompt=build_system_prompt(faq_content),
+        loaded_from=loaded_from,
+        load_seconds=time.perf_counter() - started,
+    )
+    if faq_content:
+        logger.info(
+            f"Loaded FAQ content from {path} (version {version}, {loaded_from}, "
+            f"{kb.load_seconds * 1000:.1f} ms)"
+        )
+    else:
+        logger.warning("FAQ content not loaded, using base prompt only")
+    return kb
+
+
+def _load_compiled_knowledge_base(
+    found: tuple[dict, VectorIndex], path: Path, mtime: float | None, size: int | None, version: int
+) -> KnowledgeBase:
+    started = time.perf_counter()
+    compiled, vectors = found
+    entries = [FAQEntry(i, question, answer) for i, (question, answer) in enumerate(compiled["entries"])]
+    return _assemble_knowledge_base(
+        path, entries, vectors, compiled["content_hash"], mtime, size, version, "compiled", started
+    )
+
+
+def _compile_knowledge_base(
+    path: Path,
+    data: bytes | None,
+    content_hash: str,
+    mtime: float | None,
+    size: int | None,
+    version: int,
+) -> KnowledgeBase:
+    """Parse the raw document bytes into a new knowledge base snapshot.
+
+    If this content was compiled before, the compiled form is loaded
+    instead and the document isn't parsed.
+    """
+    started = time.perf_counter()
+    directory = _compiled_dir(content_hash)
+    if data is None:
+        logger.error(f"FAQ file not found: {path}")
+        entries = []
+    else:
+        found = _read_compiled(directory)
+        if found is not None:
+            return _load_compiled_knowledge_base(found, path, mtime, size, version)
+        entries = parse_faq_entries(io.BytesIO(data))
+
+    vectors = VectorIndex.build(entries, dim=settings.vector_index_dim)
+    kb = _assemble_knowledge_base(
+        path, entries, vectors, content_hash, mtime, size, version, "document", started
+    )
+    if entries:
+        _save_compiled(directory, kb)
+    return kb
 
 
-HR_KNOWLEDGE_BASE = load_hr_knowledge_base()
+def build_knowledge_base(path: Path | None = None) -> KnowledgeBase:
+    """Compile a snapshot of an FAQ document without making it current.
+
+    Used by offline tools (e.g. eval_retrieval.py) that need exactly what
+    the server would build, but shouldn't swap it in.
+
+    Args:
+        path: The .docx file (defaults to the configured FAQ document)
+    """
+    path = path or get_faq_document_path()
+    mtime, size = _stat_source(path)
+    try:
+        data = path.read_bytes() if mtime is not None else None
+    except OSError:
+        data = None
+    content_hash = hashlib.sha256(data or b"").hexdigest()
+    return _compile_knowledge_base(path, data, content_hash, mtime, size, version=1)
+
+
+def refresh_knowledge_base(force: bool = False) -> bool:
+    """Recompile the knowledge base if the FAQ document has changed.
+
+    The cheap mtime/size check runs first; the file is only read and hashed
+    when that metadata differs, and only re-parsed when the content hash
+    differs too. A missing or unparseable document never replaces a
+    snapshot that has entries.
+
+    Args:
+        force: Recompile even if the document appears unchanged
+
+    Returns:
+        True if a new knowledge base snapshot was swapped in
+    """
+    global _current_kb, HR_KNOWLEDGE_BASE
+
+    with _kb_lock:
+        current = _current_kb
+        path = get_faq_document_path()
+        mtime, size = _stat_source(path)
+
+        if (
+            not force
+            and current is not None
+            and current.source_path == path
+            and current.matches_stat(mtime, size)
+        ):
+            return False
+
+        if current is None and not force:
+            # Cold start: a compiled FAQ saves reading and parsing the document
+            found = _find_compiled(path, mtime, size)
+            if found is not None:
+                _current_kb = _load_compiled_knowledge_base(found, path, mtime, size, version=1)
+                HR_KNOWLEDGE_BASE = _current_kb.system_prompt
+                return True
+
+        try:
+            data = path.read_bytes() if mtime is not None else None
+        except OSError:
+            data = None
+        if data is None and current is not None:
+            # e.g. a deployment that ships only the compiled FAQ: an empty
+            # knowledge base is never better than the one being served
+            logger.error(f"FAQ file not found: {path}; keeping version {current.version}")
+            _current_kb = replace(current, mtime=mtime, size=size)
+            return False
+        content_hash = hashlib.sha256(data or b"").hexdigest()
+
+        if not force and current is not None and current.content_hash == content_hash:
+            # Touched but not edited: remember the new metadata, keep the content.
+            _current_kb = replace(current, source_path=path, mtime=mtime, size=size)
+            return False
+
+        version = current.version + 1 if current is not None else 1
+        try:
+            kb = _compile_knowledge_base(path, data, content_hash, mtime, size, version)
+        except Exception as e:
+            if current is None:
+                raise
+            logger.error(f"Error compiling FAQ from {path}: {e}")
+            kb = None
+        if current is not None and current.entries and (kb is None or not kb.entries):
+            # A corrupt or half-saved document: keep answering from the last
+            # good snapshot until the file changes again
+            logger.error(f"No FAQ entries in {path}; keeping version {current.version}")
+            _current_kb = replace(current, mtime=mtime, size=size)
+            return False
+        _current_kb = kb
+        HR_KNOWLEDGE_BASE = _current_kb.system_prompt
+        return True
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """Get the current compiled knowledge base snapshot.
+
+    This never touches the filesystem once the first snapshot exists;
+    change detection is left to the background watcher.
+    """
+    kb = _current_kb
+    if kb is None:
+        refresh_knowledge_base()
+        kb = _current_kb
+    return kb
+
+
+def current_knowledge_base() -> KnowledgeBase | None:
+    """The current snapshot, or None if none has been loaded yet (never blocks)."""
+    return _current_kb
+
+
+async def watch_knowledge_base(interval: float | None = None) -> None:
+    """Poll the FAQ document and swap in a new snapshot when it changes.
+
+    Runs until cancelled. Each check happens in a worker thread so parsing
+    a changed document never blocks the event loop.
+    """
+    interval = interval if interval is not None else settings.kb_watch_interval
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await asyncio.to_thread(refresh_knowledge_base)
+        except Exception as e:
+            logger.error(f"Error refreshing knowledge base: {e}")
+
+
+# The full system prompt once the knowledge base is loaded; that happens
+# on first use or in the app's startup warm-up, not at import
+HR_KNOWLEDGE_BASE = BASE_HR_PROMPT
 
 
 def get_system_prompt() -> str:
     """Get the system prompt for the chatbot.
     
-    This reloads the FAQ content each time to ensure fresh data.
+    Returns the cached prompt from the current knowledge base snapshot;
+    the background watcher keeps it in sync with the FAQ document.
+    """
+    return get_knowledge_base().system_prompt
+
+
+def search_faq(
+    query: str, k: int = 5, kb: KnowledgeBase | None = None
+) -> list[FAQHit]:
+    """Search the FAQ for the entries most relevant to a question.
+    
+    RETRIEVAL_METHOD selects BM25 keyword search ("bm25"), the n-gram
+    vector index ("vector"), or both fused by reciprocal rank ("hybrid").
+    
+    Args:
+        query: Free-text question
+        k: Maximum number of hits to return
+        kb: Knowledge base snapshot to search (defaults to the current one)
+        
+    Returns:
+        Scored hits, best first (empty if nothing matches)
+    """
+    kb = kb or get_knowledge_base()
+    if settings.retrieval_method == "bm25" or not len(kb.vectors):
+        return kb.index.search(query, k)
+    scores, question_sim = kb.vectors.score(query)
+    return _rank_hits(query, k, kb, scores, question_sim)
+
+
+def search_faq_many(
+    queries: list[str], k: int = 5, kb: KnowledgeBase | None = None
+) -> list[list[FAQHit]]:
+    """search_faq for several questions at once, e.g. a batch of chats.
+    
+    All questions are searched in the same snapshot, and their vector
+    scores come from a single matrix product.
+    
+    Returns:
+        One list of hits per query, in the same order
+    """
+    kb = kb or get_knowledge_base()
+    if not queries:
+        return []
+    if settings.retrieval_method == "bm25" or not len(kb.vectors):
+        return [kb.index.search(query, k) for query in queries]
+    scores, question_sim = kb.vectors.score_many(queries)
+    return [
+        _rank_hits(query, k, kb, scores[row], question_sim[row])
+        for row, query in enumerate(queries)
+    ]
+
+
+def _rank_hits(
+    query: str, k: int, kb: KnowledgeBase, scores: np.ndarray, question_sim: np.ndarray
+) -> list[FAQHit]:
+    """Top-k hits from vector scores, fused with BM25 in hybrid mode."""
+    method = settings.retrieval_method
+    depth = max(k, RRF_CANDIDATES)
+    vector_ids = kb.vectors.top(scores, depth, settings.vector_min_score)
+
+    if method == "vector":
+        ids = vector_ids[:k]
+        ranking = {i: float(scores[i]) for i in ids}
+    else:
+        ranking: dict[int, float] = {}
+        lexical_ids = [hit.entry.id for hit in kb.index.search(query, depth)]
+        for ranked in (lexical_ids, vector_ids):
+            for rank, i in enumerate(ranked):
+                ranking[i] = ranking.get(i, 0.0) + 1 / (RRF_K + rank + 1)
+        ids = heapq.nlargest(k, ranking, key=ranking.get)
+
+    matches = kb.index.match(query, ids)
+    return [
+        FAQHit(kb.entries[i], ranking[i], match, float(question_sim[i]))
+        for i, match in zip(ids, matches)
+    ]
+
+
+def fast_path_score(query: str, hit: FAQHit, threshold: float | None = None) -> float:
+    """The score with which a hit qualifies to answer the query verbatim.
+    
+    The keyword match qualifies when it clears the threshold and the query
+    has no terms the FAQ question lacks ("8th" vs "6th", "PPTO" vs "PTO").
+    Vector similarity alone has to clear the much stricter
+    FAQ_FAST_PATH_SIMILARITY_THRESHOLD.
+    
+    Returns:
+        The qualifying score (0-1), or 0.0 if the hit doesn't qualify
+    """
+    threshold = settings.faq_fast_path_threshold if threshold is None else threshold
+    if hit.match >= threshold and set(tokenize(query)) <= hit.entry.question_terms:
+        return hit.match
+    if hit.similarity >= settings.faq_fast_path_similarity_threshold:
+        return hit.similarity
+    return 0.0
+
+
+def match_faq(
+    query: str,
+    threshold: float | None = None,
+    kb: KnowledgeBase | None = None,
+    hits: list[FAQHit] | None = None,
+) -> FAQHit | None:
+    """Find an FAQ entry whose question nearly matches the query.
+    
+    See fast_path_score() for what counts as a near match.
+    
+    Args:
+        query: Free-text question
+        threshold: Minimum question match (0-1), defaults to the
+            FAQ_FAST_PATH_THRESHOLD setting
+        kb: Knowledge base snapshot to search (defaults to the current one)
+        hits: search_faq results for the query, if already computed
+        
+    Returns:
+        The best hit if it clears the threshold, otherwise None
     """
-    return load_hr_knowledge_base()
+    if hits is None:
+        hits = search_faq(query, 1, kb)
+    if hits and fast_path_score(query, hits[0], threshold):
+        return hits[0]
+    return None
 
 
 def reload_knowledge_base() -> None:
@@ -154,6 +665,5 @@ def reload_knowledge_base() -> None:
     
     Call this function to refresh the FAQ content without restarting the server.
     """
-    global HR_KNOWLEDGE_BASE
-    HR_KNOWLEDGE_BASE = load_hr_knowledge_base()
+    refresh_knowledge_base(force=True)
     logger.info("Knowledge base reloaded")
@@ -0,0 +1,265 @@
+"""End-to-end load generator for /api/chat.
+
+Replays questions drawn from the FAQ document against the FastAPI app at a
+target request rate (open loop) or with a fixed number of concurrent
+associates (closed loop), and prints a JSON report with throughput,
+p50/p95/p99 latency, error and fallback rates, so runs can be compared.
+
+By default the app runs in-process with its LLM provider pointed at the
+stub server (stub_llm_server.py, also in-process), so no network, API key
+or running backend is needed:
+
+    python load_test.py --concurrency 50 --requests 2000
+    python load_test.py --rps 100 --duration 30 --stub-latency-ms 800 --output run.json
+
+--url runs against a live backend instead (whatever provider it uses).
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import random
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+
+import httpx
+
+from stub_llm_server import StubConfig, create_app
+
+STUB_URL = "http://stub-llm"
+
+# Rewordings that keep a question's meaning but miss the FAQ fast path and
+# the answer cache, so part of the load reaches the (stub) model
+REWORD_PREFIXES = ["Quick question: ", "Hi! ", "Hello, I need help. "]
+REWORD_SUFFIXES = [" Thanks!", " I'm a new associate.", " Asking for my shift tomorrow."]
+
+# Used when the FAQ document can't be read
+FALLBACK_QUESTIONS = [
+    "If I leave before my 5th hour, will it be half a point or full point?",
+    "Can I use PTO for an emergency?",
+    "How do I check my PTO balance?",
+    "What benefits does Walmart offer?",
+    "Do I still have to call off when I put PPTO?",
+]
+
+
+@dataclass
+class LoadTestConfig:
+    """What to send and how hard."""
+
+    requests: int | None = 500  # stop after this many (None: run for duration)
+    duration: float | None = None  # seconds
+    concurrency: int = 20  # closed loop: simultaneous associates
+    rps: float | None = None  # open loop: fixed arrival rate instead of concurrency
+    endpoint: str = "/api/chat"
+    reword_share: float = 0.5  # share of questions reworded away from the FAQ text
+    seed: int = 0
+    url: str | None = None  # live backend; None runs the app in-process
+    provider: str = "openai"  # stub-backed provider when in-process
+    stub: StubConfig = field(default_factory=StubConfig)
+
+
+def load_corpus(rng: random.Random) -> list[str]:
+    """FAQ questions from the document, or a small built-in set."""
+    from knowledge_base import get_faq_document_path, parse_faq_entries
+
+    questions = [entry.question for entry in parse_faq_entries(get_faq_document_path())]
+    if not questions:
+        print("FAQ document not found; using built-in questions", file=sys.stderr)
+        questions = list(FALLBACK_QUESTIONS)
+    rng.shuffle(questions)
+    return questions
+
+
+def reword(question: str, rng: random.Random) -> str:
+    return f"{rng.choice(REWORD_PREFIXES)}{question}{rng.choice(REWORD_SUFFIXES)}"
+
+
+def percentile(sorted_values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, round(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+@dataclass(slots=True)
+class Sample:
+    latency: float
+    status: int
+    show_fallback: bool = False
+    source: str | None = None
+
+
+async def _send(client: httpx.AsyncClient, config: LoadTestConfig, message: str) -> Sample:
+    started = time.perf_counter()
+    try:
+        response = await client.post(config.endpoint, json={"message": message})
+    except httpx.HTTPError:
+        return Sample(time.perf_counter() - started, 0)
+    latency = time.perf_counter() - started
+    if response.status_code != 200:
+        return Sample(latency, response.status_code)
+    data = response.json()
+    sources = data.get("sources") or []
+    return Sample(latency, 200, bool(data.get("show_fallback")), sources[0] if sources else None)
+
+
+async def _drive(client: httpx.AsyncClient, config: LoadTestConfig) -> tuple[list[Sample], float]:
+    rng = random.Random(config.seed)
+    corpus = load_corpus(rng)
+    deadline = time.perf_counter() + config.duration if config.duration else None
+    samples: list[Sample] = []
+    sent = 0
+
+    def next_message() -> str | None:
+        nonlocal sent
+        if config.requests is not None and sent >= config.requests:
+            return None
+        if deadline is not None and time.perf_counter() >= deadline:
+            return None
+        question = corpus[sent % len(corpus)]
+        sent += 1
+        return reword(question, rng) if rng.random() < config.reword_share else question
+
+    started = time.perf_counter()
+    if config.rps:
+        # Open loop: arrivals don't wait for earlier answers, like real users
+        tasks = []
+        interval = 1 / config.rps
+        while (message := next_message()) is not None:
+            tasks.append(asyncio.create_task(_send(client, config, message)))
+            await asyncio.sleep(max(0.0, started + len(tasks) * interval - time.perf_counter()))
+        samples = list(await asyncio.gather(*tasks))
+    else:
+        async def associate() -> None:
+            while (message := next_message()) is not None:
+                samples.append(await _send(client, config, message))
+
+        await asyncio.gather(*(associate() for _ in range(config.concurrency)))
+    return samples, time.perf_counter() - started
+
+
+def summarize(samples: list[Sample], elapsed: float, config: LoadTestConfig) -> dict:
+    """Build the JSON report."""
+    latencies = sorted(s.latency * 1000 for s in samples)
+    ok = [s for s in samples if s.status == 200]
+    statuses: dict[str, int] = {}
+    sources: dict[str, int] = {}
+    for s in samples:
+        statuses[str(s.status)] = statuses.get(str(s.status), 0) + 1
+        if s.source:
+            sources[s.source] = sources.get(s.source, 0) + 1
+    settings_used = asdict(config)
+    if config.url:
+        del settings_used["stub"], settings_used["provider"]
+    return {
+        "config": settings_used,
+        "requests": len(samples),
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50), 2),
+            "p95": round(percentile(latencies, 95), 2),
+            "p99": round(percentile(latencies, 99), 2),
+            "mean": round(sum(latencies) / len(latencies), 2) if latencies else 0.0,
+            "max": round(latencies[-1], 2) if latencies else 0.0,
+        },
+        "error_rate": round(1 - len(ok) / len(samples), 4) if samples else 0.0,
+        "fallback_rate": round(sum(s.show_fallback for s in ok) / len(ok), 4) if ok else 0.0,
+        "status_codes": statuses,
+        "sources": sources,
+    }
+
+
+async def run_load_test(config: LoadTestConfig) -> dict:
+    """Run one load test and return its report."""
+    if config.url:
+        limits = httpx.Limits(max_connections=max(config.concurrency, 100))
+        async with httpx.AsyncClient(base_url=config.url, timeout=120, limits=limits) as client:
+            samples, elapsed = await _drive(client, config)
+            report = summarize(samples, elapsed, config)
+            stats = await client.get("/api/stats")
+            if stats.status_code == 200:
+                report["backend_stats"] = stats.json()
+        return report
+
+    import main
+    from chatbot_service import chatbot_service
+    from providers import AzureOpenAIProvider, OllamaProvider, OpenAIProvider
+
+    stub_app = create_app(config.stub)
+    providers = {
+        "azure": lambda: AzureOpenAIProvider(endpoint=STUB_URL, api_key="stub"),
+        "openai": lambda: OpenAIProvider(api_key="stub", base_url=f"{STUB_URL}/v1"),
+        "ollama": lambda: OllamaProvider(base_url=STUB_URL),
+    }
+    original_provider = chatbot_service.provider
+    chatbot_service.provider = providers[config.provider]()
+    # The lifespan's startup() keeps this client since one already exists
+    await chatbot_service.startup(
+        httpx.AsyncClient(transport=httpx.ASGITransport(app=stub_app), base_url=STUB_URL, timeout=120)
+    )
+    try:
+        async with main.app.router.lifespan_context(main.app):
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://backend", timeout=120) as client:
+                samples, elapsed = await _drive(client, config)
+                report = summarize(samples, elapsed, config)
+                report["backend_stats"] = (await client.get("/api/stats")).json()
+        report["stub_stats"] = stub_app.state.stub.stats()
+        return report
+    finally:
+        await chatbot_service.aclose()
+        chatbot_service.provider = original_provider
+
+
+def cli() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    load = parser.add_argument_group("load")
+    load.add_argument("--requests", type=int, default=None, help="total requests (default 500 without --duration)")
+    load.add_argument("--duration", type=float, default=None, help="seconds to run")
+    load.add_argument("--concurrency", type=int, default=20, help="simultaneous associates (closed loop)")
+    load.add_argument("--rps", type=float, default=None, help="fixed arrival rate (open loop)")
+    load.add_argument("--reword-share", type=float, default=0.5)
+    load.add_argument("--seed", type=int, default=0)
+    load.add_argument("--url", default=None, help="live backend, e.g. http://localhost:8000")
+    load.add_argument("--output", default=None, help="also write the JSON report here")
+    stub = parser.add_argument_group("in-process stub provider")
+    stub.add_argument("--provider", choices=["azure", "openai", "ollama"], default="openai")
+    stub.add_argument("--stub-latency-ms", type=float, default=StubConfig.latency_ms)
+    stub.add_argument("--stub-tokens-per-second", type=float, default=StubConfig.tokens_per_second)
+    stub.add_argument("--stub-error-rate", type=float, default=StubConfig.error_rate)
+    args = parser.parse_args()
+
+    config = LoadTestConfig(
+        requests=args.requests if args.requests or args.duration else 500,
+        duration=args.duration,
+        concurrency=args.concurrency,
+        rps=args.rps,
+        reword_share=args.reword_share,
+        seed=args.seed,
+        url=args.url,
+        provider=args.provider,
+        stub=StubConfig(
+            latency_ms=args.stub_latency_ms,
+            tokens_per_second=args.stub_tokens_per_second,
+            error_rate=args.stub_error_rate,
+            seed=args.seed,
+        ),
+    )
+    # Per-request INFO logs from the app would drown out the report
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+    report = asyncio.run(run_load_test(config))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    cli()
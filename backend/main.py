@@ -1,12 +1,31 @@
 """FastAPI application for HR Chatbot."""
 
-from fastapi import FastAPI, HTTPException
+import asyncio
+import contextlib
+import json
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import logging
 
+import metrics
 from config import settings
-from models import ChatRequest, ChatResponse, HealthCheck
+from models import (
+    BatchChatRequest,
+    BatchChatResult,
+    ChatMessage,
+    ChatRequest,
+    ChatResponse,
+    HealthCheck,
+)
 from chatbot_service import chatbot_service
+from knowledge_base import watch_knowledge_base
+from sessions import new_session_id, session_store
+from tracing import TracingMiddleware, stage
 
 # Configure logging
 logging.basicConfig(
@@ -15,13 +34,99 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+
+class Readiness:
+    """Startup warm-up progress, reported by /ready."""
+
+    def __init__(self):
+        self.ready = False
+        self.started = time.perf_counter()
+        self.warm_up_ms: float | None = None
+        self.components: dict[str, dict] = {}
+        self.error: str | None = None
+        self.attempts = 0
+
+    def report(self) -> dict:
+        return {
+            "status": "ready" if self.ready else "starting",
+            "warm_up_ms": self.warm_up_ms,
+            "components": self.components,
+            "attempts": self.attempts,
+            **({"error": self.error} if self.error else {}),
+        }
+
+
+readiness = Readiness()
+
+
+async def warm_up() -> None:
+    """Load the knowledge base and warm the provider, then report ready.
+
+    A failed attempt is reported by /ready and retried with exponential
+    backoff, so a transient failure doesn't keep the instance out of
+    rotation for good.
+    """
+    delay = settings.warm_up_retry_delay
+    while True:
+        readiness.attempts += 1
+        try:
+            readiness.components = await chatbot_service.warm_up()
+            break
+        except Exception as e:
+            # Not ready yet; chats still load the knowledge base on first use
+            logger.error(f"Warm-up attempt {readiness.attempts} failed, retrying in {delay:.1f}s: {e}")
+            readiness.error = str(e)
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, settings.warm_up_retry_max_delay)
+    readiness.error = None
+    readiness.warm_up_ms = round((time.perf_counter() - readiness.started) * 1000, 1)
+    readiness.ready = True
+    logger.info(f"Ready after {readiness.warm_up_ms} ms: {json.dumps(readiness.components)}")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Start background tasks on startup and stop them on shutdown."""
+    global readiness
+    readiness = Readiness()
+    # One pooled HTTP client for every LLM request in this process
+    await chatbot_service.startup()
+    # Warm up in the background: /health answers at once, /ready once done
+    warmer = asyncio.create_task(warm_up())
+    # Watch the FAQ document off the request path
+    watcher = asyncio.create_task(watch_knowledge_base())
+    try:
+        yield
+    finally:
+        # Draining: take the instance out of rotation first
+        readiness.ready = False
+        for task in (warmer, watcher):
+            task.cancel()
+            with contextlib.suppress(asyncio.CancelledError):
+                await task
+        await chatbot_service.aclose()
+        await session_store.aclose()
+
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Walmart HR Chatbot API",
     description="AI-powered chatbot for Walmart HR inquiries",
     version="1.0.0",
+    lifespan=lifespan,
 )
 
+# Request latency by route for /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+# Per-stage timings as a Server-Timing header and sampled trace logs
+app.add_middleware(TracingMiddleware)
+# The answer cache already counts lookups; read them at scrape time
+metrics.ANSWER_CACHE_HITS.set_function(lambda: chatbot_service.answer_cache.hits)
+metrics.ANSWER_CACHE_MISSES.set_function(lambda: chatbot_service.answer_cache.misses)
+metrics.LLM_QUEUE_DEPTH.set_function(lambda: chatbot_service.limiter.queued)
+metrics.LLM_CONCURRENCY_LIMIT.set_function(lambda: chatbot_service.limiter.limit)
+metrics.LLM_BREAKER_OPEN.set_function(lambda: int(chatbot_service.breaker.is_open))
+
 # Configure CORS
 app.add_middleware(
     CORSMiddleware,
@@ -34,20 +139,68 @@ app.add_middleware(
 
 @app.get("/health", response_model=HealthCheck)
 async def health_check():
-    """Health check endpoint."""
+    """Liveness check: the process is up (see /ready for readiness)."""
     return HealthCheck(
         status="healthy",
         message="HR Chatbot API is running",
     )
 
 
+@app.get("/ready")
+async def ready_check(response: Response):
+    """
+    Readiness check: 200 once the startup warm-up is done, 503 before.
+    
+    Reports how long warm-up took and each component's load time.
+    """
+    if not readiness.ready:
+        response.status_code = 503
+    return readiness.report()
+
+
+async def _resolve_history(request: ChatRequest) -> tuple[str | None, list[ChatMessage]]:
+    """Pick the session and prior turns to answer a request with.
+
+    Requests with a session id continue that session; an unknown or expired
+    id starts a fresh session under a new server-generated id. Clients that
+    still send conversation_history without a session id are answered from
+    that history and don't get a session.
+    """
+    if request.session_id:
+        history = await session_store.get_history(request.session_id)
+        if history is not None:
+            return request.session_id, history
+        return new_session_id(), []
+    if request.conversation_history:
+        return None, request.conversation_history
+    return new_session_id(), []
+
+
+async def _save_turn(
+    session_id: str | None, message: str, response: ChatResponse
+) -> ChatResponse:
+    """Record the exchange in the session and tag the response with its id."""
+    if session_id is None:
+        return response
+    # Error and "unavailable" replies have no source; saving them would feed
+    # them back to the model as conversation on the next turn. The session
+    # itself is kept (or created) either way.
+    turn = [
+        ChatMessage(role="user", content=message),
+        ChatMessage(role="assistant", content=response.response),
+    ]
+    await session_store.append(session_id, turn if response.sources else [])
+    # Responses may be shared through the answer cache, so never mutate them
+    return response.model_copy(update={"session_id": session_id})
+
+
 @app.post("/api/chat", response_model=ChatResponse)
 async def chat(request: ChatRequest):
     """
     Process chat message and return AI response.
     
     Args:
-        request: ChatRequest containing user message and conversation history
+        request: ChatRequest containing user message and session id
         
     Returns:
         ChatResponse with AI-generated response and metadata
@@ -55,16 +208,19 @@ async def chat(request: ChatRequest):
     try:
         logger.info(f"Received chat request: {request.message[:50]}...")
         
+        with stage("session"):
+            session_id, history = await _resolve_history(request)
         response = await chatbot_service.get_response(
             message=request.message,
-            conversation_history=request.conversation_history,
+            conversation_history=history,
         )
         
         logger.info(
             f"Generated response with confidence: {response.confidence:.2f}"
         )
         
-        return response
+        with stage("session"):
+            return await _save_turn(session_id, request.message, response)
         
     except Exception as e:
         logger.error(f"Error processing chat request: {str(e)}", exc_info=True)
@@ -74,6 +230,118 @@ async def chat(request: ChatRequest):
         )
 
 
+def _sse_event(event: str, data: dict) -> str:
+    """Format one Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatRequest):
+    """
+    Stream the AI response as Server-Sent Events.
+    
+    Emits a "token" event for each chunk of the answer as the provider
+    generates it, then a single "done" event carrying the full ChatResponse
+    (confidence, fallback and sources) plus time_to_first_token_ms.
+    
+    Args:
+        request: ChatRequest containing user message and session id
+    """
+    logger.info(f"Received streaming chat request: {request.message[:50]}...")
+    started = time.perf_counter()
+
+    async def events() -> AsyncIterator[str]:
+        ttft_ms = None
+        try:
+            with stage("session"):
+                session_id, history = await _resolve_history(request)
+            async for item in chatbot_service.stream_response(
+                message=request.message,
+                conversation_history=history,
+            ):
+                if isinstance(item, ChatResponse):
+                    with stage("session"):
+                        item = await _save_turn(session_id, request.message, item)
+                    logger.info(
+                        f"Streamed response with confidence: {item.confidence:.2f}, "
+                        f"time to first token: {ttft_ms or 0:.0f} ms"
+                    )
+                    yield _sse_event(
+                        "done",
+                        {**item.model_dump(), "time_to_first_token_ms": ttft_ms},
+                    )
+                    continue
+                if ttft_ms is None:
+                    ttft = time.perf_counter() - started
+                    metrics.CHAT_TIME_TO_FIRST_TOKEN.observe(ttft)
+                    ttft_ms = round(ttft * 1000, 1)
+                yield _sse_event("token", {"text": item})
+        except Exception as e:
+            logger.error(f"Error streaming chat response: {str(e)}", exc_info=True)
+            yield _sse_event(
+                "error", {"detail": "An error occurred while processing your request"}
+            )
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",  # let nginx pass events straight through
+        },
+    )
+
+
+@app.post("/api/chat/batch")
+async def chat_batch(request: BatchChatRequest):
+    """
+    Answer a list of questions, streamed back as NDJSON.
+    
+    Each line is a BatchChatResult, written as soon as that question is
+    answered, so results arrive out of order; use "index" to match them to
+    the request. Questions are answered as separate new chats.
+    
+    Args:
+        request: BatchChatRequest with up to BATCH_MAX_QUESTIONS questions
+    """
+    if len(request.questions) > settings.batch_max_questions:
+        raise HTTPException(
+            status_code=422,
+            detail=f"A batch can have at most {settings.batch_max_questions} questions",
+        )
+    logger.info(f"Received batch chat request: {len(request.questions)} questions")
+
+    async def lines() -> AsyncIterator[str]:
+        async for index, response in chatbot_service.batch_responses(request.questions):
+            result = BatchChatResult(
+                index=index,
+                question=request.questions[index],
+                **response.model_dump(exclude={"session_id"}),
+            )
+            yield result.model_dump_json(exclude={"session_id"}) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+
+@app.delete("/api/sessions/{session_id}", status_code=204)
+async def delete_session(session_id: str):
+    """Forget a conversation (e.g. when the user starts a new chat)."""
+    await session_store.delete(session_id)
+    return Response(status_code=204)
+
+
+@app.get("/api/stats")
+async def get_stats():
+    """Runtime counters (cache hit rates etc.) for monitoring."""
+    return {**chatbot_service.stats(), "sessions": await session_store.stats()}
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus metrics: latency histograms, token counters, confidence etc."""
+    return Response(metrics.REGISTRY.render(), media_type=metrics.CONTENT_TYPE)
+
+
 @app.get("/api/config")
 async def get_config():
     """Get public configuration for the frontend."""
@@ -0,0 +1,386 @@
+"""Prometheus metrics for the /metrics endpoint.
+
+A small in-process implementation of counters, gauges and histograms that
+renders the Prometheus text format, so scraping needs no extra dependency.
+Updates are a dict lookup and a float add (plus a bisect for histograms)
+on the event loop thread, cheap enough for the chat hot path; labelled
+children can be bound once with labels() and reused.
+"""
+
+import asyncio
+import bisect
+import math
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds; chat latency ranges from sub-millisecond FAQ answers to slow LLM calls
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+CONFIDENCE_BUCKETS = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9, 1.0)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _label_text(names: tuple[str, ...], values: tuple[str, ...]) -> str:
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    """A named metric family with optional labels."""
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._series: dict[tuple[str, ...], object] = {}
+        # Lookup by the values as passed, so repeat calls skip str()
+        self._children: dict[tuple, object] = {}
+        self._function: Callable[[], float] | None = None
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """The child for these label values (created on first use)."""
+        child = self._children.get(values)
+        if child is None:
+            key = tuple(str(value) for value in values)
+            if len(key) != len(self.labelnames):
+                raise ValueError(f"{self.name} expects labels {self.labelnames}, got {key}")
+            child = self._series.get(key)
+            if child is None:
+                child = self._series[key] = self._new_child()
+            self._children[values] = child
+        return child
+
+    def _default(self):
+        # Unlabelled metrics are their own single child
+        return self.labels()
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        """Read the value from function at scrape time instead of updating it."""
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels; set_function needs an unlabelled metric")
+        self._function = function
+
+    def _samples(self) -> Iterator[str]:
+        if self._function is not None:
+            yield f"{self.name} {_format_value(float(self._function()))}"
+            return
+        for values, child in self._series.items():
+            yield f"{self.name}{_label_text(self.labelnames, values)} {_format_value(child.value)}"
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self._samples())
+        return "\n".join(lines)
+
+
+class _Value:
+    __slots__ = ("value",)
+
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+
+class Counter(_Metric):
+    """A value that only goes up."""
+
+    kind = "counter"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+
+class Gauge(_Metric):
+    """A value that goes up and down."""
+
+    kind = "gauge"
+
+    def _new_child(self) -> _Value:
+        return _Value()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._default().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._default().dec(amount)
+
+    def set(self, value: float) -> None:
+        self._default().set(value)
+
+
+class _HistogramValue:
+    __slots__ = ("buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: tuple[float, ...]):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket, last is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        # Buckets are upper bounds (le), so a value equal to one falls in it
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum and count."""
+
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        documentation: str,
+        labelnames: tuple[str, ...] = (),
+        buckets: tuple[float, ...] = LATENCY_BUCKETS,
+    ):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _new_child(self) -> _HistogramValue:
+        return _HistogramValue(self.buckets)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        raise TypeError("Histograms can't be read from a function")
+
+    def observe(self, value: float) -> None:
+        self._default().observe(value)
+
+    def _samples(self) -> Iterator[str]:
+        for values, child in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), child.counts):
+                cumulative += count
+                labels = _label_text(self.labelnames + ("le",), values + (_format_value(bound),))
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _label_text(self.labelnames, values)
+            yield f"{self.name}_sum{labels} {_format_value(child.sum)}"
+            yield f"{self.name}_count{labels} {child.count}"
+
+
+class Registry:
+    """The metrics rendered by /metrics."""
+
+    def __init__(self):
+        self._metrics: dict[str, _Metric] = {}
+
+    def register(self, metric: _Metric) -> _Metric:
+        if metric.name in self._metrics:
+            raise ValueError(f"Metric {metric.name} is already registered")
+        self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format."""
+        return "\n".join(metric.render() for metric in self._metrics.values()) + "\n"
+
+
+REGISTRY = Registry()
+
+HTTP_REQUESTS = REGISTRY.register(
+    Counter("hr_chatbot_http_requests_total", "HTTP requests handled.", ("method", "route", "status"))
+)
+HTTP_LATENCY = REGISTRY.register(
+    Histogram(
+        "hr_chatbot_http_request_duration_seconds",
+        "Time to send the full HTTP response (whole stream for streaming routes).",
+        ("method", "route"),
+    )
+)
+HTTP_IN_FLIGHT = REGISTRY.register(
+    Gauge("hr_chatbot_http_requests_in_flight", "HTTP requests being handled.")
+)
+LLM_LATENCY = REGISTRY.register(
+    Histogram(
+        "hr_chatbot_llm_request_duration_seconds",
+        "Upstream LLM call time, to the last token.",
+        ("provider", "outcome"),
+    )
+)
+CHAT_TIME_TO_FIRST_TOKEN = REGISTRY.register(
+    Histogram(
+        "hr_chatbot_chat_time_to_first_token_seconds",
+        "Time from a streaming chat request to its first answer text.",
+    )
+)
+LLM_IN_FLIGHT = REGISTRY.register(
+    Gauge("hr_chatbot_llm_requests_in_flight", "Upstream LLM calls in progress.", ("provider",))
+)
+LLM_PROMPT_TOKENS = REGISTRY.register(
+    Counter("hr_chatbot_llm_prompt_tokens_total", "Prompt tokens reported by the provider.", ("provider",))
+)
+LLM_CACHED_PROMPT_TOKENS = REGISTRY.register(
+    Counter(
+        "hr_chatbot_llm_cached_prompt_tokens_total",
+        "Prompt tokens served from the provider's prompt cache.",
+        ("provider",),
+    )
+)
+LLM_COMPLETION_TOKENS = REGISTRY.register(
+    Counter(
+        "hr_chatbot_llm_completion_tokens_total", "Completion tokens reported by the provider.", ("provider",)
+    )
+)
+LLM_RETRIES = REGISTRY.register(
+    Counter("hr_chatbot_llm_retries_total", "Upstream LLM calls retried after a failure.", ("provider",))
+)
+LLM_HEDGED_REQUESTS = REGISTRY.register(
+    Counter(
+        "hr_chatbot_llm_hedged_requests_total",
+        "Extra upstream calls sent to a backup provider because the first was slow.",
+        ("provider",),
+    )
+)
+LLM_HEDGE_WINS = REGISTRY.register(
+    Counter("hr_chatbot_llm_hedge_wins_total", "Hedged calls that answered first.", ("provider",))
+)
+LLM_BREAKER_OPEN = REGISTRY.register(
+    Gauge("hr_chatbot_llm_circuit_open", "1 while the circuit breaker keeps chats on the FAQ only.")
+)
+LLM_QUEUE_WAIT = REGISTRY.register(
+    Histogram("hr_chatbot_llm_queue_wait_seconds", "Time spent waiting for an upstream LLM call slot.")
+)
+LLM_QUEUE_DEPTH = REGISTRY.register(
+    Gauge("hr_chatbot_llm_queue_depth", "Requests waiting for an upstream LLM call slot.")
+)
+LLM_CONCURRENCY_LIMIT = REGISTRY.register(
+    Gauge("hr_chatbot_llm_concurrency_limit", "Upstream LLM calls allowed at once.")
+)
+CHAT_RESPONSES = REGISTRY.register(
+    Counter(
+        "hr_chatbot_chat_responses_total",
+        "Chat answers by how they were produced and whether the HR fallback was shown.",
+        ("path", "fallback"),
+    )
+)
+CHAT_CONFIDENCE = REGISTRY.register(
+    Histogram(
+        "hr_chatbot_chat_confidence",
+        "Confidence of chat answers.",
+        ("path",),
+        buckets=CONFIDENCE_BUCKETS,
+    )
+)
+ANSWER_CACHE_HITS = REGISTRY.register(
+    Counter("hr_chatbot_answer_cache_hits_total", "Answer cache lookups that found an answer.")
+)
+ANSWER_CACHE_MISSES = REGISTRY.register(
+    Counter("hr_chatbot_answer_cache_misses_total", "Answer cache lookups that found nothing.")
+)
+
+
+def observe_response(path: str, confidence: float, show_fallback: bool) -> None:
+    """Count one chat answer.
+
+    Args:
+        path: How it was produced: "faq", "cache", "llm", "overload"
+            (shed to the FAQ by the concurrency limiter), "degraded" (FAQ
+            only while the circuit breaker is open) or "error"
+        confidence: The answer's confidence score
+        show_fallback: Whether the HR fallback link was shown
+    """
+    CHAT_RESPONSES.labels(path, "true" if show_fallback else "false").inc()
+    CHAT_CONFIDENCE.labels(path).observe(confidence)
+
+
+def observe_usage(provider: str, usage) -> None:
+    """Count the tokens in an OpenAI-style usage block (None if not reported)."""
+    if usage is None:
+        return
+    LLM_PROMPT_TOKENS.labels(provider).inc(getattr(usage, "prompt_tokens", 0) or 0)
+    LLM_COMPLETION_TOKENS.labels(provider).inc(getattr(usage, "completion_tokens", 0) or 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    LLM_CACHED_PROMPT_TOKENS.labels(provider).inc(getattr(details, "cached_tokens", 0) or 0)
+
+
+@contextmanager
+def track_llm_call(provider: str) -> Iterator[None]:
+    """Time one upstream LLM call and count it as in flight meanwhile."""
+    in_flight = LLM_IN_FLIGHT.labels(provider)
+    in_flight.inc()
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        # The client went away before the answer was finished
+        outcome = "cancelled"
+        raise
+    finally:
+        in_flight.dec()
+        LLM_LATENCY.labels(provider, outcome).observe(time.perf_counter() - started)
+
+
+class MetricsMiddleware:
+    """Time every HTTP request by route template.
+
+    A plain ASGI middleware, so streaming responses pass straight through;
+    they are timed until their last chunk is sent. Routes are labelled with
+    their path template (/api/sessions/{session_id}), which keeps the
+    number of series bounded.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        HTTP_IN_FLIGHT.inc()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            HTTP_IN_FLIGHT.dec()
+            # The router records the matched route in the scope
+            route = getattr(scope.get("route"), "path", "unmatched")
+            method = scope["method"]
+            HTTP_LATENCY.labels(method, route).observe(time.perf_counter() - started)
+            HTTP_REQUESTS.labels(method, route, str(status)).inc()
+
@@ -1,6 +1,11 @@
 """Pydantic models for request/response validation."""
 
-from pydantic import BaseModel, Field
+from typing import Annotated
+
+from pydantic import BaseModel, Field, StringConstraints
+
+# Longest user message accepted, in characters (far beyond any real question)
+MAX_MESSAGE_LENGTH = 4000
 
 
 class ChatMessage(BaseModel):
@@ -13,9 +18,17 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     """Request payload for chat endpoint."""
 
-    message: str = Field(..., min_length=1, description="User's message")
+    message: str = Field(
+        ..., min_length=1, max_length=MAX_MESSAGE_LENGTH, description="User's message"
+    )
+    session_id: str | None = Field(
+        None,
+        max_length=64,
+        description="Server-side session to continue; history is then kept by the server",
+    )
     conversation_history: list[ChatMessage] = Field(
-        default_factory=list, description="Previous conversation history"
+        default_factory=list,
+        description="Previous conversation history (only used without a session)",
     )
 
 
@@ -33,6 +46,24 @@ class ChatResponse(BaseModel):
     sources: list[str] = Field(
         default_factory=list, description="Sources used for the response"
     )
+    session_id: str | None = Field(
+        None, description="Session to send with the next message"
+    )
+
+
+class BatchChatRequest(BaseModel):
+    """Request payload for the batch chat endpoint."""
+
+    questions: list[
+        Annotated[str, StringConstraints(strip_whitespace=True, min_length=1, max_length=MAX_MESSAGE_LENGTH)]
+    ] = Field(..., min_length=1, description="Independent questions, each answered as a new chat")
+
+
+class BatchChatResult(ChatResponse):
+    """One answered question in the batch endpoint's NDJSON stream."""
+
+    index: int = Field(..., description="Position of the question in the request")
+    question: str = Field(..., description="The question answered")
 
 
 class HealthCheck(BaseModel):
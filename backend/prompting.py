@@ -0,0 +1,288 @@
+"""Prompt assembly for chat completions."""
+
+import hashlib
+import math
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+
+from config import settings
+from faq_index import FAQHit
+from models import ChatMessage
+from knowledge_base import (
+    BASE_HR_PROMPT,
+    PROMPT_VERSION,
+    KnowledgeBase,
+    get_knowledge_base,
+    search_faq,
+)
+
+# Rough English average; good enough for budgeting without a tokenizer
+CHARS_PER_TOKEN = 4
+
+
+# Role markers and separators the chat format adds around each message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+SUMMARY_HEADER = "Summary of the earlier conversation:"
+# Longest excerpt of a single message kept in the summary
+SUMMARY_LINE_CHARS = 160
+
+_SENTENCE_END_RE = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimate the number of tokens in a piece of text."""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def message_tokens(content: str) -> int:
+    """Estimate what one chat message costs, including its framing."""
+    return estimate_tokens(content) + MESSAGE_OVERHEAD_TOKENS
+
+
+@dataclass(frozen=True, slots=True)
+class PromptPlan:
+    """An assembled prompt and what it cost compared to the full dump.
+
+    system_prompt is the stable prefix: byte-identical for every request
+    against the same FAQ version, so providers can serve it from their
+    prompt cache. Per-question content goes in context, which is sent after
+    the conversation history.
+    """
+
+    system_prompt: str
+    context: str | None
+    prefix_id: str
+    mode: str  # "retrieval", "full" or "full-fallback"
+    faq_entry_ids: tuple[int, ...]
+    prompt_tokens: int
+    full_prompt_tokens: int
+    retrieval_score: float | None = None  # best FAQ match, if retrieval ran
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.full_prompt_tokens - self.prompt_tokens
+
+
+@lru_cache(maxsize=16)
+def prefix_id(system_prompt: str) -> str:
+    """Short id of a prompt prefix: the prompt version plus a content digest."""
+    digest = hashlib.sha256(system_prompt.encode()).hexdigest()[:12]
+    return f"v{PROMPT_VERSION}-{digest}"
+
+
+def build_faq_context(faq_content: str) -> str:
+    """Wrap the FAQ entries selected for one question."""
+    return f"=== RELEVANT FREQUENTLY ASKED QUESTIONS ===\n\n{faq_content}"
+
+
+def build_prompt(
+    query: str,
+    kb: KnowledgeBase | None = None,
+    mode: str | None = None,
+    top_k: int | None = None,
+    token_budget: int | None = None,
+    hits: list[FAQHit] | None = None,
+) -> PromptPlan:
+    """Build the prompt for a question.
+
+    In "retrieval" mode the stable prefix is the base prompt and only the
+    top-k FAQ entries that fit within the token budget are added, as
+    per-question context. "full" mode (and retrieval with no matches) makes
+    the complete FAQ dump part of the prefix. Precomputed search_faq hits
+    (at least top_k) save searching again.
+    """
+    kb = kb or get_knowledge_base()
+    mode = mode or settings.prompt_mode
+    top_k = top_k if top_k is not None else settings.retrieval_top_k
+    token_budget = token_budget if token_budget is not None else settings.retrieval_token_budget
+    full_tokens = estimate_tokens(kb.system_prompt)
+
+    if mode == "retrieval":
+        hits = search_faq(query, top_k, kb) if hits is None else hits[:top_k]
+        retrieval_score = max((max(hit.match, hit.similarity) for hit in hits), default=0.0)
+        selected = []
+        used = 0
+        for hit in hits:
+            text = hit.entry.format()
+            cost = estimate_tokens(text)
+            if used + cost > token_budget:
+                continue
+            selected.append((hit.entry.id, text))
+            used += cost
+
+        if selected:
+            context = build_faq_context("\n\n".join(text for _, text in selected))
+            return PromptPlan(
+                system_prompt=BASE_HR_PROMPT,
+                context=context,
+                prefix_id=prefix_id(BASE_HR_PROMPT),
+                mode="retrieval",
+                faq_entry_ids=tuple(entry_id for entry_id, _ in selected),
+                prompt_tokens=estimate_tokens(BASE_HR_PROMPT) + estimate_tokens(context),
+                full_prompt_tokens=full_tokens,
+                retrieval_score=retrieval_score,
+            )
+        mode = "full-fallback"
+    else:
+        mode = "full"
+        retrieval_score = None
+
+    return PromptPlan(
+        system_prompt=kb.system_prompt,
+        context=None,
+        prefix_id=prefix_id(kb.system_prompt),
+        mode=mode,
+        faq_entry_ids=tuple(entry.id for entry in kb.entries),
+        prompt_tokens=full_tokens,
+        full_prompt_tokens=full_tokens,
+        retrieval_score=retrieval_score,
+    )
+
+
+@dataclass(frozen=True, slots=True)
+class PackedHistory:
+    """Prior turns that fit the history budget, plus a summary of the rest."""
+
+    messages: tuple[ChatMessage, ...]  # most recent turns, oldest first
+    summary: str | None  # older turns that didn't fit, condensed
+    summarized: int  # number of messages folded into the summary
+    tokens: int
+
+
+def history_token_budget(system_prompt_tokens: int, message: str) -> int:
+    """Tokens left for prior turns in the context window.
+
+    The window has to hold the system prompt, the new question and the
+    reply (up to max_tokens); HISTORY_TOKEN_BUDGET caps what is left.
+    """
+    available = (
+        settings.context_window_tokens
+        - settings.max_tokens
+        - system_prompt_tokens
+        - MESSAGE_OVERHEAD_TOKENS
+        - message_tokens(message)
+    )
+    return max(0, min(available, settings.history_token_budget))
+
+
+@lru_cache(maxsize=4096)
+def _summarize_message(role: str, content: str) -> str:
+    """One summary line: the first sentence of a message, shortened."""
+    text = " ".join(content.split())
+    text = _SENTENCE_END_RE.split(text, maxsplit=1)[0]
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rsplit(" ", 1)[0] + "..."
+    speaker = "User" if role == "user" else "Assistant"
+    return f"- {speaker}: {text}"
+
+
+@lru_cache(maxsize=1024)
+def summarize_turns(turns: tuple[tuple[str, str], ...], max_tokens: int) -> str:
+    """Condense (role, content) turns into a running summary.
+
+    Extractive rather than model-generated, so it costs no extra LLM call:
+    each message contributes its first sentence, and when the summary is
+    over budget the oldest lines go first. Results are cached, and the lines
+    are cached per message, so a conversation that grows by one turn only
+    summarizes the turn that newly scrolled out of the window.
+    """
+    used = estimate_tokens(SUMMARY_HEADER) + MESSAGE_OVERHEAD_TOKENS
+    lines = []
+    for role, content in reversed(turns):
+        line = _summarize_message(role, content)
+        cost = estimate_tokens(line) + 1
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return ""
+    return "\n".join([SUMMARY_HEADER, *reversed(lines)])
+
+
+def pack_history(
+    history: list[ChatMessage],
+    token_budget: int,
+    summary_tokens: int | None = None,
+) -> PackedHistory:
+    """Fit prior turns into a token budget, newest first.
+
+    Recent messages are kept verbatim for as long as they fit; everything
+    older is collapsed into a summary of at most summary_tokens, which is
+    reserved out of the same budget.
+    """
+    costs = [message_tokens(msg.content) for msg in history]
+    total = sum(costs)
+    if total <= token_budget:
+        return PackedHistory(tuple(history), None, 0, total)
+
+    if summary_tokens is None:
+        summary_tokens = settings.history_summary_tokens
+    summary_tokens = min(summary_tokens, token_budget // 2)
+
+    used = 0
+    start = len(history)
+    while start > 0 and used + costs[start - 1] <= token_budget - summary_tokens:
+        start -= 1
+        used += costs[start]
+
+    older = tuple((msg.role, msg.content) for msg in history[:start])
+    summary = summarize_turns(older, summary_tokens) if summary_tokens > 0 else ""
+    if summary:
+        used += message_tokens(summary)
+    return PackedHistory(tuple(history[start:]), summary or None, start, used)
+
+
+def layout_messages(prompt: PromptPlan, history: PackedHistory, message: str) -> list[dict]:
+    """Order chat messages so the cacheable prefix comes first.
+
+    Stable parts lead and volatile parts trail: the versioned system
+    prefix, then the prior turns, then one system message with this
+    question's FAQ excerpts and the history summary, then the question.
+    """
+    messages = [{"role": "system", "content": prompt.system_prompt}]
+    for msg in history.messages:
+        messages.append({"role": msg.role, "content": msg.content})
+
+    volatile = [part for part in (prompt.context, history.summary) if part]
+    if volatile:
+        messages.append({"role": "system", "content": "\n\n".join(volatile)})
+
+    messages.append({"role": "user", "content": message})
+    return messages
+
+
+class PromptCacheStats:
+    """Provider prompt-cache usage, read from each response's usage block."""
+
+    def __init__(self):
+        self.responses = 0
+        self.responses_with_hits = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+
+    def record(self, usage) -> None:
+        """Count one response's usage (OpenAI-style; None if not reported)."""
+        if usage is None:
+            return
+        details = getattr(usage, "prompt_tokens_details", None)
+        cached = getattr(details, "cached_tokens", None) or 0
+        self.responses += 1
+        self.prompt_tokens += usage.prompt_tokens or 0
+        self.cached_tokens += cached
+        if cached:
+            self.responses_with_hits += 1
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            "responses": self.responses,
+            "responses_with_hits": self.responses_with_hits,
+            "prompt_tokens": self.prompt_tokens,
+            "cached_tokens": self.cached_tokens,
+            "hit_ratio": (
+                round(self.cached_tokens / self.prompt_tokens, 4) if self.prompt_tokens else 0.0
+            ),
+        }
@@ -0,0 +1,429 @@
+"""LLM providers behind one interface.
+
+ChatbotService talks to a provider instead of a particular API, so
+switching between Azure OpenAI, OpenAI and a local Ollama server is a
+settings change (LLM_PROVIDER) rather than a code change.
+"""
+
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Any, AsyncIterator
+
+import httpx
+from openai import AsyncAzureOpenAI, AsyncOpenAI
+from openai.types import CompletionUsage
+
+from config import settings
+
+logger = logging.getLogger(__name__)
+
+GENERIC_ERROR_MESSAGE = (
+    "I'm having trouble processing your request right now. Please submit your question "
+    "to the LAX2 HR team using the link below, and they will respond to you as soon as possible."
+)
+
+
+# Hosts that never go through a proxy
+LOOPBACK_PATTERNS = ("all://localhost", "all://127.0.0.1", "all://[::1]")
+
+
+def build_http_client(timeout: float | None = None) -> httpx.AsyncClient:
+    """Create the pooled HTTP client shared by every LLM request.
+
+    Connections are kept alive and reused across requests, so the TLS
+    handshake to the gateway is paid once per connection instead of per chat.
+    """
+    limits = httpx.Limits(
+        max_connections=settings.http_max_connections,
+        max_keepalive_connections=settings.http_max_keepalive_connections,
+        keepalive_expiry=settings.http_keepalive_expiry,
+    )
+    timeout = httpx.Timeout(
+        timeout if timeout is not None else settings.http_timeout,
+        connect=settings.http_connect_timeout,
+    )
+
+    # Configure proxy if needed (for Walmart network). httpx reads HTTP_PROXY,
+    # HTTPS_PROXY and NO_PROXY itself and builds the proxy transports with
+    # the client's pool settings; local servers (Ollama, stub_llm_server.py)
+    # are always reached directly, as if listed in NO_PROXY
+    if os.getenv("HTTP_PROXY") or os.getenv("HTTPS_PROXY"):
+        return httpx.AsyncClient(
+            mounts={pattern: None for pattern in LOOPBACK_PATTERNS},
+            limits=limits,
+            timeout=timeout,
+            http2=settings.http2,
+            verify=False,  # Disable SSL verification for corporate proxy
+        )
+
+    return httpx.AsyncClient(limits=limits, timeout=timeout, http2=settings.http2)
+
+
+@dataclass(slots=True)
+class Completion:
+    """A finished answer from a provider."""
+
+    text: str
+    token_logprobs: list[float] | None = None
+    usage: Any = None  # OpenAI-style usage block, if the provider reports one
+    served_by: "LLMProvider | None" = None  # set when a router picked the provider
+
+
+class LLMProvider(ABC):
+    """A chat model reachable over HTTP."""
+
+    name = "llm"
+    source = "LLM"  # shown in ChatResponse.sources
+    # True for providers that pass calls on to others (the router): they
+    # fail over between them and record each upstream call's metrics, so
+    # ChatbotService neither retries nor times the call itself
+    delegates_calls = False
+
+    def __init__(self):
+        self.http_client: httpx.AsyncClient | None = None
+
+    async def startup(self, http_client: httpx.AsyncClient | None = None) -> None:
+        """Create the long-lived HTTP client.
+
+        Args:
+            http_client: Optional pre-built client (e.g. with a test transport)
+        """
+        if self.http_client is None:
+            self.http_client = http_client or build_http_client()
+
+    async def aclose(self) -> None:
+        """Close the shared HTTP client and its pooled connections."""
+        if self.http_client is not None:
+            await self.http_client.aclose()
+        self.http_client = None
+
+    @abstractmethod
+    async def complete(self, messages: list[dict]) -> Completion:
+        """Generate a full answer."""
+
+    @abstractmethod
+    def stream(self, messages: list[dict]) -> AsyncIterator[str | Completion]:
+        """Yield answer text as it is generated, then the final Completion."""
+
+    async def warm_up(self) -> bool:
+        """Get the upstream ready for the first chat (nothing to do by default).
+
+        Returns:
+            True if the upstream answered
+        """
+        return True
+
+    async def _open_connection(self, url: str) -> bool:
+        """Put a connection to url in the pool; any HTTP response will do."""
+        try:
+            await self.http_client.head(url)
+            return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not reach {self.name} at {url}: {e}")
+            return False
+
+    async def probe(self) -> None:
+        """A minimal call showing the provider answers again (raises if not)."""
+        await self.complete([{"role": "user", "content": "ping"}])
+
+    def error_message(self, error: Exception) -> str:
+        """What to tell the user when a call fails."""
+        return GENERIC_ERROR_MESSAGE
+
+    def circuit_breaker(self):
+        """A breaker the provider keeps itself, or None for ChatbotService to add one."""
+        return None
+
+    def slow_call_seconds(self) -> float | None:
+        """Calls slower than this count as breaker failures (None: never)."""
+        return settings.breaker_slow_call_seconds
+
+    def stats(self) -> dict:
+        """Provider-specific counters for /api/stats (none by default)."""
+        return {}
+
+
+class OpenAIProvider(LLMProvider):
+    """Regular OpenAI, or any server speaking the chat-completions API."""
+
+    name = "openai"
+    source = "OpenAI GPT-4"
+
+    def __init__(
+        self,
+        model: str | None = None,
+        api_key: str | None = None,
+        base_url: str | None = None,
+    ):
+        super().__init__()
+        self.model = model or settings.openai_model
+        self.api_key = api_key or settings.openai_api_key
+        self.base_url = base_url or settings.openai_base_url
+        self.timeout = settings.openai_timeout
+        self.client: AsyncOpenAI | None = None
+
+    def _client_options(self) -> dict:
+        # The SDK's own defaults (a 600 s timeout and two retries) would
+        # override the pool's; retries are left to ChatbotService's budget
+        return {
+            "timeout": httpx.Timeout(self.timeout, connect=settings.http_connect_timeout),
+            "max_retries": 0,
+        }
+
+    def _create_client(self, http_client: httpx.AsyncClient) -> AsyncOpenAI:
+        return AsyncOpenAI(
+            api_key=self.api_key,
+            base_url=self.base_url,
+            http_client=http_client,
+            **self._client_options(),
+        )
+
+    async def startup(self, http_client: httpx.AsyncClient | None = None) -> None:
+        if self.client is not None:
+            return
+        await super().startup(http_client)
+        self.client = self._create_client(self.http_client)
+
+    async def aclose(self) -> None:
+        await super().aclose()
+        self.client = None
+
+    def _request_options(self) -> dict:
+        # Token logprobs are a confidence signal, only requested when enabled
+        return {"logprobs": True} if settings.confidence_logprobs else {}
+
+    async def complete(self, messages: list[dict]) -> Completion:
+        if self.client is None:
+            await self.startup()
+
+        # Azure uses the deployment name, OpenAI the model name
+        response = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=settings.max_tokens,
+            temperature=settings.temperature,
+            **self._request_options(),
+        )
+
+        choice = response.choices[0]
+        token_logprobs = None
+        if choice.logprobs is not None and choice.logprobs.content:
+            token_logprobs = [token.logprob for token in choice.logprobs.content]
+        return Completion(choice.message.content or "", token_logprobs, response.usage)
+
+    async def warm_up(self) -> bool:
+        """Connect (DNS, TCP, TLS) ahead of the first chat; costs no tokens."""
+        if self.client is None:
+            await self.startup()
+        return await self._open_connection(str(self.client.base_url))
+
+    async def probe(self) -> None:
+        if self.client is None:
+            await self.startup()
+        await self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": "ping"}],
+            max_tokens=1,
+        )
+
+    async def stream(self, messages: list[dict]) -> AsyncIterator[str | Completion]:
+        if self.client is None:
+            await self.startup()
+
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            max_tokens=settings.max_tokens,
+            temperature=settings.temperature,
+            stream=True,
+            # The final chunk then carries usage, including cached tokens
+            stream_options={"include_usage": True},
+            **self._request_options(),
+        )
+        parts: list[str] = []
+        token_logprobs: list[float] = []
+        usage = None
+        async for chunk in stream:
+            if chunk.usage is not None:
+                usage = chunk.usage
+            if not chunk.choices:
+                continue
+            choice = chunk.choices[0]
+            if choice.logprobs is not None and choice.logprobs.content:
+                token_logprobs.extend(token.logprob for token in choice.logprobs.content)
+            if choice.delta.content:
+                parts.append(choice.delta.content)
+                yield choice.delta.content
+        yield Completion("".join(parts), token_logprobs or None, usage)
+
+
+class AzureOpenAIProvider(OpenAIProvider):
+    """Azure OpenAI (Walmart Element GenAI or direct Azure)."""
+
+    name = "azure"
+    source = "Azure OpenAI GPT-4"
+
+    def __init__(
+        self,
+        deployment: str | None = None,
+        endpoint: str | None = None,
+        api_key: str | None = None,
+        api_version: str | None = None,
+    ):
+        super().__init__(model=deployment or settings.azure_openai_deployment_name)
+        self.endpoint = endpoint or settings.azure_openai_endpoint
+        self.api_key = api_key or settings.azure_openai_api_key
+        self.api_version = api_version or settings.azure_openai_api_version
+        self.timeout = settings.azure_openai_timeout
+
+    def _create_client(self, http_client: httpx.AsyncClient) -> AsyncOpenAI:
+        return AsyncAzureOpenAI(
+            api_key=self.api_key,
+            api_version=self.api_version,
+            azure_endpoint=self.endpoint,
+            http_client=http_client,
+            **self._client_options(),
+        )
+
+
+class OllamaProvider(LLMProvider):
+    """Local Ollama server (free, runs on your computer)."""
+
+    name = "ollama"
+    source = "Ollama Local LLM"
+
+    def __init__(self, base_url: str | None = None, model: str | None = None):
+        super().__init__()
+        self.base_url = (base_url or settings.ollama_base_url).rstrip("/")
+        self.model = model or settings.ollama_model
+
+    async def startup(self, http_client: httpx.AsyncClient | None = None) -> None:
+        """Create the HTTP client (warm_up() preloads the model)."""
+        if self.http_client is not None:
+            return
+        # Local LLM might take a bit longer
+        self.http_client = http_client or build_http_client(timeout=settings.ollama_timeout)
+
+    def slow_call_seconds(self) -> float | None:
+        return settings.ollama_slow_call_seconds
+
+    async def warm_up(self) -> bool:
+        """Load the model into memory and keep it resident.
+
+        An empty generate request makes Ollama load the model without
+        producing any tokens; keep_alive stops it being unloaded when idle.
+
+        Returns:
+            True if the model was loaded
+        """
+        try:
+            await self.probe()
+            logger.info(f"Ollama model {self.model} loaded (keep_alive={settings.ollama_keep_alive})")
+            return True
+        except httpx.HTTPError as e:
+            logger.warning(f"Could not preload Ollama model {self.model}: {e}")
+            return False
+
+    async def probe(self) -> None:
+        """Ask Ollama to load the model; fails if the server or model is missing."""
+        if self.http_client is None:
+            await self.startup()
+        response = await self.http_client.post(
+            f"{self.base_url}/api/generate",
+            json={"model": self.model, "keep_alive": settings.ollama_keep_alive},
+        )
+        response.raise_for_status()
+
+    async def complete(self, messages: list[dict]) -> Completion:
+        # Consume the stream as it arrives; the last item is the Completion
+        async for item in self.stream(messages):
+            completion = item
+        return completion
+
+    async def stream(self, messages: list[dict]) -> AsyncIterator[str | Completion]:
+        """Stream response tokens from Ollama as they are generated.
+
+        Ollama streams one JSON object per line; each carries the next piece
+        of the assistant message until a final object with "done": true.
+        """
+        if self.http_client is None:
+            await self.startup()
+
+        parts: list[str] = []
+        usage = None
+        async with self.http_client.stream(
+            "POST",
+            f"{self.base_url}/api/chat",
+            json={
+                "model": self.model,
+                "messages": messages,
+                "stream": True,
+                "keep_alive": settings.ollama_keep_alive,
+                "options": {
+                    "num_predict": settings.max_tokens,
+                    "temperature": settings.temperature,
+                },
+            },
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                chunk = json.loads(line)
+                if "error" in chunk:
+                    raise RuntimeError(f"Ollama error: {chunk['error']}")
+                content = chunk.get("message", {}).get("content")
+                if content:
+                    parts.append(content)
+                    yield content
+                if chunk.get("done"):
+                    # Ollama reports token counts on the final object
+                    if "prompt_eval_count" in chunk or "eval_count" in chunk:
+                        prompt_tokens = chunk.get("prompt_eval_count", 0)
+                        completion_tokens = chunk.get("eval_count", 0)
+                        usage = CompletionUsage(
+                            prompt_tokens=prompt_tokens,
+                            completion_tokens=completion_tokens,
+                            total_tokens=prompt_tokens + completion_tokens,
+                        )
+                    break
+        yield Completion("".join(parts), usage=usage)
+
+    def error_message(self, error: Exception) -> str:
+        if isinstance(error, httpx.ConnectError):
+            # Ollama not running
+            return "The local AI service isn't running. Please start Ollama or check the HR resources list for help."
+        return "I'm having trouble processing your request right now. Please check the HR resources list for assistance."
+
+
+PROVIDERS: dict[str, type[LLMProvider]] = {
+    "azure": AzureOpenAIProvider,
+    "openai": OpenAIProvider,
+    "ollama": OllamaProvider,
+}
+
+
+def create_provider(name: str | None = None) -> LLMProvider:
+    """Build the provider named by LLM_PROVIDER.
+
+    Without LLM_PROVIDER, USE_AZURE_OPENAI picks between Azure and OpenAI
+    as before. A comma-separated list (LLM_PROVIDERS, e.g. "azure,ollama")
+    builds a RoutedProvider over all of them instead.
+    """
+    if name is None and settings.llm_providers:
+        names = [n.strip() for n in settings.llm_providers.split(",") if n.strip()]
+        if len(names) > 1:
+            from router import RoutedProvider
+
+            return RoutedProvider([create_provider(n) for n in names])
+        name = names[0] if names else None
+    name = (name or settings.llm_provider or ("azure" if settings.use_azure_openai else "openai")).lower()
+    try:
+        return PROVIDERS[name]()
+    except KeyError:
+        raise ValueError(
+            f"Unknown LLM provider {name!r}; expected one of {', '.join(PROVIDERS)}"
+        ) from None
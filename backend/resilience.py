@@ -0,0 +1,182 @@
+"""Retries and circuit breaking for upstream LLM calls.
+
+Retries use full-jitter exponential backoff and draw on a shared budget,
+so a struggling gateway sees at most a fixed share of extra traffic rather
+than every request tripling itself. The circuit breaker stops sending user
+requests to a provider that keeps failing (or answering too slowly) and
+probes it in the background until it recovers.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from typing import Awaitable, Callable
+
+import httpx
+import openai
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {408, 409, 429}
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed call may succeed if tried again."""
+    if isinstance(error, (httpx.TimeoutException, httpx.NetworkError, openai.APIConnectionError)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None and isinstance(error, httpx.HTTPStatusError):
+        status = error.response.status_code
+    return status is not None and (status in RETRYABLE_STATUS or status >= 500)
+
+
+class RetryPolicy:
+    """Jittered exponential backoff, limited by a retry budget.
+
+    Every request deposits budget_ratio tokens (up to budget_max) and every
+    retry spends one, so over time retries stay below that share of requests.
+    """
+
+    def __init__(
+        self,
+        max_retries: int = 2,
+        base_delay: float = 0.2,
+        max_delay: float = 2.0,
+        budget_ratio: float = 0.1,
+        budget_max: float = 10.0,
+    ):
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.budget_ratio = budget_ratio
+        self.budget_max = budget_max
+        self.tokens = budget_max
+        self.retries = 0
+        self.budget_exhausted = 0
+
+    def start(self) -> None:
+        """Count a new request toward the retry budget."""
+        self.tokens = min(self.budget_max, self.tokens + self.budget_ratio)
+
+    def next_delay(self, attempt: int, error: Exception) -> float | None:
+        """Seconds to wait before retrying, or None to give up.
+
+        Args:
+            attempt: Retries made so far for this request
+            error: What the last attempt raised
+        """
+        if attempt >= self.max_retries or not is_retryable(error):
+            return None
+        if self.tokens < 1:
+            self.budget_exhausted += 1
+            return None
+        self.tokens -= 1
+        self.retries += 1
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2**attempt))
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            "retries": self.retries,
+            "budget_exhausted": self.budget_exhausted,
+            "budget_tokens": round(self.tokens, 2),
+        }
+
+
+class CircuitBreaker:
+    """Stop calling a provider after repeated failures until a probe succeeds.
+
+    failure_threshold consecutive failed calls open the breaker; a call
+    slower than slow_call_seconds counts as a failure. While open, allow()
+    is False and a background task runs probe() every probe_interval
+    seconds (jittered); the first probe that succeeds closes the breaker.
+    """
+
+    def __init__(
+        self,
+        probe: Callable[[], Awaitable[object]],
+        failure_threshold: int = 5,
+        slow_call_seconds: float | None = None,
+        probe_interval: float = 10.0,
+        probe_timeout: float = 10.0,
+        name: str = "llm",
+    ):
+        self.probe = probe
+        self.failure_threshold = failure_threshold
+        self.slow_call_seconds = slow_call_seconds
+        self.probe_interval = probe_interval
+        self.probe_timeout = probe_timeout
+        self.name = name
+        self.failures = 0
+        self.opened_at: float | None = None
+        self.times_opened = 0
+        self.probes = 0
+        self._probe_task: asyncio.Task | None = None
+
+    @property
+    def is_open(self) -> bool:
+        return self.opened_at is not None
+
+    def allow(self) -> bool:
+        """Whether a user request may call the provider now."""
+        return self.opened_at is None
+
+    def record_success(self, latency: float | None = None) -> None:
+        """Report a finished call (slow ones still count as failures)."""
+        if self.slow_call_seconds is not None and latency is not None and latency > self.slow_call_seconds:
+            self.record_failure()
+            return
+        self.failures = 0
+
+    def record_failure(self) -> None:
+        """Report a failed call; opens the breaker at the threshold."""
+        self.failures += 1
+        if self.opened_at is None and self.failures >= self.failure_threshold:
+            self._open()
+
+    def _open(self) -> None:
+        self.opened_at = time.monotonic()
+        self.times_opened += 1
+        logger.warning(f"Circuit breaker opened for {self.name} after {self.failures} failures")
+        if self._probe_task is None or self._probe_task.done():
+            self._probe_task = asyncio.create_task(self._probe_until_closed())
+
+    def _close(self) -> None:
+        outage = time.monotonic() - self.opened_at if self.opened_at is not None else 0.0
+        self.opened_at = None
+        self.failures = 0
+        logger.info(f"Circuit breaker closed for {self.name} after {outage:.1f}s")
+
+    async def _probe_until_closed(self) -> None:
+        while self.opened_at is not None:
+            await asyncio.sleep(self.probe_interval * random.uniform(0.8, 1.2))
+            self.probes += 1
+            try:
+                await asyncio.wait_for(self.probe(), self.probe_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.info(f"Probe of {self.name} failed: {e}")
+                continue
+            self._close()
+
+    async def aclose(self) -> None:
+        """Stop background probing."""
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+
+    def stats(self) -> dict:
+        """Counters for monitoring."""
+        return {
+            "state": "open" if self.is_open else "closed",
+            "open_for_s": round(time.monotonic() - self.opened_at, 1) if self.is_open else 0.0,
+            "consecutive_failures": self.failures,
+            "times_opened": self.times_opened,
+            "probes": self.probes,
+        }
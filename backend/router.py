@@ -0,0 +1,318 @@
+"""Routing across several LLM providers.
+
+RoutedProvider looks like a single provider to ChatbotService but sends
+each request to the fastest healthy one it knows, e.g. Azure/Element
+GenAI first with a local Ollama box as the backup. Every provider keeps
+its own latency record, error rate and circuit breaker. Optionally a
+hedged request goes to the next-best provider when the first hasn't
+answered within its usual (p95) time, and whichever answers first wins.
+"""
+
+import asyncio
+import logging
+import random
+import time
+from collections import deque
+from typing import AsyncIterator
+
+import metrics
+from config import settings
+from providers import Completion, LLMProvider
+from resilience import CircuitBreaker, is_retryable
+
+logger = logging.getLogger(__name__)
+
+# Latency samples kept per provider for its p95
+LATENCY_WINDOW = 200
+# Fewer samples than this and the p95 isn't trusted; hedge_min_delay applies
+MIN_P95_SAMPLES = 20
+
+
+class NoHealthyProvider(RuntimeError):
+    """Every provider's circuit breaker is open."""
+
+
+class ProviderRoute:
+    """One provider with its latency, error rate and breaker."""
+
+    def __init__(self, provider: LLMProvider):
+        self.provider = provider
+        self.breaker = CircuitBreaker(
+            provider.probe,
+            failure_threshold=settings.breaker_failure_threshold,
+            slow_call_seconds=provider.slow_call_seconds(),
+            probe_interval=settings.breaker_probe_interval,
+            name=provider.name,
+        )
+        self.latencies: deque[float] = deque(maxlen=LATENCY_WINDOW)
+        self.latency_ewma: float | None = None
+        self.error_rate = 0.0  # EWMA of failures
+        self.requests = 0
+        self.errors = 0
+        self.hedges = 0  # hedged requests sent here
+        self.hedge_wins = 0  # ...that answered first
+
+    @property
+    def healthy(self) -> bool:
+        return self.breaker.allow() and self.error_rate < settings.router_max_error_rate
+
+    def p95(self) -> float | None:
+        """95th-percentile latency of recent calls, once there are enough."""
+        if len(self.latencies) < MIN_P95_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(0.95 * (len(ordered) - 1))]
+
+    def record_latency(self, latency: float) -> None:
+        self.latencies.append(latency)
+        if self.latency_ewma is None:
+            self.latency_ewma = latency
+        else:
+            self.latency_ewma += (latency - self.latency_ewma) * 0.2
+
+    def record_success(self, latency: float | None) -> None:
+        self.requests += 1
+        self.error_rate *= 0.9
+        if latency is not None:
+            self.record_latency(latency)
+        self.breaker.record_success(latency)
+
+    def record_failure(self) -> None:
+        self.requests += 1
+        self.errors += 1
+        self.error_rate = self.error_rate * 0.9 + 0.1
+        self.breaker.record_failure()
+
+    def stats(self) -> dict:
+        p95 = self.p95()
+        return {
+            "healthy": self.healthy,
+            "breaker": self.breaker.stats()["state"],
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.error_rate, 4),
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            "hedges": self.hedges,
+            "hedge_wins": self.hedge_wins,
+        }
+
+
+class AllRoutesBreaker:
+    """ChatbotService's breaker for a router: open only while every route's is.
+
+    Calls are recorded by the route breakers, so the record_* methods do
+    nothing; otherwise one failing provider would open this breaker too and
+    stop the router from failing over to the others.
+    """
+
+    def __init__(self, routes: list[ProviderRoute]):
+        self.routes = routes
+
+    @property
+    def is_open(self) -> bool:
+        return not self.allow()
+
+    def allow(self) -> bool:
+        return any(route.breaker.allow() for route in self.routes)
+
+    def record_success(self, latency: float | None = None) -> None:
+        pass
+
+    def record_failure(self) -> None:
+        pass
+
+    async def aclose(self) -> None:
+        pass  # RoutedProvider.aclose() stops the route breakers
+
+    def stats(self) -> dict:
+        return {
+            "state": "open" if self.is_open else "closed",
+            "routes_open": sum(route.breaker.is_open for route in self.routes),
+        }
+
+
+class RoutedProvider(LLMProvider):
+    """Several providers behind one, picked per request by latency and health."""
+
+    name = "router"
+    delegates_calls = True
+
+    def __init__(
+        self,
+        providers: list[LLMProvider],
+        hedge: bool | None = None,
+        hedge_min_delay: float | None = None,
+        explore_ratio: float | None = None,
+    ):
+        super().__init__()
+        if not providers:
+            raise ValueError("RoutedProvider needs at least one provider")
+        self.routes = [ProviderRoute(provider) for provider in providers]
+        self.hedge = settings.router_hedge_enabled if hedge is None else hedge
+        self.hedge_min_delay = settings.router_hedge_min_delay if hedge_min_delay is None else hedge_min_delay
+        self.explore_ratio = settings.router_explore_ratio if explore_ratio is None else explore_ratio
+        self.source = providers[0].source
+        self._breaker = AllRoutesBreaker(self.routes)
+
+    def circuit_breaker(self) -> AllRoutesBreaker:
+        return self._breaker
+
+    async def startup(self, http_client=None) -> None:
+        for route in self.routes:
+            await route.provider.startup(http_client)
+        self.http_client = self.routes[0].provider.http_client
+
+    async def aclose(self) -> None:
+        for route in self.routes:
+            await route.breaker.aclose()
+            await route.provider.aclose()
+        self.http_client = None
+
+    def _ranked(self) -> list[ProviderRoute]:
+        """Healthy routes, fastest first; unmeasured ones follow in configured order."""
+        healthy = [route for route in self.routes if route.healthy]
+        if not healthy:
+            # Breakers aside, a high error rate alone doesn't rule everything out
+            healthy = [route for route in self.routes if route.breaker.allow()]
+        if not healthy:
+            raise NoHealthyProvider("Every LLM provider is failing")
+        ranked = sorted(
+            healthy,
+            key=lambda route: (route.latency_ewma is None, route.latency_ewma or 0.0),
+        )
+        # Now and then try another provider first so its latency stays known
+        if len(ranked) > 1 and random.random() < self.explore_ratio:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    async def _call(self, route: ProviderRoute, messages: list[dict]) -> Completion:
+        started = time.perf_counter()
+        try:
+            with metrics.track_llm_call(route.provider.name):
+                completion = await route.provider.complete(messages)
+        except asyncio.CancelledError:
+            # Lost a hedge race: it took at least this long, which still
+            # tells the ranking it was slow
+            route.record_latency(time.perf_counter() - started)
+            raise
+        except Exception as e:
+            if is_retryable(e):
+                route.record_failure()
+            raise
+        route.record_success(time.perf_counter() - started)
+        completion.served_by = route.provider
+        return completion
+
+    async def _failover(self, ranked: list[ProviderRoute], messages: list[dict]) -> Completion:
+        """Try the routes in order; a transient failure moves on to the next."""
+        for position, route in enumerate(ranked):
+            try:
+                return await self._call(route, messages)
+            except Exception as e:
+                if position == len(ranked) - 1 or not is_retryable(e):
+                    raise
+                logger.warning(
+                    f"{route.provider.name} failed, trying {ranked[position + 1].provider.name}: {e}"
+                )
+
+    async def complete(self, messages: list[dict]) -> Completion:
+        ranked = self._ranked()
+        primary = ranked[0]
+        if not self.hedge or len(ranked) < 2:
+            return await self._failover(ranked, messages)
+
+        first = asyncio.ensure_future(self._call(primary, messages))
+        delay = max(self.hedge_min_delay, primary.p95() or 0.0)
+        try:
+            done, _ = await asyncio.wait({first}, timeout=delay)
+        except asyncio.CancelledError:
+            # The caller gave up (e.g. the client disconnected)
+            first.cancel()
+            raise
+        if done:
+            error = first.exception()
+            if error is None:
+                return first.result()
+            if not is_retryable(error):
+                raise error
+            return await self._failover(ranked[1:], messages)
+
+        # The primary is slower than usual: race it against the next best
+        backup = ranked[1]
+        backup.hedges += 1
+        metrics.LLM_HEDGED_REQUESTS.labels(backup.provider.name).inc()
+        second = asyncio.ensure_future(self._call(backup, messages))
+        pending = {first, second}
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            backup.hedge_wins += 1
+                            metrics.LLM_HEDGE_WINS.labels(backup.provider.name).inc()
+                        return task.result()
+            raise first.exception()
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def stream(self, messages: list[dict]) -> AsyncIterator[str | Completion]:
+        # Streams aren't hedged: tokens may already have reached the user
+        ranked = self._ranked()
+        for position, route in enumerate(ranked):
+            started = time.perf_counter()
+            first_token = None
+            streamed = False
+            try:
+                with metrics.track_llm_call(route.provider.name):
+                    async for item in route.provider.stream(messages):
+                        if isinstance(item, Completion):
+                            item.served_by = route.provider
+                        elif first_token is None:
+                            first_token = time.perf_counter() - started
+                        streamed = True
+                        yield item
+            except Exception as e:
+                if is_retryable(e):
+                    route.record_failure()
+                # Fail over only while nothing has reached the user
+                if streamed or position == len(ranked) - 1 or not is_retryable(e):
+                    raise
+                logger.warning(
+                    f"{route.provider.name} failed, trying {ranked[position + 1].provider.name}: {e}"
+                )
+                continue
+            # Ranked by time to first token, like the service breaker judges streams
+            route.record_success(first_token if first_token is not None else time.perf_counter() - started)
+            return
+
+    async def warm_up(self) -> bool:
+        """Warm every provider at once; True if any answered."""
+        results = await asyncio.gather(*(route.provider.warm_up() for route in self.routes))
+        return any(results)
+
+    async def probe(self) -> None:
+        """Succeeds as soon as any provider answers."""
+        error: Exception | None = None
+        for route in self.routes:
+            try:
+                await route.provider.probe()
+                return
+            except Exception as e:
+                error = e
+        raise error
+
+    def error_message(self, error: Exception) -> str:
+        return self.routes[0].provider.error_message(error)
+
+    def stats(self) -> dict:
+        hedges = sum(route.hedges for route in self.routes)
+        return {
+            "providers": {route.provider.name: route.stats() for route in self.routes},
+            "hedge_enabled": self.hedge,
+            # Each hedge is one extra upstream call
+            "hedged_requests": hedges,
+            "hedge_wins": sum(route.hedge_wins for route in self.routes),
+        }
@@ -0,0 +1,297 @@
+"""Server-side conversation sessions.
+
+Clients send a session id plus the new message instead of resending the
+whole conversation on every turn. Each session keeps a bounded history
+and expires after a period of inactivity.
+"""
+
+import asyncio
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from pathlib import Path
+
+from config import settings
+from models import ChatMessage
+
+# Rough per-message bookkeeping cost on top of the content itself
+_MESSAGE_OVERHEAD_BYTES = 64
+
+
+def new_session_id() -> str:
+    """Generate an unguessable session id."""
+    return secrets.token_urlsafe(16)
+
+
+class SessionStore(ABC):
+    """Storage backend for per-session conversation history."""
+
+    @abstractmethod
+    async def get_history(self, session_id: str) -> list[ChatMessage] | None:
+        """Return the session's messages (oldest first), or None if unknown or expired."""
+
+    @abstractmethod
+    async def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        """Add messages to a session, creating it if needed."""
+
+    @abstractmethod
+    async def delete(self, session_id: str) -> None:
+        """Forget a session."""
+
+    @abstractmethod
+    async def stats(self) -> dict:
+        """Counters for monitoring."""
+
+    async def aclose(self) -> None:
+        """Release any resources held by the store."""
+
+
+class _Session:
+    __slots__ = ("messages", "last_access", "size")
+
+    def __init__(self, max_messages: int):
+        # (role, content) tuples are far smaller than ChatMessage models
+        self.messages: deque[tuple[str, str]] = deque(maxlen=max_messages)
+        self.last_access = time.monotonic()
+        self.size = 0
+
+
+class InMemorySessionStore(SessionStore):
+    """Sessions kept in process memory, evicted by idle time and a memory cap."""
+
+    def __init__(
+        self,
+        max_messages: int = 20,
+        idle_ttl: float = 1800.0,
+        max_sessions: int = 10000,
+        max_bytes: int = 50_000_000,
+    ):
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_bytes = max_bytes
+        # Ordered by last access, least recent first
+        self._sessions: OrderedDict[str, _Session] = OrderedDict()
+        self._bytes = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def _remove(self, session_id: str) -> None:
+        session = self._sessions.pop(session_id)
+        self._bytes -= session.size
+
+    def _expire_idle(self, now: float) -> None:
+        while self._sessions:
+            session_id, session = next(iter(self._sessions.items()))
+            if now - session.last_access < self.idle_ttl:
+                break
+            self._remove(session_id)
+            self.expired += 1
+
+    async def get_history(self, session_id: str) -> list[ChatMessage] | None:
+        now = time.monotonic()
+        self._expire_idle(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            return None
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+        return [ChatMessage(role=role, content=content) for role, content in session.messages]
+
+    async def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        now = time.monotonic()
+        self._expire_idle(now)
+        session = self._sessions.get(session_id)
+        if session is None:
+            session = self._sessions[session_id] = _Session(self.max_messages)
+        session.last_access = now
+        self._sessions.move_to_end(session_id)
+
+        for message in messages:
+            if len(session.messages) == session.messages.maxlen:
+                _, dropped = session.messages[0]
+                session.size -= len(dropped) + _MESSAGE_OVERHEAD_BYTES
+                self._bytes -= len(dropped) + _MESSAGE_OVERHEAD_BYTES
+            session.messages.append((message.role, message.content))
+            session.size += len(message.content) + _MESSAGE_OVERHEAD_BYTES
+            self._bytes += len(message.content) + _MESSAGE_OVERHEAD_BYTES
+
+        # Evict least recently used sessions beyond the caps
+        while len(self._sessions) > 1 and (
+            len(self._sessions) > self.max_sessions or self._bytes > self.max_bytes
+        ):
+            self._remove(next(iter(self._sessions)))
+            self.evicted += 1
+
+    async def delete(self, session_id: str) -> None:
+        if session_id in self._sessions:
+            self._remove(session_id)
+
+    async def stats(self) -> dict:
+        return {
+            "backend": "memory",
+            "sessions": len(self._sessions),
+            "bytes": self._bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+        }
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions persisted in a local SQLite file (survives restarts)."""
+
+    def __init__(
+        self,
+        path: str | Path,
+        max_messages: int = 20,
+        idle_ttl: float = 1800.0,
+        max_sessions: int = 10000,
+    ):
+        self.path = str(path)
+        self.max_messages = max_messages
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self._conn: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    last_access REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access);
+                CREATE TABLE IF NOT EXISTS messages (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    session_id TEXT NOT NULL,
+                    role TEXT NOT NULL,
+                    content TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS messages_session ON messages (session_id, id);
+                """
+            )
+            self._conn = conn
+        return self._conn
+
+    def _delete_sessions(self, conn: sqlite3.Connection, where: str, params: tuple) -> None:
+        conn.execute(
+            f"DELETE FROM messages WHERE session_id IN (SELECT session_id FROM sessions WHERE {where})",
+            params,
+        )
+        conn.execute(f"DELETE FROM sessions WHERE {where}", params)
+
+    def _get_history(self, session_id: str) -> list[ChatMessage] | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT last_access FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+            if row is None or now - row[0] >= self.idle_ttl:
+                return None
+            conn.execute(
+                "UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id)
+            )
+            conn.commit()
+            rows = conn.execute(
+                "SELECT role, content FROM messages WHERE session_id = ? ORDER BY id",
+                (session_id,),
+            ).fetchall()
+        return [ChatMessage(role=role, content=content) for role, content in rows]
+
+    def _append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            self._delete_sessions(conn, "last_access < ?", (now - self.idle_ttl,))
+            is_new = conn.execute(
+                "SELECT 1 FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone() is None
+            conn.execute(
+                "INSERT INTO sessions (session_id, last_access) VALUES (?, ?) "
+                "ON CONFLICT(session_id) DO UPDATE SET last_access = excluded.last_access",
+                (session_id, now),
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content) VALUES (?, ?, ?)",
+                [(session_id, m.role, m.content) for m in messages],
+            )
+            # Keep only the newest messages for this session
+            conn.execute(
+                "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                (session_id, session_id, self.max_messages),
+            )
+            # And only the most recently used sessions. Only a new session can
+            # go over the cap, so appends to existing ones skip the scan
+            if is_new and conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0] > self.max_sessions:
+                self._delete_sessions(
+                    conn,
+                    "session_id NOT IN (SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT ?)",
+                    (self.max_sessions,),
+                )
+            conn.commit()
+
+    def _delete(self, session_id: str) -> None:
+        with self._lock:
+            conn = self._connect()
+            self._delete_sessions(conn, "session_id = ?", (session_id,))
+            conn.commit()
+
+    def _stats(self) -> dict:
+        with self._lock:
+            sessions = self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+        return {"backend": "sqlite", "sessions": sessions}
+
+    async def get_history(self, session_id: str) -> list[ChatMessage] | None:
+        return await asyncio.to_thread(self._get_history, session_id)
+
+    async def append(self, session_id: str, messages: list[ChatMessage]) -> None:
+        await asyncio.to_thread(self._append, session_id, messages)
+
+    async def delete(self, session_id: str) -> None:
+        await asyncio.to_thread(self._delete, session_id)
+
+    async def stats(self) -> dict:
+        return await asyncio.to_thread(self._stats)
+
+    async def aclose(self) -> None:
+        await asyncio.to_thread(self._close)
+
+    def _close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_session_store() -> SessionStore:
+    """Build the session store selected by the SESSION_BACKEND setting."""
+    if settings.session_backend == "sqlite":
+        # A relative path is inside the backend directory, wherever the server is started from
+        path = Path(settings.session_sqlite_path)
+        if not path.is_absolute():
+            path = Path(__file__).parent / path
+        return SQLiteSessionStore(
+            path,
+            max_messages=settings.session_max_messages,
+            idle_ttl=settings.session_idle_ttl,
+            max_sessions=settings.session_max_sessions,
+        )
+    return InMemorySessionStore(
+        max_messages=settings.session_max_messages,
+        idle_ttl=settings.session_idle_ttl,
+        max_sessions=settings.session_max_sessions,
+        max_bytes=settings.session_max_bytes,
+    )
+
+
+# Singleton instance
+session_store = create_session_store()
@@ -0,0 +1,320 @@
+"""Local stand-in for the LLM APIs, for benchmarks and soak tests offline.
+
+Speaks the OpenAI and Azure OpenAI chat-completions APIs (plain and
+streamed) and Ollama's /api/chat and /api/generate, with configurable
+latency, token rate and error injection. Usage reports simulate provider
+prompt caching: a repeated system prompt of 1024+ tokens comes back as
+cached_tokens, in 128-token steps like OpenAI's.
+
+Run:
+    python stub_llm_server.py --port 9000 --latency-ms 300 --tokens-per-second 40
+
+Then point the backend at it, e.g.:
+    LLM_PROVIDER=openai OPENAI_BASE_URL=http://localhost:9000/v1 OPENAI_API_KEY=stub
+    LLM_PROVIDER=azure AZURE_OPENAI_ENDPOINT=http://localhost:9000
+    LLM_PROVIDER=ollama OLLAMA_BASE_URL=http://localhost:9000
+
+The backend never sends localhost requests through HTTP_PROXY/HTTPS_PROXY,
+so this works on machines with the corporate proxy configured too.
+"""
+
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass, fields
+from typing import AsyncIterator
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+DEFAULT_ANSWER = (
+    "You can use PPTO (Protected Paid Time Off) for unexpected absences such as "
+    "an emergency. You still need to call off through the Me@Walmart app or the "
+    "call-off line before your shift starts, and the PPTO hours are taken from "
+    "your balance. Your PPTO balance is shown in the Me@Walmart app under Time "
+    "Off. If you are unsure whether an absence qualifies, your people lead can "
+    "help you check."
+)
+
+_TOKEN_RE = re.compile(r"\S+\s*")
+
+# OpenAI only caches prompts of at least 1024 tokens, in 128-token steps
+CACHE_MIN_TOKENS = 1024
+CACHE_STEP_TOKENS = 128
+
+
+@dataclass
+class StubConfig:
+    """Behaviour of the stub; every field can be changed at runtime via /stub/config."""
+
+    latency_ms: float = 200.0  # before the first token
+    jitter_ms: float = 50.0  # uniform +/- on latency_ms
+    tokens_per_second: float = 50.0  # 0 streams every token at once
+    error_rate: float = 0.0  # share of requests answered with error_status
+    error_status: int = 500
+    stream_error_rate: float = 0.0  # share of streams dropped halfway through
+    answer: str = DEFAULT_ANSWER
+    seed: int | None = None
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class StubLLM:
+    """Shared state: config, RNG, seen prompt prefixes and counters."""
+
+    def __init__(self, config: StubConfig):
+        self.config = config
+        self.random = random.Random(config.seed)
+        self._prefixes: OrderedDict[str, None] = OrderedDict()
+        self.requests = 0
+        self.errors = 0
+        self.dropped_streams = 0
+        self.by_api: dict[str, int] = {}
+
+    def start(self, api: str) -> bool:
+        """Count a request; return True if it should fail."""
+        self.requests += 1
+        self.by_api[api] = self.by_api.get(api, 0) + 1
+        if self.random.random() < self.config.error_rate:
+            self.errors += 1
+            return True
+        return False
+
+    def latency(self) -> float:
+        jitter = self.random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        return max(0.0, self.config.latency_ms + jitter) / 1000
+
+    def token_delay(self) -> float:
+        tps = self.config.tokens_per_second
+        return 1 / tps if tps > 0 else 0.0
+
+    def tokens(self) -> list[str]:
+        return _TOKEN_RE.findall(self.config.answer)
+
+    def drop_stream(self) -> bool:
+        if self.random.random() < self.config.stream_error_rate:
+            self.dropped_streams += 1
+            return True
+        return False
+
+    def usage(self, messages: list[dict], completion_tokens: int) -> dict:
+        """OpenAI-style usage, with cached tokens for a repeated system prompt."""
+        prompt_tokens = sum(_estimate_tokens(str(m.get("content", ""))) for m in messages)
+        cached = 0
+        if messages and messages[0].get("role") == "system":
+            prefix = str(messages[0].get("content", ""))
+            key = hashlib.sha256(prefix.encode()).hexdigest()
+            prefix_tokens = _estimate_tokens(prefix)
+            if key in self._prefixes and prefix_tokens >= CACHE_MIN_TOKENS:
+                cached = prefix_tokens // CACHE_STEP_TOKENS * CACHE_STEP_TOKENS
+            self._prefixes[key] = None
+            self._prefixes.move_to_end(key)
+            while len(self._prefixes) > 256:
+                self._prefixes.popitem(last=False)
+        return {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+            "prompt_tokens_details": {"cached_tokens": cached},
+        }
+
+    def stats(self) -> dict:
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "dropped_streams": self.dropped_streams,
+            "by_api": dict(self.by_api),
+            "config": asdict(self.config),
+        }
+
+
+def _openai_error(status: int) -> JSONResponse:
+    headers = {"retry-after": "1"} if status == 429 else None
+    return JSONResponse(
+        {"error": {"message": "Injected error from stub server", "type": "server_error", "code": None}},
+        status_code=status,
+        headers=headers,
+    )
+
+
+def _logprobs(tokens: list[str]) -> dict:
+    return {"content": [{"token": t, "logprob": -0.05, "bytes": None, "top_logprobs": []} for t in tokens]}
+
+
+def create_app(config: StubConfig | None = None) -> FastAPI:
+    """Build the stub server app (also usable in-process via httpx.ASGITransport)."""
+    app = FastAPI(title="Stub LLM server")
+    stub = StubLLM(config or StubConfig())
+    app.state.stub = stub
+
+    async def chat_completions(body: dict, api: str):
+        if stub.start(api):
+            return _openai_error(stub.config.error_status)
+        messages = body.get("messages", [])
+        model = body.get("model", "stub-model")
+        tokens = stub.tokens()
+        want_logprobs = bool(body.get("logprobs"))
+        created = int(time.time())
+
+        if not body.get("stream"):
+            await asyncio.sleep(stub.latency() + stub.token_delay() * len(tokens))
+            choice = {
+                "index": 0,
+                "message": {"role": "assistant", "content": "".join(tokens)},
+                "finish_reason": "stop",
+                "logprobs": _logprobs(tokens) if want_logprobs else None,
+            }
+            return {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [choice],
+                "usage": stub.usage(messages, len(tokens)),
+            }
+
+        include_usage = bool((body.get("stream_options") or {}).get("include_usage"))
+        drop = stub.drop_stream()
+
+        def chunk(delta: dict, finish_reason: str | None = None, extra: dict | None = None) -> str:
+            choice = {"index": 0, "delta": delta, "finish_reason": finish_reason, **(extra or {})}
+            payload = {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [choice],
+            }
+            return f"data: {json.dumps(payload)}\n\n"
+
+        async def events() -> AsyncIterator[str]:
+            await asyncio.sleep(stub.latency())
+            for i, token in enumerate(tokens):
+                if drop and i == len(tokens) // 2:
+                    raise ConnectionError("Injected stream drop from stub server")
+                extra = {"logprobs": _logprobs([token])} if want_logprobs else None
+                yield chunk({"role": "assistant", "content": token} if i == 0 else {"content": token}, extra=extra)
+                await asyncio.sleep(stub.token_delay())
+            yield chunk({}, "stop")
+            if include_usage:
+                payload = {
+                    "id": "chatcmpl-stub",
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [],
+                    "usage": stub.usage(messages, len(tokens)),
+                }
+                yield f"data: {json.dumps(payload)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.post("/v1/chat/completions")
+    @app.post("/chat/completions")
+    async def openai_chat(request: Request):
+        return await chat_completions(await request.json(), "openai")
+
+    @app.post("/openai/deployments/{deployment}/chat/completions")
+    async def azure_chat(deployment: str, request: Request):
+        body = await request.json()
+        body.setdefault("model", deployment)
+        return await chat_completions(body, "azure")
+
+    @app.post("/api/generate")
+    async def ollama_generate(request: Request):
+        # Only model preloading is supported: an empty prompt loads the model
+        body = await request.json()
+        stub.start("ollama")
+        return {"model": body.get("model"), "response": "", "done": True, "done_reason": "load"}
+
+    @app.post("/api/chat")
+    async def ollama_chat(request: Request):
+        body = await request.json()
+        if stub.start("ollama"):
+            return JSONResponse({"error": "Injected error from stub server"}, status_code=stub.config.error_status)
+        model = body.get("model", "stub-model")
+        messages = body.get("messages", [])
+        tokens = stub.tokens()
+        usage = stub.usage(messages, len(tokens))
+
+        def line(content: str, done: bool) -> dict:
+            item = {
+                "model": model,
+                "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                "message": {"role": "assistant", "content": content},
+                "done": done,
+            }
+            if done:
+                item.update(
+                    done_reason="stop",
+                    prompt_eval_count=usage["prompt_tokens"],
+                    eval_count=usage["completion_tokens"],
+                )
+            return item
+
+        if body.get("stream") is False:
+            await asyncio.sleep(stub.latency() + stub.token_delay() * len(tokens))
+            return line("".join(tokens), True)
+
+        drop = stub.drop_stream()
+
+        async def lines() -> AsyncIterator[str]:
+            await asyncio.sleep(stub.latency())
+            for i, token in enumerate(tokens):
+                if drop and i == len(tokens) // 2:
+                    raise ConnectionError("Injected stream drop from stub server")
+                yield json.dumps(line(token, False)) + "\n"
+                await asyncio.sleep(stub.token_delay())
+            yield json.dumps(line("", True)) + "\n"
+
+        return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+    @app.get("/api/tags")
+    async def ollama_tags():
+        return {"models": [{"name": "stub-model", "model": "stub-model"}]}
+
+    @app.get("/stub/stats")
+    async def get_stub_stats():
+        return stub.stats()
+
+    @app.post("/stub/config")
+    async def update_stub_config(request: Request):
+        """Change any StubConfig field, e.g. {"error_rate": 0.1}, mid-run."""
+        updates = await request.json()
+        known = {f.name for f in fields(StubConfig)}
+        for name, value in updates.items():
+            if name in known:
+                setattr(stub.config, name, value)
+        if "seed" in updates:
+            stub.random.seed(stub.config.seed)
+        return asdict(stub.config)
+
+    return app
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=9000)
+    for field in fields(StubConfig):
+        if field.name == "seed":
+            parser.add_argument("--seed", type=int, default=None)
+        else:
+            parser.add_argument(
+                f"--{field.name.replace('_', '-')}", type=type(field.default), default=field.default
+            )
+    args = parser.parse_args()
+
+    config = StubConfig(**{f.name: getattr(args, f.name) for f in fields(StubConfig)})
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
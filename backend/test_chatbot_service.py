@@ -0,0 +1,705 @@
+"""Tests for the chatbot service.
+
+Run with: pytest test_chatbot_service.py
+"""
+
+import asyncio
+import json
+import time
+
+import httpx
+import pytest
+
+from chatbot_service import ChatbotService
+from models import ChatMessage
+
+
+def completion_payload(content: str, cached_tokens: int = 0) -> dict:
+    """Minimal chat-completions response body."""
+    return {
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o-mini",
+        "choices": [
+            {
+                "index": 0,
+                "message": {"role": "assistant", "content": content},
+                "finish_reason": "stop",
+            }
+        ],
+        "usage": {
+            "prompt_tokens": 10,
+            "completion_tokens": 5,
+            "total_tokens": 15,
+            "prompt_tokens_details": {"cached_tokens": cached_tokens},
+        },
+    }
+
+
+def mock_llm_client(content: str = "You can use PPTO for emergencies.", delay: float = 0.0):
+    """HTTP client whose transport answers every completion after a delay."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        await asyncio.sleep(delay)
+        return httpx.Response(200, json=completion_payload(content))
+
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler)), calls
+
+
+@pytest.fixture
+async def service():
+    svc = ChatbotService()
+    yield svc
+    await svc.aclose()
+
+
+async def test_llm_calls_do_not_block_the_event_loop(service):
+    """Concurrent chats overlap their upstream calls instead of queueing."""
+    http_client, calls = mock_llm_client(delay=0.2)
+    await service.startup(http_client)
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(
+        *(service.get_response(f"Question {i}", []) for i in range(10))
+    )
+    elapsed = time.perf_counter() - start
+
+    assert len(calls) == 10
+    assert all(r.response == "You can use PPTO for emergencies." for r in responses)
+    assert elapsed < 1.0  # ten sequential calls would take 2 seconds
+
+
+async def test_chat_during_warm_up_does_not_block_the_event_loop(service, faq_docx, monkeypatch):
+    """A chat that arrives while the knowledge base is loading waits off the event loop."""
+    import threading
+
+    import knowledge_base
+
+    monkeypatch.setattr(knowledge_base, "_current_kb", None)
+    knowledge_base._kb_lock.acquire()  # the warm-up is loading it
+    threading.Timer(0.2, knowledge_base._kb_lock.release).start()
+
+    chat = asyncio.ensure_future(service.get_response("Can I use PTO for an emergency?", []))
+    started = time.perf_counter()
+    await asyncio.sleep(0.05)
+    assert time.perf_counter() - started < 0.15  # the loop kept running
+    response = await chat
+    assert response.sources == ["FAQ Database"]
+
+
+async def test_client_is_shared_across_requests(service):
+    """The same pooled client serves every request until shutdown."""
+    http_client, _ = mock_llm_client()
+    await service.startup(http_client)
+    await service.get_response("How do I check my PTO?", [])
+    await service.get_response("How do I check my PTO?", [])
+    assert service.http_client is http_client
+
+    await service.aclose()
+    assert http_client.is_closed
+
+
+async def test_proxy_settings_skip_local_servers_and_no_proxy_hosts(monkeypatch):
+    """A corporate proxy is used for the gateway, not for Ollama or NO_PROXY hosts."""
+    from providers import OpenAIProvider, build_http_client
+
+    monkeypatch.setenv("HTTP_PROXY", "http://proxy.example:8080")
+    monkeypatch.setenv("HTTPS_PROXY", "http://proxy.example:8080")
+    monkeypatch.setenv("NO_PROXY", "internal.example")
+    client = build_http_client()
+    try:
+        def direct(url: str) -> bool:
+            return client._transport_for_url(httpx.URL(url)) is client._transport
+
+        assert direct("http://localhost:11434/api/chat")
+        assert direct("https://internal.example/openai")
+        assert not direct("https://api.openai.com/v1/chat/completions")
+    finally:
+        await client.aclose()
+
+    # OPENAI_BASE_URL pointed at a local stub_llm_server.py
+    stub = OpenAIProvider(api_key="stub", base_url="http://127.0.0.1:9000/v1")
+    await stub.startup()
+    try:
+        url = httpx.URL(str(stub.client.base_url))
+        assert stub.http_client._transport_for_url(url) is stub.http_client._transport
+    finally:
+        await stub.aclose()
+
+
+async def test_ollama_streams_ndjson_and_preloads_model():
+    """The Ollama service keeps the model warm and reads the stream incrementally."""
+    import chatbot_service_ollama
+
+    requests_seen = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        requests_seen.append((request.url.path, body))
+        if request.url.path == "/api/generate":
+            return httpx.Response(200, json={"done": True})
+        lines = [
+            {"message": {"role": "assistant", "content": "Use "}, "done": False},
+            {"message": {"role": "assistant", "content": "PPTO."}, "done": False},
+            {"message": {"role": "assistant", "content": ""}, "done": True},
+        ]
+        return httpx.Response(200, content="\n".join(json.dumps(l) for l in lines))
+
+    service = chatbot_service_ollama.ChatbotService()
+    await service.startup(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    try:
+        # The model is preloaded by the startup warm-up
+        assert requests_seen == []
+        components = await service.warm_up()
+        assert components["upstream"] == {
+            "ms": components["upstream"]["ms"],
+            "provider": "ollama",
+            "reachable": True,
+        }
+        path, body = requests_seen[0]
+        assert path == "/api/generate"
+        assert body["keep_alive"]
+
+        items = [t async for t in service.provider.stream([{"role": "user", "content": "hi"}])]
+        assert items[:-1] == ["Use ", "PPTO."]
+        assert items[-1].text == "Use PPTO."
+        assert requests_seen[-1][1]["stream"] is True
+
+        response = await service.get_response("Tell me something new", [])
+        assert response.response == "Use PPTO."
+    finally:
+        await service.aclose()
+
+
+async def test_stream_response_yields_tokens_then_metadata(service):
+    """Streaming reads the provider's SSE chunks and ends with a ChatResponse."""
+    from models import ChatResponse
+
+    def chunk(content):
+        return {
+            "id": "chatcmpl-test",
+            "object": "chat.completion.chunk",
+            "created": 0,
+            "model": "gpt-4o-mini",
+            "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+        }
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        assert json.loads(request.content)["stream"] is True
+        body = "".join(f"data: {json.dumps(chunk(c))}\n\n" for c in ["Use ", "PPTO."])
+        return httpx.Response(
+            200,
+            content=body + "data: [DONE]\n\n",
+            headers={"content-type": "text/event-stream"},
+        )
+
+    await service.startup(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    items = [item async for item in service.stream_response("Emergency time off?", [])]
+
+    assert items[:2] == ["Use ", "PPTO."]
+    assert isinstance(items[-1], ChatResponse)
+    assert items[-1].response == "Use PPTO."
+
+
+async def test_repeated_question_is_served_from_cache(service, faq_docx):
+    """The second identical question skips the LLM round trip."""
+    import knowledge_base
+    from conftest import SAMPLE_FAQ, write_faq_docx
+
+    http_client, calls = mock_llm_client()
+    await service.startup(http_client)
+
+    first = await service.get_response("Can I swap shifts with a coworker?", [])
+    second = await service.get_response("  can I swap shifts with a coworker ", [])
+    assert len(calls) == 1
+    assert second.response == first.response
+    assert service.stats()["answer_cache"]["hits"] == 1
+
+    # Reloading a changed FAQ document changes the key, so the LLM is asked again
+    write_faq_docx(faq_docx, SAMPLE_FAQ[:2])
+    knowledge_base.reload_knowledge_base()
+    await service.get_response("Can I swap shifts with a coworker?", [])
+    assert len(calls) == 2
+
+
+def test_answer_cache_lru_and_ttl(monkeypatch):
+    """Entries are evicted by capacity and expire after the TTL."""
+    import answer_cache
+    from models import ChatResponse
+
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "monotonic", lambda: now[0])
+    cache = answer_cache.AnswerCache(max_entries=2, ttl_seconds=60)
+    response = ChatResponse(response="ok", confidence=0.8, show_fallback=False)
+
+    cache.set("a", response)
+    cache.set("b", response)
+    assert cache.get("a") is response  # "b" is now least recently used
+    cache.set("c", response)
+    assert cache.get("b") is None
+    assert cache.stats()["evictions"] == 1
+
+    now[0] += 61
+    assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+async def test_concurrent_identical_questions_share_one_call(service):
+    """A burst of the same question fires a single upstream completion."""
+    http_client, calls = mock_llm_client(delay=0.1)
+    await service.startup(http_client)
+
+    responses = await asyncio.gather(
+        *(service.get_response("How many points for leaving early?", []) for _ in range(20)),
+        service.get_response("Where is the break room?", []),
+    )
+
+    assert len(calls) == 2
+    assert len({r.response for r in responses}) == 1
+    stats = service.stats()["coalescing"]
+    assert stats["collapsed"] == 19
+    assert stats["in_flight"] == 0
+
+
+async def test_concurrency_limiter_queues_then_sheds():
+    """Calls past the limit wait in a bounded queue; overflow and timeouts fail fast."""
+    from concurrency import ConcurrencyLimiter, Overloaded
+
+    limiter = ConcurrencyLimiter(limit=2, max_queue=1, queue_timeout=0.05)
+    assert await limiter.acquire() == 0.0
+    assert await limiter.acquire() == 0.0
+
+    queued = asyncio.create_task(limiter.acquire())
+    await asyncio.sleep(0)
+    assert limiter.queued == 1
+    with pytest.raises(Overloaded):
+        await limiter.acquire()  # queue full
+
+    limiter.release()
+    assert await queued >= 0.0  # the freed slot went to the waiter
+    assert limiter.active == 2 and limiter.queued == 0
+
+    with pytest.raises(Overloaded):
+        await limiter.acquire()  # waits, then times out
+    assert limiter.queued == 0
+
+    stats = limiter.stats()
+    assert (stats["admitted"], stats["rejected"], stats["timed_out"]) == (3, 1, 1)
+
+    # Adaptive mode backs off when latency climbs and recovers at the limit
+    adaptive = ConcurrencyLimiter(limit=8, max_queue=10, queue_timeout=1, adaptive=True, min_limit=2)
+    for latency in [0.1] * 5 + [1.0] * 30:
+        await adaptive.acquire()
+        adaptive.release(latency)
+    assert adaptive.limit == 2
+    for _ in range(200):
+        for _ in range(adaptive.limit):
+            await adaptive.acquire()
+        for _ in range(adaptive.limit):
+            adaptive.release(0.1)
+    assert adaptive.limit > 2
+
+
+async def test_saturated_provider_sheds_to_the_faq(service, faq_docx):
+    """With the upstream queue full, a chat is answered from the FAQ at once."""
+    from concurrency import ConcurrencyLimiter
+
+    service.limiter = ConcurrencyLimiter(limit=1, max_queue=0, queue_timeout=1)
+    client, calls = mock_llm_client(delay=0.2)
+    await service.startup(client)
+
+    slow = asyncio.create_task(
+        service.get_response("My kid got sick, can I take emergency time off today?", [])
+    )
+    await asyncio.sleep(0.05)
+    started = time.perf_counter()
+    shed = await service.get_response("Where can I look up my PTO balance?", [])
+
+    assert time.perf_counter() - started < 0.1
+    assert shed.sources == ["FAQ Database"]
+    assert "Me@Walmart" in shed.response
+    assert (await slow).sources != ["FAQ Database"]
+    assert len(calls) == 1
+    assert service.stats()["upstream_limiter"]["rejected"] == 1
+
+
+async def test_failing_provider_trips_breaker_then_recovers(service, faq_docx):
+    """Retries are bounded; an open breaker answers from the FAQ until a probe succeeds."""
+    from resilience import CircuitBreaker, RetryPolicy
+
+    healthy = False
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        if healthy:
+            return httpx.Response(200, json=completion_payload("You can use PPTO."))
+        return httpx.Response(503, json={"error": {"message": "gateway down"}})
+
+    service.retry = RetryPolicy(max_retries=2, base_delay=0.01)
+    service.breaker = CircuitBreaker(
+        lambda: service.provider.probe(), failure_threshold=3, probe_interval=0.05
+    )
+    await service.startup(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+    failed = await service.get_response("My kid got sick, can I take emergency time off today?", [])
+    assert failed.sources == [] and failed.show_fallback
+    assert len(calls) == 3  # first try plus two retries, then the breaker opened
+    assert service.stats()["circuit_breaker"]["state"] == "open"
+
+    started = time.perf_counter()
+    degraded = await service.get_response("Where can I look up my PTO balance?", [])
+    assert time.perf_counter() - started < 0.05
+    assert degraded.sources == ["FAQ Database"]
+    # A related question the FAQ doesn't cover isn't given another entry's answer
+    unrelated = await service.get_response("Can I use PTO for a doctor visit?", [])
+    assert unrelated.sources == [] and unrelated.show_fallback
+    assert "PTO requires" not in unrelated.response
+    assert len(calls) == 3
+
+    healthy = True
+    await asyncio.sleep(0.2)  # the background probe closes the breaker
+    assert service.stats()["circuit_breaker"]["state"] == "closed"
+    recovered = await service.get_response("Is lunch paid when my shift runs long?", [])
+    assert recovered.response == "You can use PPTO."
+    assert calls[-1]["max_tokens"] != 1  # a real answer, after the 1-token probe
+
+
+async def test_breaker_counts_upstream_failures_only(service, faq_docx, monkeypatch):
+    """Rejected requests don't trip the breaker; a stream cut mid-answer does."""
+    from resilience import CircuitBreaker
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(400, json={"error": {"message": "bad request"}})
+
+    service.breaker = CircuitBreaker(
+        lambda: service.provider.probe(), failure_threshold=2, slow_call_seconds=0.05, probe_interval=10
+    )
+    await service.startup(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    for _ in range(3):
+        await service.get_response("My kid got sick, can I take emergency time off today?", [])
+    assert service.breaker.stats()["consecutive_failures"] == 0
+
+    async def slow_answer(messages):
+        yield "You can"
+        await asyncio.sleep(0.1)  # longer than slow_call_seconds, after the first token
+        yield " use PPTO."
+
+    monkeypatch.setattr(service.provider, "stream", slow_answer)
+    [item async for item in service.stream_response("Is lunch paid when my shift runs long?", [])]
+    assert service.breaker.stats()["consecutive_failures"] == 0
+
+    async def cut_short(messages):
+        yield "You can"
+        raise httpx.ReadError("connection reset")
+
+    monkeypatch.setattr(service.provider, "stream", cut_short)
+    [item async for item in service.stream_response("Where can I look up my PTO balance?", [])]
+    assert service.breaker.stats()["consecutive_failures"] == 1
+
+
+def test_retry_policy_only_retries_transient_errors_within_budget():
+    from resilience import RetryPolicy
+
+    request = httpx.Request("POST", "http://llm")
+    unavailable = httpx.HTTPStatusError("", request=request, response=httpx.Response(503))
+    bad_request = httpx.HTTPStatusError("", request=request, response=httpx.Response(400))
+
+    policy = RetryPolicy(max_retries=2, base_delay=0.1, max_delay=0.15, budget_ratio=0.5, budget_max=2)
+    assert policy.next_delay(0, bad_request) is None
+    assert 0 <= policy.next_delay(0, httpx.ConnectTimeout("")) <= 0.1
+    assert 0 <= policy.next_delay(1, unavailable) <= 0.15
+    assert policy.next_delay(2, unavailable) is None  # out of attempts
+    assert policy.next_delay(0, unavailable) is None  # out of budget
+    policy.start()
+    policy.start()  # two more requests earn one retry back
+    assert policy.next_delay(0, unavailable) is not None
+    assert policy.stats()["retries"] == 3
+
+
+async def test_faq_fast_path_skips_the_llm(service, faq_docx):
+    """A near-verbatim FAQ question is answered from the docx entry."""
+    from conftest import SAMPLE_FAQ
+
+    http_client, calls = mock_llm_client()
+    await service.startup(http_client)
+
+    response = await service.get_response("can i use PTO for an emergency", [])
+    assert calls == []
+    assert response.response == SAMPLE_FAQ[2][1]
+    assert response.sources == ["FAQ Database"]
+    assert response.confidence >= 0.8
+    assert response.show_fallback is False
+
+    # Loosely related questions still go to the model
+    await service.get_response("What should I do about an emergency at home?", [])
+    assert len(calls) == 1
+
+    stats = service.stats()["fast_path"]
+    assert stats["requests"] == 2
+    assert stats["served"] == 1
+    assert stats["share"] == 0.5
+
+
+async def test_prompt_prefix_is_stable_and_cached_tokens_are_counted(service, faq_docx):
+    """Every request starts with the same system message; volatile parts go last."""
+    calls = []
+
+    async def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(json.loads(request.content))
+        # Pretend the provider served the prefix from cache from the second call on
+        return httpx.Response(200, json=completion_payload("Sure.", cached_tokens=8 if calls[1:] else 0))
+
+    await service.startup(httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    history = [
+        ChatMessage(role="user", content="Hi there"),
+        ChatMessage(role="assistant", content="Hello! How can I help?"),
+        ChatMessage(role="user", content="I have a scheduling question"),
+    ]
+    await service.get_response("My kid got sick, can I take emergency time off today?", history)
+    await service.get_response("Is lunch paid when my shift runs long?", history)
+
+    first, second = calls[0]["messages"], calls[1]["messages"]
+    assert first[0] == second[0] and first[0]["role"] == "system"
+    assert first[1:4] == second[1:4]  # prior turns follow the prefix unchanged
+    assert first[-2]["role"] == "system" and "PPTO" in first[-2]["content"]
+    assert first[-1] == {
+        "role": "user",
+        "content": "My kid got sick, can I take emergency time off today?",
+    }
+
+    assert service.stats()["prompt_cache"] == {
+        "responses": 2,
+        "responses_with_hits": 1,
+        "prompt_tokens": 20,
+        "cached_tokens": 8,
+        "hit_ratio": 0.4,
+    }
+
+
+async def test_llm_answer_stages_are_traced(service, faq_docx):
+    """Each stage of an LLM-answered chat is timed in the request's trace."""
+    from tracing import Trace, _current
+
+    client, _ = mock_llm_client(delay=0.02)
+    await service.startup(client)
+    trace = Trace()
+    token = _current.set(trace)
+    try:
+        await service.get_response("My kid got sick, can I take emergency time off today?", [])
+    finally:
+        _current.reset(token)
+
+    assert {"kb", "fast_path", "prompt", "llm", "confidence"} <= set(trace.stages)
+    assert trace.stages["llm"] >= 0.02
+    assert sum(trace.stages.values()) <= trace.elapsed()
+
+
+def test_confidence_scorer_rules_and_signals():
+    """One scan finds any rule phrase; other signals only move unhedged answers."""
+    from confidence import ConfidenceScorer, Rule
+
+    scorer = ConfidenceScorer(retrieval_weight=0.2, logprob_weight=0.3)
+    detailed = "You can use PPTO for emergencies. " * 8
+
+    # Curly apostrophes and line breaks inside a phrase still match
+    assert scorer.score("I\u2019m not\nsure about that policy at your store.") == 0.5
+    assert scorer.score(detailed + "Please contact HR.", retrieval_score=1.0) == 0.5
+    assert scorer.text_score(detailed) == 0.85
+    assert scorer.text_score("Yes.") == 0.6
+
+    # Strong FAQ support and confident tokens raise the score, weak ones lower it
+    assert scorer.score(detailed, retrieval_score=1.0, token_logprobs=[0.0, -0.01]) > 0.9
+    assert scorer.score(detailed, retrieval_score=0.1) < scorer.score(detailed)
+
+    # Without other signals the old text-only scores stand, and a weak FAQ
+    # match alone doesn't push a detailed answer under the fallback threshold
+    medium = "You can use PPTO for emergencies if you have enough balance."
+    for text, old_score in [(detailed, 0.85), (medium, 0.8), ("Yes.", 0.6), ("I don't know.", 0.5)]:
+        assert scorer.score(text) == old_score
+    assert scorer.score(detailed, retrieval_score=0.3) >= 0.7
+    assert scorer.score(medium, retrieval_score=0.5) >= 0.7
+
+    # Rule sets are pluggable
+    strict = scorer.with_rules(Rule("varies", ("varies by store",), 0.4))
+    assert strict.score(detailed + "It varies by store.") == 0.4
+    assert scorer.score(detailed + "It varies by store.") == 0.85
+
+
+@pytest.mark.parametrize("provider_name", ["azure", "openai", "ollama"])
+async def test_every_provider_works_against_the_stub_server(provider_name):
+    """The stub speaks each provider's API, including streaming and injected errors."""
+    from models import ChatResponse
+    from providers import create_provider
+    from stub_llm_server import StubConfig, create_app
+
+    stub_app = create_app(StubConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, seed=1))
+    http_client = httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=stub_app), base_url="http://stub"
+    )
+    service = ChatbotService(create_provider(provider_name))
+    service.provider.base_url = "http://stub"  # Ollama and OpenAI
+    service.provider.endpoint = "http://stub"  # Azure
+    service.provider.api_key = "stub"
+    await service.startup(http_client)
+    try:
+        response = await service.get_response("Tell me about PPTO for emergencies", [])
+        assert response.response.startswith("You can use PPTO")
+        assert response.sources == [service.provider.source]
+
+        items = [item async for item in service.stream_response("And for a sick kid?", [])]
+        assert "".join(items[:-1]) == items[-1].response
+        assert isinstance(items[-1], ChatResponse)
+
+        stub_app.state.stub.config.error_rate = 1.0
+        failed = await service.get_response("What about a flat tire on the way in?", [])
+        assert failed.show_fallback and failed.confidence == 0.0
+        assert stub_app.state.stub.stats()["by_api"][provider_name] >= 3
+    finally:
+        await service.aclose()
+
+
+async def test_router_hedges_slow_provider_and_prefers_the_faster_one(faq_docx, monkeypatch):
+    """A slow primary is raced against the backup; the winner is routed to next."""
+    from config import settings
+    from providers import OllamaProvider, OpenAIProvider, create_provider
+    from router import RoutedProvider
+    from stub_llm_server import StubConfig, create_app
+
+    monkeypatch.setattr(settings, "llm_providers", "azure, ollama")
+    assert [r.provider.name for r in create_provider().routes] == ["azure", "ollama"]
+
+    def stub_client(latency_ms: float) -> httpx.AsyncClient:
+        app = create_app(StubConfig(latency_ms=latency_ms, jitter_ms=0, tokens_per_second=0, seed=1))
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stub")
+
+    slow = OpenAIProvider(api_key="stub", base_url="http://stub/v1")
+    fast = OllamaProvider(base_url="http://stub")
+    await slow.startup(stub_client(latency_ms=300))
+    await fast.startup(stub_client(latency_ms=5))
+    router = RoutedProvider([slow, fast], hedge=True, hedge_min_delay=0.05, explore_ratio=0)
+    service = ChatbotService(router)
+    try:
+        started = time.perf_counter()
+        first = await service.get_response("My kid got sick, can I take emergency time off today?", [])
+        assert time.perf_counter() - started < 0.25  # didn't wait for the slow provider
+        assert first.sources == [fast.source]
+
+        second = await service.get_response("Is lunch paid when my shift runs long?", [])
+        assert second.sources == [fast.source]
+
+        routing = service.stats()["routing"]
+        assert routing["hedged_requests"] == 1 and routing["hedge_wins"] == 1
+        assert routing["providers"]["ollama"]["requests"] == 2
+        assert routing["providers"]["openai"]["errors"] == 0
+    finally:
+        await service.aclose()
+
+
+async def test_router_fails_over_when_the_primary_is_down(faq_docx):
+    """A failing primary doesn't open the service breaker; the backup answers."""
+    from providers import OpenAIProvider
+    from router import RoutedProvider
+
+    primary_calls = []
+
+    async def down(request: httpx.Request) -> httpx.Response:
+        primary_calls.append(request.url.path)
+        return httpx.Response(503, json={"error": {"message": "gateway down"}})
+
+    async def up(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, json=completion_payload("You can use PPTO."))
+
+    primary = OpenAIProvider(api_key="a", base_url="http://a/v1")
+    backup = OpenAIProvider(api_key="b", base_url="http://b/v1")
+    primary.name, backup.name = "a", "b"
+    await primary.startup(httpx.AsyncClient(transport=httpx.MockTransport(down)))
+    await backup.startup(httpx.AsyncClient(transport=httpx.MockTransport(up)))
+    service = ChatbotService(RoutedProvider([primary, backup], explore_ratio=0))
+    try:
+        questions = [
+            "My kid got sick, can I take emergency time off today?",
+            "Is lunch paid when my shift runs long?",
+            "Can I swap shifts with a coworker?",
+            "Who approves my vacation request?",
+            "Do holidays count toward overtime?",
+            "What happens if my car breaks down on the way in?",
+            "Can I wear headphones at work?",
+        ]
+        for question in questions:
+            response = await service.get_response(question, [])
+            assert response.response == "You can use PPTO."
+
+        stats = service.stats()
+        assert stats["circuit_breaker"]["state"] == "closed"
+        routes = stats["routing"]["providers"]
+        assert routes["b"]["requests"] == len(questions)
+        assert routes["a"]["errors"] == len(primary_calls) >= 1
+        # Measured and healthy, the backup now ranks first
+        assert len(primary_calls) < len(questions)
+        # Calls are counted once, under the provider that made them
+        import metrics
+
+        assert 'provider="router"' not in metrics.REGISTRY.render()
+    finally:
+        await service.aclose()
+
+
+async def test_router_failover_is_not_retried_by_the_service(faq_docx):
+    """With every route down, a chat costs one call per route, not one per retry round."""
+    from providers import OpenAIProvider
+    from resilience import RetryPolicy
+    from router import RoutedProvider
+
+    calls = []
+
+    async def down(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.host)
+        return httpx.Response(503, json={"error": {"message": "gateway down"}})
+
+    primary = OpenAIProvider(api_key="a", base_url="http://a/v1")
+    backup = OpenAIProvider(api_key="b", base_url="http://b/v1")
+    for provider in (primary, backup):
+        await provider.startup(httpx.AsyncClient(transport=httpx.MockTransport(down)))
+    service = ChatbotService(RoutedProvider([primary, backup], explore_ratio=0))
+    service.retry = RetryPolicy(max_retries=2, base_delay=0.01)
+    try:
+        failed = await service.get_response("Is lunch paid when my shift runs long?", [])
+        assert failed.show_fallback and failed.sources == []
+        assert sorted(calls) == ["a", "b"]
+        assert service.retry.stats()["retries"] == 0
+    finally:
+        await service.aclose()
+
+
+async def test_router_times_streams_and_cancels_abandoned_calls():
+    """Streams feed the latency ranking; a cancelled request stops its upstream call."""
+    from providers import OllamaProvider, OpenAIProvider
+    from router import RoutedProvider
+    from stub_llm_server import StubConfig, create_app
+
+    def stub_client(latency_ms: float) -> httpx.AsyncClient:
+        app = create_app(StubConfig(latency_ms=latency_ms, jitter_ms=0, tokens_per_second=0, seed=1))
+        return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://stub")
+
+    slow = OpenAIProvider(api_key="stub", base_url="http://stub/v1")
+    fast = OllamaProvider(base_url="http://stub")
+    await slow.startup(stub_client(latency_ms=200))
+    await fast.startup(stub_client(latency_ms=5))
+    router = RoutedProvider([slow, fast], hedge=True, hedge_min_delay=0.5, explore_ratio=0)
+    try:
+        items = [item async for item in router.stream([{"role": "user", "content": "PPTO?"}])]
+        assert items[-1].served_by is slow
+        route = router.routes[0]
+        assert route.requests == 1 and 0.15 < route.latency_ewma < 0.5
+
+        call = asyncio.ensure_future(router.complete([{"role": "user", "content": "PPTO?"}]))
+        await asyncio.sleep(0.05)  # waiting on the primary, before the hedge
+        call.cancel()
+        await asyncio.sleep(0.3)  # long enough for an orphaned call to finish
+        assert route.requests == 1  # cancelled, not completed in the background
+    finally:
+        await router.aclose()
@@ -4,10 +4,10 @@ import sys
 import io
 from knowledge_base import load_hr_knowledge_base, get_faq_document_path
 
-# Fix encoding for Windows
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
-
 if __name__ == "__main__":
+    # Fix encoding for Windows
+    sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+
     print("Testing FAQ loading...\n")
     
     # Check FAQ path
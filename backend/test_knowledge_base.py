@@ -0,0 +1,308 @@
+"""Tests for the compiled FAQ knowledge base.
+
+Run with: pytest test_knowledge_base.py
+"""
+
+import os
+
+import pytest
+
+import knowledge_base
+from conftest import SAMPLE_FAQ, write_faq_docx
+
+
+def test_system_prompt_is_cached(faq_docx, monkeypatch):
+    """The docx is parsed once, not on every prompt request."""
+    kb = knowledge_base.get_knowledge_base()
+    assert "Can I use PTO for an emergency?" in kb.system_prompt
+
+    def fail(*args, **kwargs):
+        raise AssertionError("FAQ document re-parsed on the request path")
+
+    monkeypatch.setattr(knowledge_base, "load_faq_from_docx", fail)
+    assert knowledge_base.get_system_prompt() == kb.system_prompt
+    assert knowledge_base.refresh_knowledge_base() is False
+
+
+def test_refresh_detects_content_change(faq_docx):
+    """Editing the document swaps in a new, higher-versioned snapshot."""
+    before = knowledge_base.get_knowledge_base()
+
+    write_faq_docx(faq_docx, SAMPLE_FAQ + [("Where do I badge in?", "At the front gate.")])
+    os.utime(faq_docx, (before.mtime + 10, before.mtime + 10))
+
+    assert knowledge_base.refresh_knowledge_base() is True
+    after = knowledge_base.get_knowledge_base()
+    assert after.version == before.version + 1
+    assert after.content_hash != before.content_hash
+    assert "Where do I badge in?" in after.system_prompt
+    # The old snapshot is untouched for requests still holding it
+    assert "Where do I badge in?" not in before.system_prompt
+
+
+def test_refresh_ignores_touch_without_edit(faq_docx):
+    """A new mtime with identical bytes keeps the existing snapshot."""
+    before = knowledge_base.get_knowledge_base()
+    os.utime(faq_docx, (before.mtime + 10, before.mtime + 10))
+
+    assert knowledge_base.refresh_knowledge_base() is False
+    after = knowledge_base.get_knowledge_base()
+    assert after.version == before.version
+    assert after.mtime == before.mtime + 10
+
+
+def test_refresh_keeps_last_good_snapshot(faq_docx):
+    """A corrupt or deleted document doesn't empty the knowledge base."""
+    before = knowledge_base.get_knowledge_base()
+
+    faq_docx.write_bytes(b"not a docx")
+    assert knowledge_base.refresh_knowledge_base() is False
+    assert knowledge_base.refresh_knowledge_base(force=True) is False
+    kept = knowledge_base.get_knowledge_base()
+    assert (kept.version, kept.system_prompt) == (before.version, before.system_prompt)
+
+    faq_docx.unlink()
+    assert knowledge_base.refresh_knowledge_base() is False
+    assert knowledge_base.get_knowledge_base().system_prompt == before.system_prompt
+
+    # Fixing the document is picked up as usual
+    write_faq_docx(faq_docx, SAMPLE_FAQ + [("Where do I badge in?", "At the front gate.")])
+    assert knowledge_base.refresh_knowledge_base() is True
+    assert knowledge_base.get_knowledge_base().version == before.version + 1
+
+
+def test_entries_are_parsed_and_indexed(faq_docx):
+    """Each Question/Answer pair becomes a searchable record."""
+    kb = knowledge_base.get_knowledge_base()
+    assert len(kb.entries) == len(SAMPLE_FAQ)
+    assert len(kb.index) == len(SAMPLE_FAQ)
+    assert kb.entries[1].question == SAMPLE_FAQ[1][0]
+    assert kb.entries[1].answer == SAMPLE_FAQ[1][1]
+
+    hits = knowledge_base.search_faq("leaving early before the 5th hour", k=2)
+    assert hits[0].entry.id == 0
+
+
+def test_retrieval_prompt_includes_only_relevant_entries(faq_docx):
+    """Retrieval mode sends the best matches instead of the whole FAQ."""
+    from prompting import build_prompt
+
+    plan = build_prompt("Can I use PTO for an emergency?", mode="retrieval", top_k=1)
+    assert plan.mode == "retrieval"
+    assert "Can I use PTO for an emergency?" in plan.context
+    assert "6th hour" not in plan.context
+    assert plan.tokens_saved > 0
+
+    # The prefix doesn't depend on the question, so providers can cache it
+    other = build_prompt("Do I get paid for lunch on a 6th hour?", mode="retrieval", top_k=1)
+    assert other.system_prompt == plan.system_prompt == knowledge_base.BASE_HR_PROMPT
+    assert other.prefix_id == plan.prefix_id
+    assert other.context != plan.context
+
+    # A tiny budget drops entries that don't fit and falls back to the full dump
+    plan = build_prompt("Can I use PTO for an emergency?", mode="retrieval", token_budget=1)
+    assert plan.mode == "full-fallback"
+    assert plan.tokens_saved == 0
+
+
+def test_full_prompt_mode(faq_docx):
+    """Full mode keeps sending the complete FAQ document."""
+    from prompting import build_prompt
+
+    plan = build_prompt("Can I use PTO for an emergency?", mode="full")
+    assert plan.mode == "full"
+    assert plan.system_prompt == knowledge_base.get_system_prompt()
+    assert len(plan.faq_entry_ids) == len(knowledge_base.get_knowledge_base().entries)
+
+
+def test_vector_search_finds_paraphrases(faq_docx):
+    """Character n-gram vectors match wording the keyword index misses."""
+    hits = knowledge_base.search_faq("do I need to call out if I'm using ppto", k=1)
+    assert hits[0].entry.question == "Do I still have to call off when I put PPTO?"
+    assert 0 < hits[0].similarity < 1
+
+    # A near-verbatim question clears the fast-path threshold
+    hit = knowledge_base.match_faq("how do i check my balance")
+    assert hit is not None
+    assert hit.entry.question == "How do I check my PTO balance?"
+
+
+def test_fast_path_rejects_questions_that_differ_in_one_key_term(faq_docx):
+    """Similar spelling isn't enough to answer verbatim: "8th" isn't "6th"."""
+    for query in [
+        "Do I have to take a lunch if I leave at my 8th hour?",
+        "Can I use PPTO for an emergency?",
+        "Do I still have to call off when I put PTO?",
+    ]:
+        hits = knowledge_base.search_faq(query, k=1)
+        assert hits[0].similarity > 0.8  # the n-grams alone would have matched
+        assert knowledge_base.match_faq(query, hits=hits) is None
+
+    hit = knowledge_base.match_faq("can i use pto for an emergency")
+    assert hit is not None
+    assert knowledge_base.fast_path_score("can i use pto for an emergency", hit) == hit.match
+
+
+def test_compiled_faq_is_reused(faq_docx, monkeypatch):
+    """Unchanged content loads the compiled FAQ instead of parsing the document."""
+    from vector_index import VectorIndex
+
+    kb = knowledge_base.get_knowledge_base()
+    assert kb.loaded_from == "document"
+    compiled_dir = knowledge_base._compiled_dir(kb.content_hash)
+    assert [path.name for path in compiled_dir.parent.iterdir()] == [compiled_dir.name]
+
+    def fail(*args, **kwargs):
+        raise AssertionError("FAQ recompiled")
+
+    monkeypatch.setattr(VectorIndex, "build", fail)
+    monkeypatch.setattr(knowledge_base, "parse_faq_entries", fail)
+    knowledge_base.reload_knowledge_base()
+    reloaded = knowledge_base.get_knowledge_base()
+    assert reloaded.loaded_from == "compiled"
+    assert [e.question for e in reloaded.entries] == [e.question for e in kb.entries]
+    # The matrix is memory-mapped, not copied
+    assert reloaded.vectors.matrix.flags["C_CONTIGUOUS"]
+    assert not reloaded.vectors.matrix.flags["WRITEABLE"]
+    assert (reloaded.vectors.matrix == kb.vectors.matrix).all()
+
+    # A cold start with the document missing serves the compiled FAQ
+    faq_docx.unlink()
+    monkeypatch.setattr(knowledge_base, "_current_kb", None)
+    cold = knowledge_base.get_knowledge_base()
+    assert cold.loaded_from == "compiled"
+    assert cold.content_hash == kb.content_hash
+    assert cold.system_prompt == kb.system_prompt
+    # ...and a forced reload with no document to read keeps serving it
+    knowledge_base.reload_knowledge_base()
+    kept = knowledge_base.get_knowledge_base()
+    assert (kept.version, kept.content_hash, len(kept.entries)) == (cold.version, cold.content_hash, len(kb.entries))
+
+
+def test_compiling_another_document_keeps_the_servers_compiled_faq(faq_docx, tmp_path):
+    """Only older versions of the same document are pruned."""
+    kb = knowledge_base.get_knowledge_base()
+    other = knowledge_base.build_knowledge_base(
+        write_faq_docx(tmp_path / "other.docx", [("Where do I badge in?", "At the front gate.")])
+    )
+    cache_dir = knowledge_base._cache_dir()
+    compiled = {knowledge_base._compiled_dir(kb.content_hash), knowledge_base._compiled_dir(other.content_hash)}
+    assert set(cache_dir.iterdir()) == compiled
+
+    write_faq_docx(faq_docx, SAMPLE_FAQ + [("Where do I park?", "In the north lot.")])
+    os.utime(faq_docx, (kb.mtime + 10, kb.mtime + 10))
+    assert knowledge_base.refresh_knowledge_base() is True
+    edited = knowledge_base.get_knowledge_base()
+    assert set(cache_dir.iterdir()) == {
+        knowledge_base._compiled_dir(edited.content_hash),
+        knowledge_base._compiled_dir(other.content_hash),
+    }
+
+
+def test_cold_start_from_compiled_faq_skips_python_docx(faq_docx):
+    """Importing the knowledge base with a compiled FAQ doesn't load python-docx."""
+    import subprocess
+    import sys
+
+    from config import settings
+
+    code = (
+        "import sys, knowledge_base; "
+        "kb = knowledge_base.get_knowledge_base(); "
+        "print(kb.loaded_from, len(kb.entries), 'docx' in sys.modules)"
+    )
+    env = {
+        **os.environ,
+        "FAQ_DOCUMENT_PATH": str(faq_docx),
+        "INDEX_CACHE_DIR": settings.index_cache_dir,
+    }
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=os.path.dirname(knowledge_base.__file__),
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.split() == ["compiled", str(len(SAMPLE_FAQ)), "False"]
+
+
+def test_history_is_packed_into_token_budget(monkeypatch):
+    """Recent turns are kept verbatim; older ones collapse into a summary."""
+    from config import settings
+    from models import ChatMessage
+    from prompting import history_token_budget, pack_history, summarize_turns
+
+    history = [
+        ChatMessage(
+            role="user" if i % 2 == 0 else "assistant",
+            content=f"Message number {i}. " + "More detail here. " * 20,
+        )
+        for i in range(12)
+    ]
+
+    # A short chat fits as it is
+    packed = pack_history(history[:2], token_budget=1000)
+    assert packed.messages == tuple(history[:2]) and packed.summary is None
+
+    packed = pack_history(history, token_budget=500, summary_tokens=100)
+    assert packed.tokens <= 500
+    assert packed.messages == tuple(history[-len(packed.messages):])
+    assert packed.summarized == len(history) - len(packed.messages) > 0
+    # The summary keeps the first sentence of the turns just before the window
+    assert f"Message number {packed.summarized - 1}." in packed.summary
+    assert "More detail" not in packed.summary
+
+    # Packing the same conversation again reuses the cached summary
+    hits = summarize_turns.cache_info().hits
+    pack_history(history, token_budget=500, summary_tokens=100)
+    assert summarize_turns.cache_info().hits == hits + 1
+
+    # The budget shrinks as the system prompt grows, within the context window
+    monkeypatch.setattr(settings, "context_window_tokens", 4000)
+    monkeypatch.setattr(settings, "max_tokens", 500)
+    monkeypatch.setattr(settings, "history_token_budget", 2000)
+    assert history_token_budget(1000, "hi") == 2000
+    assert history_token_budget(3000, "hi") < 500
+    assert history_token_budget(5000, "hi") == 0
+
+
+def test_search_faq_many_matches_search_faq(faq_docx):
+    """The batched search ranks each question exactly like search_faq does."""
+    questions = [
+        "do I need to call out if I'm using ppto",
+        "Where can I look up my PTO balance?",
+        "What's the weather today?",
+    ]
+    batched = knowledge_base.search_faq_many(questions, k=3)
+
+    assert len(batched) == len(questions)
+    for question, hits in zip(questions, batched):
+        single = knowledge_base.search_faq(question, k=3)
+        assert [hit.entry.question for hit in hits] == [hit.entry.question for hit in single]
+        assert [hit.score for hit in hits] == pytest.approx([hit.score for hit in single])
+
+
+def test_retrieval_eval_scores_queries_and_flags_regressions(faq_docx):
+    """The offline eval covers every entry and fails against a better baseline."""
+    from eval_retrieval import QUERY_KINDS, compare, run_eval
+
+    report = run_eval(faq_docx, repeat=1)
+
+    assert report["entries"] == len(SAMPLE_FAQ)
+    assert set(report["quality"]) == {"overall", *QUERY_KINDS}
+    assert report["quality"]["exact"]["recall@1"] == 1.0
+    assert report["quality"]["overall"]["recall@5"] >= report["quality"]["overall"]["recall@1"]
+    assert 0 < report["quality"]["overall"]["mrr"] <= 1
+    latency = report["latency_ms"]
+    assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+
+    assert compare(report, report) == []
+    better = {
+        "quality": {"paraphrase": {**report["quality"]["paraphrase"], "recall@1": 1.5}},
+        "latency_ms": {"p95": latency["p95"] / 10},
+    }
+    regressions = compare(report, better, latency_floor_ms=0)
+    assert len(regressions) == 2
+    assert regressions[0].startswith("paraphrase recall@1 fell")
+    assert compare(report, better, latency_tolerance=None) == regressions[:1]
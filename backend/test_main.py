@@ -7,6 +7,7 @@ import pytest
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
 
+from conftest import SAMPLE_FAQ
 from main import app
 from models import ChatResponse
 
@@ -83,19 +84,308 @@ def test_chat_endpoint_validation():
     assert response.status_code == 422
 
 
-def test_faq_search():
+def test_faq_search(faq_docx):
     """Test FAQ database search."""
     from knowledge_base import search_faq
 
     # Should find PTO FAQ
-    result = search_faq("How do I check my PTO balance?")
-    assert result is not None
-    assert "PTO" in result or "pto" in result.lower()
+    hits = search_faq("How do I check my PTO balance?")
+    assert hits
+    assert "PTO" in hits[0].entry.answer
+    assert hits[0].match > 0.9
+    assert [hit.score for hit in hits] == sorted((hit.score for hit in hits), reverse=True)
 
     # Should find benefits FAQ
-    result = search_faq("What benefits does Walmart offer?")
-    assert result is not None
+    hits = search_faq("What benefits does Walmart offer?", k=1)
+    assert len(hits) == 1
+    assert "401k" in hits[0].entry.answer
 
-    # Should return None for unknown topic
-    result = search_faq("What's the weather today?")
-    assert result is None
+    # Should return nothing for unknown topic
+    assert search_faq("What's the weather today?") == []
+
+
+def test_chat_stream_endpoint():
+    """Test the SSE endpoint emits tokens then a final metadata event."""
+    import json
+
+    async def fake_stream(message, conversation_history):
+        yield "You can "
+        yield "use PPTO."
+        yield ChatResponse(
+            response="You can use PPTO.",
+            confidence=0.9,
+            show_fallback=False,
+            microsoft_list_url=None,
+            sources=["FAQ Database"],
+        )
+
+    import metrics
+
+    first_tokens = metrics.CHAT_TIME_TO_FIRST_TOKEN._default().count
+    with patch("main.chatbot_service.stream_response", fake_stream):
+        response = client.post(
+            "/api/chat/stream",
+            json={"message": "Can I use PTO for an emergency?", "conversation_history": []},
+        )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [
+        (block.split("\n")[0].removeprefix("event: "), json.loads(block.split("\n")[1][6:]))
+        for block in response.text.strip().split("\n\n")
+    ]
+    assert [name for name, _ in events] == ["token", "token", "done"]
+    assert events[0][1] == {"text": "You can "}
+    done = events[-1][1]
+    assert done["response"] == "You can use PPTO."
+    assert done["sources"] == ["FAQ Database"]
+    assert done["time_to_first_token_ms"] >= 0
+    # ...and recorded for /metrics
+    assert metrics.CHAT_TIME_TO_FIRST_TOKEN._default().count == first_tokens + 1
+    assert "hr_chatbot_chat_time_to_first_token_seconds_count" in client.get("/metrics").text
+
+
+def test_chat_session_keeps_history_server_side():
+    """Follow-up turns send only the session id; the server supplies the history."""
+    seen_histories = []
+
+    async def fake_get_response(message, conversation_history):
+        seen_histories.append([m.content for m in conversation_history])
+        return ChatResponse(
+            response=f"Answer to {message}",
+            confidence=0.9,
+            show_fallback=False,
+            microsoft_list_url=None,
+            sources=["FAQ Database"],
+        )
+
+    with patch("main.chatbot_service.get_response", fake_get_response):
+        first = client.post("/api/chat", json={"message": "First question"}).json()
+        session_id = first["session_id"]
+        assert session_id
+
+        second = client.post(
+            "/api/chat", json={"message": "Second question", "session_id": session_id}
+        ).json()
+        assert second["session_id"] == session_id
+
+        assert client.delete(f"/api/sessions/{session_id}").status_code == 204
+        third = client.post(
+            "/api/chat", json={"message": "Third question", "session_id": session_id}
+        ).json()
+
+    assert seen_histories == [
+        [],
+        ["First question", "Answer to First question"],
+        [],
+    ]
+    # A forgotten session is not resurrected under the client-supplied id
+    assert third["session_id"] != session_id
+
+
+def test_failed_turns_are_not_saved_to_the_session():
+    """An error reply keeps the session but isn't replayed as history."""
+    seen_histories = []
+
+    async def flaky_get_response(message, conversation_history):
+        seen_histories.append([m.content for m in conversation_history])
+        failed = len(seen_histories) == 1
+        return ChatResponse(
+            response="Something went wrong" if failed else f"Answer to {message}",
+            confidence=0.0 if failed else 0.9,
+            show_fallback=failed,
+            microsoft_list_url=None,
+            sources=[] if failed else ["FAQ Database"],
+        )
+
+    with patch("main.chatbot_service.get_response", flaky_get_response):
+        first = client.post("/api/chat", json={"message": "First question"}).json()
+        session_id = first["session_id"]
+        for message in ("First question", "Second question"):
+            response = client.post("/api/chat", json={"message": message, "session_id": session_id}).json()
+            assert response["session_id"] == session_id
+
+    assert seen_histories == [[], [], ["First question", "Answer to First question"]]
+
+
+async def test_load_test_harness_reports_latency_and_throughput(faq_docx):
+    """The load harness drives the app in-process against the stub LLM."""
+    from load_test import LoadTestConfig, run_load_test
+    from stub_llm_server import StubConfig
+
+    config = LoadTestConfig(
+        requests=30,
+        concurrency=5,
+        stub=StubConfig(latency_ms=0, jitter_ms=0, tokens_per_second=0, seed=1),
+    )
+    report = await run_load_test(config)
+
+    assert report["requests"] == 30
+    assert report["error_rate"] == 0.0
+    assert report["status_codes"] == {"200": 30}
+    assert report["throughput_rps"] > 0
+    latency = report["latency_ms"]
+    assert latency["p50"] <= latency["p95"] <= latency["p99"] <= latency["max"]
+    # Verbatim FAQ questions take the fast path, reworded ones reach the stub
+    assert report["sources"]["FAQ Database"] > 0
+    assert report["stub_stats"]["requests"] > 0
+
+
+def test_metrics_endpoint(faq_docx):
+    """/metrics exposes route latency histograms and chat answer counters."""
+    client.post("/api/chat", json={"message": "How do I check my PTO balance?"})
+    client.delete("/api/sessions/some-session-id")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    samples = {}
+    for line in response.text.splitlines():
+        if line and not line.startswith("#"):
+            name, value = line.rsplit(" ", 1)
+            samples[name] = float(value)
+
+    chat_route = 'method="POST",route="/api/chat"'
+    assert samples[f'hr_chatbot_http_requests_total{{{chat_route},status="200"}}'] >= 1
+    count = samples[f"hr_chatbot_http_request_duration_seconds_count{{{chat_route}}}"]
+    assert samples[f'hr_chatbot_http_request_duration_seconds_bucket{{{chat_route},le="+Inf"}}'] == count
+    # Routes are labelled by template, not by the session id in the URL
+    assert 'hr_chatbot_http_requests_total{method="DELETE",route="/api/sessions/{session_id}",status="204"}' in samples
+    assert samples['hr_chatbot_chat_responses_total{path="faq",fallback="false"}'] >= 1
+    assert samples['hr_chatbot_chat_confidence_bucket{path="faq",le="1"}'] >= 1
+    assert "hr_chatbot_answer_cache_hits_total" in samples
+    assert samples["hr_chatbot_http_requests_in_flight"] == 1  # this scrape
+
+
+def test_server_timing_header_and_sampled_trace_log(faq_docx, monkeypatch, caplog):
+    """Stage timings go out as Server-Timing and, when sampled, as a JSON log record."""
+    import json
+    import logging
+
+    from config import settings
+
+    monkeypatch.setattr(settings, "trace_sample_rate", 1.0)
+    with caplog.at_level(logging.INFO, logger="trace"):
+        response = client.post("/api/chat", json={"message": "How do I check my PTO balance?"})
+
+    timings = dict(
+        (part.split(";dur=")[0], float(part.split(";dur=")[1]))
+        for part in response.headers["Server-Timing"].split(", ")
+    )
+    assert {"session", "kb", "fast_path", "total"} <= set(timings)
+    assert timings["total"] >= timings["fast_path"]
+
+    # The frontend's origin may read the timings in the browser; others may not
+    frontend = settings.cors_origins[0]
+    response = client.get("/health", headers={"Origin": frontend})
+    assert response.headers["Timing-Allow-Origin"] == frontend
+    response = client.get("/health", headers={"Origin": "https://elsewhere.example"})
+    assert "Timing-Allow-Origin" not in response.headers
+
+    records = [json.loads(r.getMessage()) for r in caplog.records if r.name == "trace"]
+    assert len(records) == 1
+    assert records[0]["path"] == "/api/chat"
+    assert records[0]["status"] == 200
+    assert {"session", "kb", "fast_path"} <= set(records[0]["stages_ms"])
+
+    monkeypatch.setattr(settings, "trace_sample_rate", 0.0)
+    caplog.clear()
+    with caplog.at_level(logging.INFO, logger="trace"):
+        client.post("/api/chat", json={"message": "How do I check my PTO balance?"})
+    assert not [r for r in caplog.records if r.name == "trace"]
+
+
+def test_chat_batch_streams_ndjson(faq_docx, monkeypatch):
+    """Every question gets one NDJSON line, tagged with its index."""
+    import json
+
+    from config import settings
+
+    questions = [
+        "How do I check my PTO balance?",
+        "Can I use PTO for an emergency?",
+        "What benefits does Walmart offer?",
+    ]
+    response = client.post("/api/chat/batch", json={"questions": questions})
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    results = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(result["index"] for result in results) == [0, 1, 2]
+    for result in results:
+        assert result["question"] == questions[result["index"]]
+        assert result["sources"] == ["FAQ Database"]
+        assert "session_id" not in result
+    by_index = {result["index"]: result for result in results}
+    assert "Me@Walmart" in by_index[0]["response"]
+
+    monkeypatch.setattr(settings, "batch_max_questions", 2)
+    response = client.post("/api/chat/batch", json={"questions": questions})
+    assert response.status_code == 422
+    assert client.post("/api/chat/batch", json={"questions": []}).status_code == 422
+    assert client.post("/api/chat/batch", json={"questions": ["  "]}).status_code == 422
+    # Each question is held to the same length limit as a single chat message
+    from models import MAX_MESSAGE_LENGTH
+
+    too_long = "x" * (MAX_MESSAGE_LENGTH + 1)
+    assert client.post("/api/chat/batch", json={"questions": [too_long]}).status_code == 422
+    assert client.post("/api/chat", json={"message": too_long}).status_code == 422
+
+
+def test_ready_reports_warm_up_timings(faq_docx):
+    """/ready is 503 until the startup warm-up finishes, then lists component timings."""
+    import time
+
+    assert client.get("/ready").status_code == 503  # no lifespan has run
+
+    with patch("main.chatbot_service.provider.warm_up", AsyncMock(return_value=True)) as warm_up:
+        with TestClient(app) as started:
+            assert started.get("/health").status_code == 200
+            deadline = time.monotonic() + 10
+            while (response := started.get("/ready")).status_code != 200:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+    warm_up.assert_awaited_once()
+    report = response.json()
+    assert report["status"] == "ready"
+    assert report["warm_up_ms"] >= 0
+    components = report["components"]
+    assert set(components) == {"knowledge_base", "prompt", "upstream"}
+    assert components["knowledge_base"]["entries"] == len(SAMPLE_FAQ)
+    assert components["upstream"]["reachable"] is True
+    assert all(component["ms"] >= 0 for component in components.values())
+    # Shutting down takes the instance out of rotation
+    assert client.get("/ready").status_code == 503
+
+
+def test_failed_warm_up_is_retried(faq_docx, monkeypatch):
+    """/ready reports a failed warm-up, then turns ready once a retry succeeds."""
+    import time
+
+    from chatbot_service import chatbot_service
+    from config import settings
+
+    monkeypatch.setattr(settings, "warm_up_retry_delay", 0.05)
+    failures = [RuntimeError("knowledge base unavailable")]
+    real_warm_up = chatbot_service.warm_up
+
+    async def flaky_warm_up():
+        if failures:
+            raise failures.pop()
+        return await real_warm_up()
+
+    with patch("main.chatbot_service.warm_up", flaky_warm_up), \
+            patch("main.chatbot_service.provider.warm_up", AsyncMock(return_value=True)):
+        with TestClient(app) as started:
+            deadline = time.monotonic() + 10
+            errors = set()
+            while (response := started.get("/ready")).status_code != 200:
+                assert time.monotonic() < deadline
+                errors.add(response.json().get("error"))
+                time.sleep(0.01)
+
+    assert "knowledge base unavailable" in errors
+    report = response.json()
+    assert report["attempts"] == 2 and "error" not in report
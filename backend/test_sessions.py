@@ -0,0 +1,84 @@
+"""Tests for the server-side session stores."""
+
+import time
+from unittest.mock import patch
+
+from models import ChatMessage
+from sessions import InMemorySessionStore, SQLiteSessionStore
+
+
+def turn(n: int) -> list[ChatMessage]:
+    return [
+        ChatMessage(role="user", content=f"question {n}"),
+        ChatMessage(role="assistant", content=f"answer {n}"),
+    ]
+
+
+async def test_memory_store_bounds_history_and_expires_idle_sessions():
+    store = InMemorySessionStore(max_messages=4, idle_ttl=60)
+    for n in range(3):
+        await store.append("a", turn(n))
+
+    history = await store.get_history("a")
+    assert [m.content for m in history] == ["question 1", "answer 1", "question 2", "answer 2"]
+    assert await store.get_history("unknown") is None
+
+    later = time.monotonic() + 61
+    with patch("sessions.time.monotonic", return_value=later):
+        assert await store.get_history("a") is None
+    stats = await store.stats()
+    assert stats["expired"] == 1
+    assert stats["bytes"] == 0
+
+
+async def test_memory_store_evicts_least_recently_used_over_memory_cap():
+    store = InMemorySessionStore(max_bytes=1000)
+    await store.append("old", [ChatMessage(role="user", content="x" * 400)])
+    await store.append("new", [ChatMessage(role="user", content="y" * 400)])
+    await store.get_history("old")  # "new" is now the least recently used
+    await store.append("newest", [ChatMessage(role="user", content="z" * 400)])
+
+    assert await store.get_history("new") is None
+    assert await store.get_history("old") is not None
+    assert (await store.stats())["evicted"] == 1
+
+
+def test_relative_sqlite_path_is_inside_the_backend_directory(monkeypatch):
+    from pathlib import Path
+
+    from config import settings
+    from sessions import create_session_store
+
+    monkeypatch.setattr(settings, "session_backend", "sqlite")
+    monkeypatch.setattr(settings, "session_sqlite_path", "sessions.db")
+    store = create_session_store()
+    assert Path(store.path) == Path(__file__).parent / "sessions.db"
+
+
+async def test_sqlite_store_persists_bounded_history(tmp_path):
+    path = tmp_path / "sessions.db"
+    store = SQLiteSessionStore(path, max_messages=4, max_sessions=2)
+    for n in range(3):
+        await store.append("a", turn(n))
+    await store.append("b", turn(0))
+    await store.aclose()
+
+    # A new store on the same file sees the same sessions
+    store = SQLiteSessionStore(path, max_messages=4, max_sessions=2)
+    history = await store.get_history("a")
+    assert [m.content for m in history] == ["question 1", "answer 1", "question 2", "answer 2"]
+
+    await store.append("c", turn(0))  # over max_sessions: "b" is least recently used
+    assert await store.get_history("b") is None
+
+    await store.delete("a")
+    assert await store.get_history("a") is None
+    assert await store.stats() == {"backend": "sqlite", "sessions": 1}
+
+    # Appending to an existing session doesn't scan every session
+    statements = []
+    store._connect().set_trace_callback(statements.append)
+    await store.append("c", turn(1))
+    assert not any("COUNT(*)" in sql or "NOT IN (SELECT session_id" in sql for sql in statements)
+    assert [m.content for m in await store.get_history("c")] == ["question 0", "answer 0", "question 1", "answer 1"]
+    await store.aclose()
@@ -0,0 +1,151 @@
+"""Per-stage request timing.
+
+Each HTTP request gets a Trace in a context variable; code along the way
+wraps its stages in ``with stage("prompt"):`` blocks. The stages go out as
+a Server-Timing header (shown in browser devtools) and, for a sampled
+share of requests, as one JSON log record on the "trace" logger.
+
+Stages are timed with time.perf_counter, so clock adjustments don't skew
+them. A stage entered twice (e.g. two LLM calls) accumulates.
+"""
+
+import json
+import logging
+import random
+import secrets
+import time
+from contextvars import ContextVar
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from config import settings
+
+trace_logger = logging.getLogger("trace")
+
+
+class Trace:
+    """Stage timings for one request."""
+
+    __slots__ = ("trace_id", "method", "path", "started", "stages")
+
+    def __init__(self, method: str = "", path: str = ""):
+        self.trace_id = secrets.token_hex(8)
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.stages: dict[str, float] = {}  # name -> seconds
+
+    def add(self, name: str, seconds: float) -> None:
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        """The stages so far, plus the total, as a Server-Timing header value."""
+        metrics = [f"{name};dur={seconds * 1000:.2f}" for name, seconds in self.stages.items()]
+        metrics.append(f"total;dur={self.elapsed() * 1000:.2f}")
+        return ", ".join(metrics)
+
+    def record(self, status: int | None = None) -> dict:
+        """Structured trace record for the log pipeline."""
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "status": status,
+            "total_ms": round(self.elapsed() * 1000, 2),
+            "stages_ms": {name: round(seconds * 1000, 2) for name, seconds in self.stages.items()},
+        }
+
+
+_current: ContextVar[Trace | None] = ContextVar("trace", default=None)
+
+
+class _Stage:
+    __slots__ = ("trace", "name", "started")
+
+    def __init__(self, trace: Trace, name: str):
+        self.trace = trace
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.started = time.perf_counter()
+
+    def __exit__(self, *exc_info) -> None:
+        self.trace.add(self.name, time.perf_counter() - self.started)
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+_NO_STAGE = _NoStage()
+
+
+def stage(name: str) -> _Stage | _NoStage:
+    """Time a block as a named stage of the current request.
+
+    Outside a traced request (tests, scripts) this does nothing.
+    """
+    trace = _current.get()
+    return _NO_STAGE if trace is None else _Stage(trace, name)
+
+
+def _timing_allow_origin(origin: str | None) -> str | None:
+    """The Timing-Allow-Origin value for a request's Origin, if CORS allows it."""
+    if "*" in settings.cors_origins:
+        return "*"
+    if origin is not None and origin in settings.cors_origins:
+        return origin
+    return None
+
+
+class TracingMiddleware:
+    """Start a Trace per HTTP request and report it.
+
+    Server-Timing is added when the response starts. A streamed response
+    starts before its stages run, so /api/chat/stream only reports its
+    time to headers there; the sampled log record is written once the last
+    byte has been sent and covers every stage. For the origins CORS allows,
+    Timing-Allow-Origin lets the frontend read the timings through the
+    Resource Timing API, not just in devtools.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        trace = Trace(scope["method"], scope["path"])
+        token = _current.set(trace)
+        status = None
+        timing_origin = _timing_allow_origin(Headers(scope=scope).get("origin"))
+
+        async def send_with_timing(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                if settings.server_timing_enabled:
+                    headers = MutableHeaders(scope=message)
+                    headers.append("Server-Timing", trace.server_timing())
+                    if timing_origin is not None:
+                        headers.append("Timing-Allow-Origin", timing_origin)
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            if settings.trace_sample_rate > 0 and random.random() < settings.trace_sample_rate:
+                trace_logger.info(json.dumps(trace.record(status)))
@@ -0,0 +1,159 @@
+"""Offline vector index over FAQ entries using hashed character n-grams.
+
+Vectors are TF-IDF weighted character n-grams hashed into a fixed number of
+dimensions, so no vocabulary or embedding service is needed. Question and
+answer vectors are stored as one contiguous float32 matrix and a query is
+scored with a single matrix-vector product. A saved matrix is loaded with
+mmap, so startup doesn't copy it and worker processes share its pages.
+"""
+
+import logging
+import math
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+
+from faq_index import STOPWORDS, FAQEntry
+
+logger = logging.getLogger(__name__)
+
+_NON_WORD_RE = re.compile(r"[^a-z0-9]+")
+
+# Weight of the answer similarity in the ranking score; the question
+# similarity carries the rest
+ANSWER_WEIGHT = 0.3
+
+
+def _ngram_counts(text: str, ngram_range: tuple[int, int], dim: int) -> dict[int, int]:
+    """Count hashed character n-grams of each word (padded with spaces)."""
+    counts: dict[int, int] = {}
+    low, high = ngram_range
+    for word in _NON_WORD_RE.sub(" ", text.lower()).split():
+        if len(word) < 2 or word in STOPWORDS:
+            continue
+        padded = f" {word} "
+        for n in range(low, high + 1):
+            for i in range(len(padded) - n + 1):
+                bucket = zlib.crc32(padded[i : i + n].encode()) % dim
+                counts[bucket] = counts.get(bucket, 0) + 1
+    return counts
+
+
+class VectorIndex:
+    """Dense hashed n-gram vectors for a fixed list of FAQ entries."""
+
+    def __init__(
+        self,
+        matrix: np.ndarray,
+        idf: np.ndarray,
+        ngram_range: tuple[int, int] = (3, 5),
+    ):
+        # Rows [0, n) are question vectors, rows [n, 2n) answer vectors
+        self.matrix = np.ascontiguousarray(matrix, dtype=np.float32)
+        self.idf = idf.astype(np.float32)
+        self.dim = self.matrix.shape[1]
+        self.ngram_range = ngram_range
+        self.size = self.matrix.shape[0] // 2
+
+    def __len__(self) -> int:
+        return self.size
+
+    @classmethod
+    def build(
+        cls,
+        entries: list[FAQEntry],
+        dim: int = 2048,
+        ngram_range: tuple[int, int] = (3, 5),
+    ) -> "VectorIndex":
+        """Vectorize the questions and answers of the given entries."""
+        texts = [e.question for e in entries] + [e.answer for e in entries]
+        counts = [_ngram_counts(text, ngram_range, dim) for text in texts]
+
+        tf = np.zeros((len(texts), dim), dtype=np.float32)
+        for row, row_counts in enumerate(counts):
+            if row_counts:
+                buckets = np.fromiter(row_counts.keys(), dtype=np.int64)
+                values = np.fromiter(row_counts.values(), dtype=np.float32)
+                tf[row, buckets] = 1 + np.log(values)  # sublinear term frequency
+
+        doc_freq = np.count_nonzero(tf, axis=0)
+        idf = (np.log((1 + len(texts)) / (1 + doc_freq)) + 1).astype(np.float32)
+        matrix = tf * idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.where(norms == 0, 1, norms)
+        return cls(matrix, idf, ngram_range)
+
+    def vectorize(self, text: str) -> np.ndarray:
+        """Turn a query into a unit-length vector in the index space."""
+        vector = np.zeros(self.dim, dtype=np.float32)
+        counts = _ngram_counts(text, self.ngram_range, self.dim)
+        if counts:
+            buckets = np.fromiter(counts.keys(), dtype=np.int64)
+            values = np.fromiter(counts.values(), dtype=np.float32)
+            vector[buckets] = (1 + np.log(values)) * self.idf[buckets]
+            norm = math.sqrt(float(vector @ vector))
+            vector /= norm
+        return vector
+
+    def score(self, query: str) -> tuple[np.ndarray, np.ndarray]:
+        """Score every entry against a query with one matrix-vector product.
+
+        Returns:
+            (ranking scores, question similarities), both indexed by entry id
+        """
+        similarities = self.matrix @ self.vectorize(query)
+        question_sim = similarities[: self.size]
+        scores = (1 - ANSWER_WEIGHT) * question_sim + ANSWER_WEIGHT * similarities[self.size :]
+        return scores, question_sim
+
+    def score_many(self, queries: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        """Score several queries with one matrix-matrix product.
+
+        Returns:
+            (ranking scores, question similarities), one row per query
+        """
+        vectors = np.stack([self.vectorize(query) for query in queries])
+        similarities = vectors @ self.matrix.T
+        question_sim = similarities[:, : self.size]
+        scores = (1 - ANSWER_WEIGHT) * question_sim + ANSWER_WEIGHT * similarities[:, self.size :]
+        return scores, question_sim
+
+    def top(self, scores: np.ndarray, k: int, min_score: float = 0.0) -> list[int]:
+        """Entry ids of the k best scores above min_score, best first."""
+        k = min(k, self.size)
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [int(i) for i in top if scores[i] > min_score]
+
+    def search(
+        self, query: str, k: int = 5, min_score: float = 0.0
+    ) -> list[tuple[int, float, float]]:
+        """Return up to k (entry id, ranking score, question similarity), best first."""
+        if not self.size:
+            return []
+        scores, question_sim = self.score(query)
+        return [
+            (i, float(scores[i]), float(question_sim[i]))
+            for i in self.top(scores, k, min_score)
+        ]
+
+    def save(self, directory: Path) -> None:
+        """Write the index into a directory (see load())."""
+        directory.mkdir(parents=True, exist_ok=True)
+        np.save(directory / "vectors.npy", self.matrix)
+        np.savez(directory / "vector_params.npz", idf=self.idf, ngram_range=np.array(self.ngram_range))
+
+    @classmethod
+    def load(cls, directory: Path, mmap: bool = True) -> "VectorIndex":
+        """Load an index written by save().
+
+        With mmap the matrix stays in the page cache instead of being read
+        into process memory; the index never writes to it.
+        """
+        matrix = np.load(directory / "vectors.npy", mmap_mode="r" if mmap else None)
+        with np.load(directory / "vector_params.npz") as data:
+            return cls(matrix, data["idf"], tuple(int(n) for n in data["ngram_range"]))
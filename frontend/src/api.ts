@@ -2,7 +2,12 @@
  * API service for communicating with the backend
  */
 
-import type { ChatRequest, ChatResponse, AppConfig } from './types';
+import type {
+  ChatRequest,
+  ChatResponse,
+  ChatStreamDone,
+  AppConfig,
+} from './types';
 
 const API_BASE_URL = import.meta.env.VITE_API_URL || '';
 
@@ -27,6 +32,67 @@ export async function sendChatMessage(
   return response.json();
 }
 
+/**
+ * Send a chat message and receive the answer as it is generated.
+ *
+ * Calls onToken for each chunk of text from the Server-Sent Events stream
+ * and resolves with the final response metadata once the stream ends.
+ */
+export async function streamChatMessage(
+  request: ChatRequest,
+  onToken: (text: string) => void
+): Promise<ChatStreamDone> {
+  const response = await fetch(`${API_BASE_URL}/api/chat/stream`, {
+    method: 'POST',
+    headers: {
+      'Content-Type': 'application/json',
+      Accept: 'text/event-stream',
+    },
+    body: JSON.stringify(request),
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`HTTP error! status: ${response.status}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  for (;;) {
+    const { value, done } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line
+    let boundary = buffer.indexOf('\n\n');
+    while (boundary !== -1) {
+      const block = buffer.slice(0, boundary);
+      buffer = buffer.slice(boundary + 2);
+      boundary = buffer.indexOf('\n\n');
+
+      let event = 'message';
+      let data = '';
+      for (const line of block.split('\n')) {
+        if (line.startsWith('event: ')) event = line.slice(7);
+        else if (line.startsWith('data: ')) data += line.slice(6);
+      }
+      if (!data) continue;
+
+      const payload = JSON.parse(data);
+      if (event === 'token') {
+        onToken(payload.text);
+      } else if (event === 'done') {
+        return payload as ChatStreamDone;
+      } else if (event === 'error') {
+        throw new Error(payload.detail);
+      }
+    }
+  }
+
+  throw new Error('Stream ended before the response was complete');
+}
+
 /**
  * Get app configuration from backend
  */
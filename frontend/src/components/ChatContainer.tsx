@@ -7,15 +7,18 @@ import { useState } from 'react';
 import { Header } from './Header';
 import { MessageList } from './MessageList';
 import { ChatInput } from './ChatInput';
-import { sendChatMessage } from '../api';
+import { streamChatMessage } from '../api';
 import type { ChatMessage } from '../types';
 
 export function ChatContainer() {
   const [messages, setMessages] = useState<ChatMessage[]>([]);
   const [isLoading, setIsLoading] = useState(false);
+  const [isStreaming, setIsStreaming] = useState(false);
   const [showFallback, setShowFallback] = useState(false);
   const [microsoftListUrl, setMicrosoftListUrl] = useState<string | null>(null);
   const [error, setError] = useState<string | null>(null);
+  // The server keeps the conversation history for this session
+  const [sessionId, setSessionId] = useState<string | null>(null);
 
   const handleSendMessage = async (content: string) => {
     // Add user message
@@ -31,19 +34,42 @@ export function ChatContainer() {
     setError(null);
 
     try {
-      const response = await sendChatMessage({
-        message: content,
-        conversation_history: messages,
-      });
+      let started = false;
+      const response = await streamChatMessage(
+        {
+          message: content,
+          session_id: sessionId,
+        },
+        (text) => {
+          if (!started) {
+            // First token: swap the loading indicator for the answer bubble
+            started = true;
+            setIsLoading(false);
+            setIsStreaming(true);
+            setMessages((prev) => [
+              ...prev,
+              { role: 'assistant', content: text, timestamp: new Date() },
+            ]);
+            return;
+          }
+          setMessages((prev) => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+          });
+        }
+      );
 
-      // Add assistant response
+      // Add (or finalize) the assistant response
       const assistantMessage: ChatMessage = {
         role: 'assistant',
         content: response.response,
         timestamp: new Date(),
       };
 
-      setMessages((prev) => [...prev, assistantMessage]);
+      setMessages((prev) =>
+        started ? [...prev.slice(0, -1), assistantMessage] : [...prev, assistantMessage]
+      );
+      setSessionId(response.session_id);
       setShowFallback(response.show_fallback);
       setMicrosoftListUrl(response.microsoft_list_url);
     } catch (err) {
@@ -60,6 +86,7 @@ export function ChatContainer() {
       setMessages((prev) => [...prev, errorMessage]);
     } finally {
       setIsLoading(false);
+      setIsStreaming(false);
     }
   };
 
@@ -83,7 +110,10 @@ export function ChatContainer() {
         microsoftListUrl={microsoftListUrl}
       />
 
-      <ChatInput onSendMessage={handleSendMessage} disabled={isLoading} />
+      <ChatInput
+        onSendMessage={handleSendMessage}
+        disabled={isLoading || isStreaming}
+      />
     </div>
   );
 }
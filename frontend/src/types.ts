@@ -10,7 +10,8 @@ export interface ChatMessage {
 
 export interface ChatRequest {
   message: string;
-  conversation_history: ChatMessage[];
+  session_id?: string | null;
+  conversation_history?: ChatMessage[];
 }
 
 export interface ChatResponse {
@@ -19,6 +20,11 @@ export interface ChatResponse {
   show_fallback: boolean;
   microsoft_list_url: string | null;
   sources: string[];
+  session_id: string | null;
+}
+
+export interface ChatStreamDone extends ChatResponse {
+  time_to_first_token_ms: number | null;
 }
 
 export interface AppConfig {
@@ -5,9 +5,14 @@ Just run: streamlit run simple_chatbot.py
 
 import streamlit as st
 import os
+import sys
 from openai import OpenAI
 from datetime import datetime
 
+# Share the backend's confidence scoring
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "backend"))
+from confidence import ConfidenceScorer
+
 # Load environment variables
 from dotenv import load_dotenv
 load_dotenv("backend/.env")
@@ -65,22 +70,13 @@ def search_faq(query: str) -> str | None:
     return None
 
 
+confidence_scorer = ConfidenceScorer()
+
+
 def calculate_confidence(response: str, query: str) -> float:
     """Calculate confidence score."""
-    uncertainty_phrases = [
-        "i'm not sure", "i don't know", "unclear",
-        "cannot confirm", "recommend contacting",
-        "please contact", "check with hr",
-    ]
-    
-    response_lower = response.lower()
-    if any(phrase in response_lower for phrase in uncertainty_phrases):
-        return 0.5
-    if len(response.split()) < 10:
-        return 0.6
-    if search_faq(query):
-        return 0.95
-    return 0.8
+    # A keyword FAQ hit counts as a perfect retrieval match
+    return confidence_scorer.score(response, retrieval_score=1.0 if search_faq(query) else None)
 
 
 def get_response(message: str, chat_history: list) -> tuple[str, float, bool]: